@@ -1,78 +1,331 @@
 # 备用配置：使用 deepseek-chat 模型
 # 如果 deepseek-reasoner 不稳定，可以使用这个配置
 
+import asyncio
+import contextlib
+import copy
+import hashlib
 import json
+import random
+import threading
+import time
 import openai
 
+from utils.circuit_breaker import CircuitBreaker
+from utils.errors import LLMUnavailableError
+from utils.json_extract import extract_json_object
+from utils.metrics import (current_route, LLM_BREAKER_STATE, LLM_CALLS, LLM_RETRIES, LLM_SECONDS, LLM_TOKENS,
+                           STAGE_SECONDS)
+
+
+# 所有客户端共享的 keep-alive 连接池（同步 / 异步各一个）
+# 异步连接池绑定在首次使用它的事件循环上，因此所有 AsyncClientBridge 共用同一个事件循环
+_shared_http_clients = {}
+_shared_http_client_lock = threading.Lock()
+_shared_event_loop = None
+
+
+def _get_shared_http_client(max_connections, max_keepalive_connections, use_async=False):
+    with _shared_http_client_lock:
+        if use_async not in _shared_http_clients:
+            try:
+                import httpx
+            except ImportError as e:
+                # 退回 openai 默认连接池（只提示一次）
+                print(f"未能导入 httpx，使用 openai 默认连接池，连接上限配置不生效: {e}")
+                _shared_http_clients[use_async] = None
+                return None
+            client_class = openai.DefaultAsyncHttpxClient if use_async else openai.DefaultHttpxClient
+            _shared_http_clients[use_async] = client_class(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections,
+                    keepalive_expiry=60
+                )
+            )
+        return _shared_http_clients[use_async]
+
+
+def _get_shared_event_loop():
+    """后台线程中运行的进程级事件循环，供所有 AsyncClientBridge 使用"""
+    global _shared_event_loop
+    with _shared_http_client_lock:
+        if _shared_event_loop is None:
+            _shared_event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_shared_event_loop.run_forever, name="llm-event-loop", daemon=True).start()
+        return _shared_event_loop
+
 
 class DeepSeekClient:
     """DeepSeek API 客户端封装"""
 
-    def __init__(self, api_key, model="deepseek-chat"):
-        self.client = openai.OpenAI(
-            api_key=api_key,
-            base_url="https://api.deepseek.com/v1"
+    # 解析失败时返回结果中的建议文字，用于识别非正常结果
+    PARSE_FAILURE_SUGGESTION = "请重新尝试"
+
+    # 可重试的错误：限流、服务端错误、超时与连接失败
+    RETRYABLE_ERRORS = (
+        openai.RateLimitError,
+        openai.InternalServerError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+    )
+    # 计入熔断的错误：服务端错误、超时与连接失败；限流与其他 4xx 说明服务仍在正常应答
+    OUTAGE_ERRORS = (
+        openai.InternalServerError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+    )
+
+    def __init__(self, api_key, model="deepseek-chat", base_url="https://api.deepseek.com/v1",
+                 timeout=30.0, deadline=60.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0,
+                 breaker: CircuitBreaker = None,
+                 max_connections=100, max_keepalive_connections=20):
+        self.client = self._create_client(
+            api_key, base_url, timeout, max_connections, max_keepalive_connections
         )
         self.model = model
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        LLM_BREAKER_STATE.track(self.breaker.state_value, model=model)
+        self._usage_lock = threading.Lock()
+        self.usage_stats = {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "prompt_cache_hit_tokens": 0,
+            "prompt_cache_miss_tokens": 0
+        }
+        self.resilience_stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "deadline_exceeded": 0,
+            "short_circuited": 0
+        }
 
-    def call_api(self, prompt, use_json_format=False):
-        """调用 API 并处理响应"""
-        try:
-            # 构建消息
-            messages = [
-                {
-                    "role": "system",
-                    "content": "你是一个玄幻游戏的智能裁判。请根据游戏规则判断玩家行动的结果，并返回JSON格式的结果。"
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-
-            # 根据模型选择是否使用 JSON 格式
-            kwargs = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": 0.7
+    def _create_client(self, api_key, base_url, timeout, max_connections, max_keepalive_connections):
+        return openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=0,  # 重试由本类统一处理
+            http_client=_get_shared_http_client(max_connections, max_keepalive_connections)
+        )
+
+    def _build_request(self, prompt, use_json_format=False):
+        """构建请求参数"""
+        # 构建消息
+        messages = [
+            {
+                "role": "system",
+                "content": "你是一个玄幻游戏的智能裁判。请根据游戏规则判断玩家行动的结果，并返回JSON格式的结果。"
+            },
+            {
+                "role": "user",
+                "content": prompt
             }
+        ]
+
+        # 根据模型选择是否使用 JSON 格式
+        kwargs = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.7
+        }
+
+        # deepseek-chat 支持 JSON 格式输出
+        if use_json_format and self.model == "deepseek-chat":
+            kwargs["response_format"] = {"type": "json_object"}
+
+        return kwargs
 
-            # deepseek-chat 支持 JSON 格式输出
-            if use_json_format and self.model == "deepseek-chat":
-                kwargs["response_format"] = {"type": "json_object"}
+    def call_api(self, prompt, use_json_format=False):
+        """
+        调用 API 并处理响应
+        服务不可用时抛出 LLMUnavailableError，由调用方走本地兜底逻辑
+        """
+        kwargs = self._build_request(prompt, use_json_format)
+        with LLM_SECONDS.time(model=self.model, route=current_route.get()):
+            response = self._request_with_retry(kwargs)
+        self._record_usage(response.usage)
+        content = response.choices[0].message.content
+
+        # 解析响应
+        return self._parse_response(content)
+
+    def stream_api(self, prompt, use_json_format=False):
+        """
+        流式调用 API
+        逐段产出 ("delta", 文本)，结束时产出 ("result", 解析后的结果)
+        调用方提前关闭生成器时会同时关闭上游连接（token 用量在最后一段中，需读完才能记录）；
+        连接建立失败时与 call_api 一样重试，仍失败则抛出 LLMUnavailableError
+        耗时从发起请求计到流结束或被关闭，与 call_api 一样计入 LLM_SECONDS
+        """
+        kwargs = self._build_request(prompt, use_json_format)
+        content = []
+        with LLM_SECONDS.time(model=self.model, route=current_route.get()):
+            stream = self._request_with_retry(
+                dict(kwargs, stream=True, stream_options={"include_usage": True})
+            )
+            try:
+                for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        self._record_usage(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    # deepseek-reasoner 的思考过程在 reasoning_content 中，这里只转发正文
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        content.append(delta)
+                        yield "delta", delta
+            except openai.OpenAIError as e:
+                print(f"API流式调用中断: {e}")
+                self._record_breaker_failure(e)
+                raise LLMUnavailableError(str(e)) from e
+            finally:
+                stream.close()
+
+        yield "result", self._parse_response("".join(content))
+
+    def _request_with_retry(self, kwargs):
+        """带截止时间、指数退避重试和熔断的请求"""
+        if not self.breaker.allow_request():
+            self._count("short_circuited")
+            self._record_call("short_circuited")
+            raise LLMUnavailableError("模型服务熔断中")
+
+        self._count("requests")
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            try:
+                response = self.client.chat.completions.create(
+                    timeout=max(0.1, min(self.timeout, remaining)), **kwargs
+                )
+                self.breaker.record_success()
+                self._record_call("ok")
+                return response
+            except self.RETRYABLE_ERRORS as e:
+                delay = self._next_retry_delay(attempt, e, deadline_at)
+                attempt += 1
+                time.sleep(delay)
+            except openai.OpenAIError as e:
+                # 参数或鉴权错误，重试无意义
+                self._fail(e)
+
+    def _next_retry_delay(self, attempt, error, deadline_at):
+        """计算下次重试前的等待时间；重试次数用尽或将超过截止时间时直接失败"""
+        delay = self._backoff_delay(attempt, error)
+        if attempt >= self.max_retries or time.monotonic() + delay >= deadline_at:
+            if attempt < self.max_retries:
+                self._count("deadline_exceeded")
+            self._fail(error)
+        print(f"API调用失败，{delay:.2f}秒后重试: {error}")
+        self._count("retries")
+        LLM_RETRIES.inc(model=self.model, route=current_route.get())
+        return delay
+
+    def _backoff_delay(self, attempt, error):
+        """抖动指数退避；限流时优先遵循 Retry-After"""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _fail(self, error):
+        print(f"API调用错误: {error}")
+        self._count("failures")
+        self._record_call("error")
+        self._record_breaker_failure(error)
+        raise LLMUnavailableError(str(error)) from error
+
+    def _record_breaker_failure(self, error):
+        if isinstance(error, self.OUTAGE_ERRORS):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_ignored()
+
+    def _count(self, key):
+        with self._usage_lock:
+            self.resilience_stats[key] += 1
 
-            response = self.client.chat.completions.create(**kwargs)
-            content = response.choices[0].message.content
+    def _record_call(self, outcome):
+        LLM_CALLS.inc(model=self.model, route=current_route.get(), outcome=outcome)
 
-            # 解析响应
-            return self._parse_response(content)
+    def get_resilience_stats(self):
+        """返回重试与熔断统计"""
+        with self._usage_lock:
+            stats = dict(self.resilience_stats)
+        stats["breaker"] = self.breaker.stats()
+        return stats
 
-        except Exception as e:
-            print(f"API调用错误: {e}")
-            return self._error_response(str(e))
+    def _record_usage(self, usage):
+        """累计 token 用量，包括服务端前缀缓存命中的 token 数"""
+        if usage is None:
+            return
+        # DeepSeek 返回 prompt_cache_hit_tokens / prompt_cache_miss_tokens，
+        # OpenAI 兼容接口则在 prompt_tokens_details.cached_tokens 中
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        hit = getattr(usage, "prompt_cache_hit_tokens", None)
+        if hit is None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            hit = getattr(details, "cached_tokens", 0) if details else 0
+        hit = hit or 0
+        miss = getattr(usage, "prompt_cache_miss_tokens", None)
+        if miss is None:
+            miss = prompt_tokens - hit
+
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+        with self._usage_lock:
+            self.usage_stats["calls"] += 1
+            self.usage_stats["prompt_tokens"] += prompt_tokens
+            self.usage_stats["completion_tokens"] += completion_tokens
+            self.usage_stats["prompt_cache_hit_tokens"] += hit
+            self.usage_stats["prompt_cache_miss_tokens"] += miss
+
+        route = current_route.get()
+        for kind, count in (("prompt", prompt_tokens), ("completion", completion_tokens),
+                            ("cache_hit", hit), ("cache_miss", miss)):
+            LLM_TOKENS.inc(count, model=self.model, route=route, kind=kind)
+
+    def get_usage_stats(self):
+        """返回 token 用量统计及前缀缓存命中率"""
+        with self._usage_lock:
+            stats = dict(self.usage_stats)
+        cached_total = stats["prompt_cache_hit_tokens"] + stats["prompt_cache_miss_tokens"]
+        stats["prompt_cache_hit_rate"] = (
+            round(stats["prompt_cache_hit_tokens"] / cached_total, 4) if cached_total else 0.0
+        )
+        return stats
+
+    def parse_content(self, content):
+        """解析模型输出文本（供流式调用方在 JSON 闭合时提前结算）"""
+        return self._parse_response(content)
 
     def _parse_response(self, content):
         """解析API响应"""
-        try:
-            # 尝试直接解析JSON
-            result = json.loads(content)
+        # 单次扫描提取最外层 JSON 对象（兼容代码块标记与常见格式小错误）
+        with STAGE_SECONDS.time(stage="parse_response"):
+            result = extract_json_object(content or "")
+        if result is not None:
             return self._validate_response(result)
-        except json.JSONDecodeError:
-            # 尝试提取JSON内容
-            import re
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                try:
-                    result = json.loads(json_match.group())
-                    return self._validate_response(result)
-                except:
-                    pass
 
-            # 如果都失败了，返回原始内容作为描述
-            return {
+        # 提取失败，返回原始内容作为描述
+        return {
                 "成功": False,
                 "描述": content[:200] if len(content) > 200 else content,
-                "建议": "请重新尝试",
+                "建议": self.PARSE_FAILURE_SUGGESTION,
                 "状态变化": {}
             }
 
@@ -103,20 +356,209 @@ class DeepSeekClient:
 
         return result
 
-    def _error_response(self, error_msg):
-        """生成错误响应"""
-        return {
-            "成功": False,
-            "描述": f"系统错误：{error_msg[:100]}",
-            "建议": "请稍后重试或联系管理员",
-            "状态变化": {
-                "hp": 0,
-                "spiritual_energy": 0,
-                "new_items": [],
-                "new_skills": [],
-                "realm_change": None
-            }
-        }
+    @classmethod
+    def is_degraded_response(cls, result):
+        """判断结果是否来自解析失败（这类结果不应被缓存）"""
+        return result.get("建议") == cls.PARSE_FAILURE_SUGGESTION
+
+
+class AsyncDeepSeekClient(DeepSeekClient):
+    """
+    DeepSeek API 异步客户端
+    用信号量限制同时进行的上游请求数；完全相同的请求在进行中时合并为一次上游调用
+    """
+
+    def __init__(self, api_key, model="deepseek-chat", max_concurrency=16, **kwargs):
+        super().__init__(api_key, model=model, **kwargs)
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._inflight = {}
+        self.resilience_stats.update({"coalesced": 0, "in_flight": 0, "waiting": 0})
+
+    def _create_client(self, api_key, base_url, timeout, max_connections, max_keepalive_connections):
+        return openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=0,
+            http_client=_get_shared_http_client(max_connections, max_keepalive_connections, use_async=True)
+        )
+
+    @property
+    def semaphore(self):
+        # 在事件循环内首次使用时创建
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def call_api(self, prompt, use_json_format=False, coalesce=True):
+        """
+        异步调用 API；相同请求进行中时直接等待其结果
+        coalesce=False 时总是单独请求（对冲请求需要与原请求分开）
+        """
+        kwargs = self._build_request(prompt, use_json_format)
+        if not coalesce:
+            return await self._call_upstream(kwargs)
+        key = hashlib.sha1(
+            json.dumps(kwargs, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            # [上游任务, 等待者数量]
+            entry = [asyncio.ensure_future(self._call_upstream(kwargs)), 0]
+            self._inflight[key] = entry
+            entry[0].add_done_callback(lambda _: self._forget_inflight(key, entry))
+        else:
+            self._count("coalesced")
+
+        # shield：某个等待者被取消时不影响其他合并到同一请求的调用方，最后一个等待者取消时才取消上游请求
+        entry[1] += 1
+        try:
+            result = await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if entry[1] == 1:
+                entry[0].cancel()
+                # 正在取消的请求不再接受新的合并
+                self._forget_inflight(key, entry)
+            raise
+        finally:
+            entry[1] -= 1
+        return copy.deepcopy(result)
+
+    def _forget_inflight(self, key, entry):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    async def _call_upstream(self, kwargs):
+        with LLM_SECONDS.time(model=self.model, route=current_route.get()):
+            response = await self._request_with_retry(kwargs)
+        self._record_usage(response.usage)
+        return self._parse_response(response.choices[0].message.content)
+
+    async def stream_api(self, prompt, use_json_format=False):
+        """异步流式调用，产出内容与计时方式与同步版本一致（流式请求不做合并）"""
+        kwargs = self._build_request(prompt, use_json_format)
+        content = []
+        with LLM_SECONDS.time(model=self.model, route=current_route.get()):
+            async with self._limited():
+                stream = await self._request_with_retry(
+                    dict(kwargs, stream=True, stream_options={"include_usage": True}), limited=False
+                )
+                try:
+                    async for chunk in stream:
+                        if getattr(chunk, "usage", None):
+                            self._record_usage(chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            content.append(delta)
+                            yield "delta", delta
+                except openai.OpenAIError as e:
+                    print(f"API流式调用中断: {e}")
+                    self._record_breaker_failure(e)
+                    raise LLMUnavailableError(str(e)) from e
+                finally:
+                    await stream.close()
+
+        yield "result", self._parse_response("".join(content))
+
+    async def _request_with_retry(self, kwargs, limited=True):
+        if not self.breaker.allow_request():
+            self._count("short_circuited")
+            self._record_call("short_circuited")
+            raise LLMUnavailableError("模型服务熔断中")
+
+        self._count("requests")
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            try:
+                timeout = max(0.1, min(self.timeout, remaining))
+                if limited:
+                    async with self._limited():
+                        response = await self.client.chat.completions.create(timeout=timeout, **kwargs)
+                else:
+                    response = await self.client.chat.completions.create(timeout=timeout, **kwargs)
+                self.breaker.record_success()
+                self._record_call("ok")
+                return response
+            except self.RETRYABLE_ERRORS as e:
+                # 退避等待期间不占用并发名额
+                delay = self._next_retry_delay(attempt, e, deadline_at)
+                attempt += 1
+                await asyncio.sleep(delay)
+            except openai.OpenAIError as e:
+                self._fail(e)
+
+    @contextlib.asynccontextmanager
+    async def _limited(self):
+        """占用一个并发名额"""
+        self._adjust("waiting", 1)
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self._adjust("waiting", -1)
+        self._adjust("in_flight", 1)
+        try:
+            yield
+        finally:
+            self._adjust("in_flight", -1)
+            self.semaphore.release()
+
+    def _adjust(self, key, delta):
+        with self._usage_lock:
+            self.resilience_stats[key] += delta
+
+
+class AsyncClientBridge:
+    """
+    在后台线程的事件循环中运行 AsyncDeepSeekClient，提供给同步代码（如 Flask 视图）使用
+    接口与 DeepSeekClient 一致；多个桥接（模型路由、对冲模型）共用同一个事件循环与连接池
+    """
+
+    def __init__(self, async_client: AsyncDeepSeekClient):
+        self.async_client = async_client
+        self._loop = _get_shared_event_loop()
+
+    def __getattr__(self, name):
+        # 统计、解析等同步方法直接转发
+        return getattr(self.async_client, name)
+
+    def _run(self, coroutine):
+        return self._submit(coroutine).result()
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(
+            self._in_route(coroutine, current_route.get()), self._loop
+        )
+
+    @staticmethod
+    async def _in_route(coroutine, route):
+        # 事件循环线程中的任务看不到调用线程的 contextvar，这里带过去供指标按路由归类
+        current_route.set(route)
+        return await coroutine
+
+    def call_api(self, prompt, use_json_format=False):
+        return self._run(self.async_client.call_api(prompt, use_json_format=use_json_format))
+
+    def submit_api(self, prompt, use_json_format=False, coalesce=True):
+        """提交调用，返回 concurrent.futures.Future；取消该 Future 会取消上游请求"""
+        return self._submit(self.async_client.call_api(prompt, use_json_format=use_json_format,
+                                                       coalesce=coalesce))
+
+    def stream_api(self, prompt, use_json_format=False):
+        agen = self.async_client.stream_api(prompt, use_json_format=use_json_format)
+        try:
+            while True:
+                try:
+                    yield self._run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(agen.aclose())
 
 
 # 使用示例
@@ -1,44 +1,331 @@
-from flask import Flask, request, jsonify, render_template, session
+from flask import Blueprint, Flask, Response, g, request, jsonify, render_template, session, stream_with_context
 import json
 import random
 import os
+import secrets
+import threading
+import time
+import uuid
 from datetime import datetime
-from api_config import DeepSeekClient
+from functools import wraps
+from utils.errors import LLMUnavailableError
 from utils.prompt_builder import EnhancedPromptBuilder
+from utils.world_loader import WorldSettingsLoader
+from utils.prompt_budget import PromptBudgetReport
 from utils.json_validator import validate_deepseek_result
 from dotenv import load_dotenv
-from utils.event_generator import EventGenerator
+from utils.player_store import create_player_repository, import_legacy_save
+from utils.stream_parser import NarrationStreamParser
+from utils.response_cache import ResponseCache, make_state_key
+from utils.speculation import SpeculativeJudge
+from utils.circuit_breaker import CircuitBreaker
+from utils.model_router import ModelRouter, action_complexity
+from utils.hedging import HedgedClient
+from utils.job_queue import JobQueue, QueueFullError, PlayerBusyError
+from utils.rules_engine import LocalRulesEngine
+from utils.event_pool import EventPoolLoader
+from utils.event_synthesizer import EventSynthesizer
+from utils.metrics import (registry as metrics_registry, current_route,
+                           REQUESTS, REQUEST_SECONDS, STAGE_SECONDS)
+from utils.atomic_writer import GroupCommitWriter, atomic_write_json
+from utils.history import make_history_record, fold_into_digest
+from utils.player_journal import (apply_event, make_event, result_events,
+                                  EVENT_PRESENTED, EVENT_CLEARED, PAST_DEEDS_UPDATED)
 
-event_generator = EventGenerator(client)
 load_dotenv()
 
+from config import (EventConfig, StorageConfig, CacheConfig, SpeculationConfig, LLMConfig, BatchConfig,
+                    JobConfig, RouterConfig, HedgeConfig, RulesConfig, PromptConfig, MetricsConfig, WorldConfig)
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'  # 请更换为安全的密钥
+
+bp = Blueprint("game", __name__)
 
 # DeepSeek API 配置
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-if not DEEPSEEK_API_KEY:
-    raise RuntimeError("❌ 环境变量 DEEPSEEK_API_KEY 未设置，请检查 .env 文件")
 DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-reasoner")
-
-# 初始化客户端
-client = DeepSeekClient(
-    api_key=DEEPSEEK_API_KEY,
-    model=DEEPSEEK_MODEL
-)
-
-# 初始化prompt构建器
-prompt_builder = EnhancedPromptBuilder()
+# 路由开启时由所选客户端决定是否使用 JSON 模式（推理模型会忽略）
+USE_JSON_FORMAT = RouterConfig.MODEL_ROUTER_ENABLED or DEEPSEEK_MODEL == "deepseek-chat"
 
 # 数据文件路径
-PLAYER_FILE = "data/player.json"
 EVENTS_FILE = "data/events.json"
 WORLD_SETTINGS_FILE = "data/world_settings.json"
 MAX_HISTORY_LENGTH = 20  # 历史记录最大长度
+LLM_UNAVAILABLE_MESSAGE = "天机紊乱，推演暂不可用，请稍后再试"
+EVENT_CHANGED_MESSAGE = "事件已变化，请重新选择"
+JOB_HEARTBEAT_SECONDS = 15
+
+
+def component(build):
+    """首次访问时构建并缓存的组件；构建过程中可以访问其他组件"""
+    name = build.__name__
+
+    @wraps(build)
+    def getter(self):
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self.__dict__:
+                self.__dict__[name] = build(self)
+            return self.__dict__[name]
+
+    return property(getter)
+
+
+class Services:
+    """
+    应用依赖的组件
+    导入 app 时不构建任何组件：模型客户端（及 openai、httpx）、数据库连接、事件模板等
+    都在首次使用时才导入和创建，冷启动只需导入 Flask 与轻量模块；warm_up 可以提前全部构建
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.hedged_clients = []
+        self.prompt_budget_report = PromptBudgetReport()
+
+    # 初始化客户端（每个模型各自熔断）
+    def make_client(self, model, timeout=LLMConfig.DEEPSEEK_TIMEOUT, deadline=LLMConfig.DEEPSEEK_DEADLINE):
+        from api_config import DeepSeekClient, AsyncDeepSeekClient, AsyncClientBridge
+
+        client_options = dict(
+            api_key=os.getenv("DEEPSEEK_API_KEY"),
+            model=model,
+            base_url=LLMConfig.DEEPSEEK_BASE_URL,
+            timeout=timeout,
+            deadline=deadline,
+            max_retries=LLMConfig.DEEPSEEK_MAX_RETRIES,
+            max_connections=LLMConfig.DEEPSEEK_MAX_CONNECTIONS,
+            breaker=CircuitBreaker(
+                failure_threshold=LLMConfig.BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=LLMConfig.BREAKER_RESET_SECONDS
+            )
+        )
+        if LLMConfig.LLM_CLIENT_MODE == "async":
+            return AsyncClientBridge(
+                AsyncDeepSeekClient(max_concurrency=LLMConfig.LLM_MAX_CONCURRENCY, **client_options)
+            )
+        return DeepSeekClient(**client_options)
+
+    # 对冲请求（可选）：慢调用超过近期延迟百分位时再发一份，先到者胜出
+    def with_hedging(self, primary):
+        if not HedgeConfig.HEDGE_ENABLED:
+            return primary
+        hedge_model = HedgeConfig.HEDGE_MODEL
+        hedged = HedgedClient(
+            primary,
+            self.make_client(hedge_model) if hedge_model and hedge_model != primary.model else None,
+            percentile=HedgeConfig.HEDGE_PERCENTILE,
+            max_hedge_ratio=HedgeConfig.HEDGE_MAX_RATIO,
+            min_delay=HedgeConfig.HEDGE_MIN_DELAY
+        )
+        self.hedged_clients.append(hedged)
+        return hedged
+
+    # 模型路由（可选）：按行动复杂度与模型近期表现在对话模型与推理模型之间选择
+    @component
+    def model_router(self):
+        if not RouterConfig.MODEL_ROUTER_ENABLED:
+            return None
+        return ModelRouter(
+            self.with_hedging(self.make_client(RouterConfig.ROUTER_FAST_MODEL)),
+            self.with_hedging(self.make_client(
+                RouterConfig.ROUTER_STRONG_MODEL,
+                timeout=min(LLMConfig.DEEPSEEK_TIMEOUT, RouterConfig.ROUTER_STRONG_DEADLINE),
+                deadline=RouterConfig.ROUTER_STRONG_DEADLINE
+            )),
+            complexity_threshold=RouterConfig.ROUTER_COMPLEXITY_THRESHOLD,
+            latency_budget=RouterConfig.ROUTER_LATENCY_BUDGET,
+            max_parse_failure_rate=RouterConfig.ROUTER_MAX_PARSE_FAILURE_RATE,
+            probe_rate=RouterConfig.ROUTER_PROBE_RATE
+        )
+
+    @component
+    def client(self):
+        if self.model_router is not None:
+            return self.model_router
+        return self.with_hedging(self.make_client(DEEPSEEK_MODEL))
+
+    # 世界设定（进程内共享的编译快照，文件修改后自动切换）
+    @component
+    def world_loader(self):
+        loader = WorldSettingsLoader(WORLD_SETTINGS_FILE)
+        loader.store.configure(check_interval=WorldConfig.WORLD_SETTINGS_CHECK_SECONDS,
+                               cache_path=WorldConfig.WORLD_SETTINGS_CACHE_PATH)
+        if WorldConfig.WORLD_SETTINGS_WATCH:
+            loader.store.watch()
+        return loader
+
+    # prompt构建器（按 token 预算组装，统计节省的 token）
+    @component
+    def prompt_builder(self):
+        return EnhancedPromptBuilder(self.world_loader, budgets=PromptConfig.PROMPT_TOKEN_BUDGETS,
+                                     budget_report=self.prompt_budget_report)
+
+    # LLM 判定结果缓存
+    @component
+    def response_cache(self):
+        if not CacheConfig.RESPONSE_CACHE_ENABLED:
+            return None
+        return ResponseCache(
+            db_path=CacheConfig.RESPONSE_CACHE_PATH,
+            max_size=CacheConfig.RESPONSE_CACHE_MAX_SIZE,
+            ttl_seconds=CacheConfig.RESPONSE_CACHE_TTL_SECONDS,
+            freshness_bypass_rate=CacheConfig.RESPONSE_CACHE_BYPASS_RATE
+        )
+
+    # 本地事件合成器（模板文法），模板文件缺失时不启用
+    @component
+    def event_synthesizer(self):
+        try:
+            return EventSynthesizer.from_file(
+                EventConfig.EVENT_TEMPLATES_PATH,
+                type_weights=EventConfig.EVENT_TYPE_WEIGHTS,
+                fate_modifiers=EventConfig.FATE_EVENT_MODIFIERS,
+                difficulty_modifiers=EventConfig.DIFFICULTY_MODIFIERS
+            )
+        except (OSError, ValueError, KeyError) as e:
+            print(f"加载事件模板失败: {e}")
+            return None
+
+    # 事件生成器
+    @component
+    def event_generator(self):
+        from utils.event_generator import EventGenerator
+
+        return EventGenerator(self.client, self.world_loader, cache=self.response_cache,
+                              synthesizer=self.event_synthesizer, budget=PromptConfig.PROMPT_TOKEN_BUDGETS['event'],
+                              budget_report=self.prompt_budget_report)
+
+    # 常规行动本地判定
+    @component
+    def rules_engine(self):
+        if not RulesConfig.RULES_ENGINE_ENABLED:
+            return None
+        return LocalRulesEngine(self.world_loader)
+
+    # 行动判定微批处理（可选）
+    @component
+    def batch_judge(self):
+        if not BatchConfig.BATCH_ENABLED:
+            return None
+        from utils.batch_judge import BatchJudge
 
-# 确保数据目录存在
-os.makedirs("data", exist_ok=True)
+        return BatchJudge(
+            self.client,
+            self.prompt_builder,
+            window_ms=BatchConfig.BATCH_WINDOW_MS,
+            max_batch_size=BatchConfig.BATCH_MAX_SIZE,
+            use_json_format=USE_JSON_FORMAT
+        )
+
+    # 文件保存的分组提交写入器（json 后端使用；sqlite 后端按持久化模式设置 synchronous）
+    @component
+    def save_writer(self):
+        if StorageConfig.PLAYER_STORE_BACKEND != "json":
+            return None
+        return GroupCommitWriter(
+            StorageConfig.SAVE_DURABILITY,
+            window_ms=StorageConfig.SAVE_GROUP_COMMIT_WINDOW_MS,
+            fsync_interval_ms=StorageConfig.SAVE_FSYNC_INTERVAL_MS
+        )
+
+    # 玩家仓库（按会话区分玩家）
+    @component
+    def player_repo(self):
+        return create_player_repository(
+            StorageConfig.PLAYER_STORE_BACKEND,
+            StorageConfig.PLAYER_STORE_PATH,
+            StorageConfig.JOURNAL_SNAPSHOT_INTERVAL,
+            durability=StorageConfig.SAVE_DURABILITY,
+            writer=self.save_writer,
+            keep_snapshots=StorageConfig.JOURNAL_KEEP_SNAPSHOTS
+        )
+
+    # 本地事件池，事件文件修改后自动重建
+    @component
+    def event_pool(self):
+        return EventPoolLoader(
+            EVENTS_FILE,
+            load_events,
+            type_weights=EventConfig.EVENT_TYPE_WEIGHTS,
+            fate_modifiers=EventConfig.FATE_EVENT_MODIFIERS,
+            difficulty_modifiers=EventConfig.DIFFICULTY_MODIFIERS
+        )
+
+    # 事件选项预判（可选）
+    @component
+    def speculator(self):
+        if not SpeculationConfig.SPECULATION_ENABLED:
+            return None
+        return SpeculativeJudge(
+            judge_action,
+            max_workers=SpeculationConfig.SPECULATION_MAX_WORKERS,
+            max_calls_per_player=SpeculationConfig.SPECULATION_MAX_CALLS_PER_PLAYER,
+            window_seconds=SpeculationConfig.SPECULATION_WINDOW_SECONDS,
+            result_timeout=SpeculationConfig.SPECULATION_RESULT_TIMEOUT
+        )
+
+    # 后台任务队列（任务模式，可选）
+    @component
+    def job_queue(self):
+        if not JobConfig.JOB_QUEUE_ENABLED:
+            return None
+        return JobQueue(
+            max_workers=JobConfig.JOB_WORKERS,
+            max_queued=JobConfig.JOB_MAX_QUEUED,
+            deadline_seconds=JobConfig.JOB_DEADLINE_SECONDS,
+            result_ttl_seconds=JobConfig.JOB_RESULT_TTL_SECONDS,
+            on_error=job_error_message
+        )
+
+    def warm_up(self):
+        """构建全部组件并预加载世界设定、事件与模板、prompt 固定前缀，首个请求不再承担初始化开销"""
+        for name in COMPONENTS:
+            getattr(self, name)
+        self.prompt_builder.get_static_prefix()
+        self.event_pool.get()
+
+
+COMPONENTS = tuple(name for name, value in vars(Services).items() if isinstance(value, property))
+services = Services()
+
+
+def create_app(warm_up=False):
+    """
+    创建 Flask 应用
+    组件在首次使用时构建；warm_up=True 时在返回前构建全部组件并预加载数据，
+    适合先预热再接入流量的部署（如 gunicorn 'app:create_app(warm_up=True)'）
+    """
+    if not os.getenv("DEEPSEEK_API_KEY"):
+        raise RuntimeError("❌ 环境变量 DEEPSEEK_API_KEY 未设置，请检查 .env 文件")
+
+    flask_app = Flask(__name__)
+    # 未配置时每个进程随机生成：重启后旧会话失效，多进程部署需配置 SECRET_KEY
+    flask_app.secret_key = os.getenv("SECRET_KEY") or secrets.token_hex(32)
+
+    # 指标统计
+    metrics_registry.enabled = MetricsConfig.METRICS_ENABLED
+
+    # 确保数据目录存在
+    os.makedirs("data", exist_ok=True)
+
+    flask_app.register_blueprint(bp)
+    if warm_up:
+        services.warm_up()
+    return flask_app
+
+
+def __getattr__(name):
+    # 兼容按模块属性访问的旧用法：app.app 首次访问时创建应用，app.client 等转到 services
+    if name == "app":
+        with services._lock:
+            if "app" not in globals():
+                globals()["app"] = create_app()
+        return globals()["app"]
+    if name in COMPONENTS or name in ("hedged_clients", "prompt_budget_report"):
+        return getattr(services, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # 初始化玩家数据
@@ -60,25 +347,37 @@ def init_player():
             "luck": 5
         },
         "history": [],
+        "past_deeds": None,
         "current_event": None
     }
 
 
+# 获取当前会话的玩家ID
+def get_player_id():
+    if "player_id" not in session:
+        session["player_id"] = uuid.uuid4().hex
+        session.permanent = True
+    return session["player_id"]
+
+
 # 加载或创建玩家数据
-def load_player():
-    if os.path.exists(PLAYER_FILE):
-        with open(PLAYER_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    else:
+def load_player(player_id):
+    with STAGE_SECONDS.time(stage="load_player"):
+        player = services.player_repo.load(player_id)
+    if player is None and StorageConfig.LEGACY_PLAYER_FILE:
+        player = import_legacy_save(services.player_repo, player_id, StorageConfig.LEGACY_PLAYER_FILE,
+                                    MAX_HISTORY_LENGTH)
+    if player is None:
         player = init_player()
-        save_player(player)
-        return player
+        save_player(player_id, player)
+    with STAGE_SECONDS.time(stage="load_history"):
+        player["history"] = services.player_repo.get_history(player_id, MAX_HISTORY_LENGTH)
+    return player
 
 
-# 保存玩家数据
-def save_player(player):
-    with open(PLAYER_FILE, 'w', encoding='utf-8') as f:
-        json.dump(player, f, ensure_ascii=False, indent=2)
+# 整体保存玩家数据（创建、重置时使用；日常变化通过 record_events 追加；历史记录由仓库单独追加）
+def save_player(player_id, player):
+    services.player_repo.save(player_id, player)
 
 
 # 加载事件数据
@@ -112,87 +411,339 @@ def load_events():
                 }
             ]
         }
-        with open(EVENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(default_events, f, ensure_ascii=False, indent=2)
+        atomic_write_json(EVENTS_FILE, default_events)
         return default_events
 
 
+# 事件文件无法读取时使用的默认事件
+DEFAULT_EVENT = {
+    "id": "default_event",
+    "name": "平静的一天",
+    "description": "今天风和日丽，适合修炼。你打算如何度过？",
+    "choices": [
+        {"text": "静心修炼", "action": "meditate"},
+        {"text": "外出历练", "action": "explore"},
+        {"text": "整理收获", "action": "organize"}
+    ]
+}
+
+
 # 构建增强的 prompt
 def generate_prompt(player, user_input, context=None):
     """使用增强版prompt构建器生成prompt"""
-    return prompt_builder.generate_prompt(player, user_input, context)
+    with STAGE_SECONDS.time(stage="prompt_build"):
+        return services.prompt_builder.generate_prompt(player, user_input, context)
 
 
 # 修改 call_deepseek 函数
-def call_deepseek(prompt):
-    """调用DeepSeek API并处理响应"""
-    use_json_format = (DEEPSEEK_MODEL == "deepseek-chat")
-    result = client.call_api(prompt, use_json_format=use_json_format)
-    return validate_deepseek_result(result)
-
-# 处理玩家行动
-def process_action(player, action, context=None):
+def call_deepseek(prompt, **routing):
+    """调用DeepSeek API并处理响应（routing 为模型路由参数，见 routing_options）"""
+    result = services.client.call_api(prompt, use_json_format=USE_JSON_FORMAT, **routing)
+    with STAGE_SECONDS.time(stage="validate_result"):
+        return validate_deepseek_result(result)
+
+# 判定玩家行动（优先使用缓存）
+def judge_action(player, action, context=None):
+    local = resolve_locally(player, action, context)
+    if local is not None:
+        return local
+
+    cache_key = make_state_key("action", player, action, context)
+    cached = lookup_cache(cache_key)
+    if cached is not None:
+        return cached
+
+    if services.batch_judge is not None:
+        result = services.batch_judge.judge(player, action, context, **routing_options(player, action, context))
+    else:
+        prompt = generate_prompt(player, action, context)
+        result = call_deepseek(prompt, **routing_options(player, action, context))
+    remember_result(cache_key, result)
+    return result
+
+
+# 模型路由开启时按行动复杂度选择模型
+def routing_options(player, action, context=None):
+    if services.model_router is None:
+        return {}
+    return {"complexity": action_complexity(player, action, context)}
+
+
+# 常规行动由本地规则判定，非常规行动返回 None
+def resolve_locally(player, action, context=None):
+    if services.rules_engine is None:
+        return None
+    with STAGE_SECONDS.time(stage="rules_engine"):
+        result = services.rules_engine.resolve(player, action, event_difficulty(player, context))
+    if result is not None and RulesConfig.RULES_ENGINE_LLM_NARRATION:
+        # 结果已定，只请模型润色描述；失败时保留模板描述
+        try:
+            narrated = call_deepseek(services.prompt_builder.build_narration_prompt(player, action, result, context))
+            if not services.client.is_degraded_response(narrated):
+                result["描述"] = narrated["描述"]
+        except LLMUnavailableError:
+            pass
+    return result
+
+
+# 事件选项按事件标注的难度修正本地判定的成功率，自由行动不受影响
+def event_difficulty(player, context):
+    event = player.get("current_event")
+    if context is None or not event or event.get("description") != context:
+        return 1.0
+    return EventConfig.DIFFICULTY_MODIFIERS.get(event.get("difficulty", "normal"), 1.0)
+
+
+def lookup_cache(cache_key):
+    if services.response_cache is None:
+        return None
+    with STAGE_SECONDS.time(stage="cache_lookup"):
+        cached = services.response_cache.get(cache_key)
+    # 旧版本写入的带奖励条目按未命中处理
+    return cached if cached is not None and not grants_rewards(cached) else None
+
+
+def remember_result(cache_key, result):
+    # 获得物品或功法的结果不缓存，否则重复同一行动即可反复领取
+    if services.response_cache is not None and not services.client.is_degraded_response(result) \
+            and not grants_rewards(result):
+        services.response_cache.put(cache_key, result)
+
+
+def grants_rewards(result):
+    changes = result.get("状态变化") or {}
+    return bool(changes.get("new_items") or changes.get("new_skills"))
+
+
+# 处理玩家行动（judged 为已完成的预判结果）
+def process_action(player_id, player, action, context=None, judged=None, resolves_event=False):
+    result = judged if judged is not None else judge_action(player, action, context)
+    apply_result(player_id, player, action, result, resolves_event)
+    return result
+
+
+# 流式处理玩家行动，产出 SSE 消息
+def stream_action(player_id, player, action, context=None, judged=None, resolves_event=False):
+    cache_key = make_state_key("action", player, action, context)
+    if judged is None:
+        judged = resolve_locally(player, action, context)
+    if judged is None:
+        judged = lookup_cache(cache_key)
+    if judged is not None:
+        yield sse_message("narration", {"text": judged.get("描述", "")})
+        apply_result(player_id, player, action, judged, resolves_event)
+        yield sse_message("result", {"result": judged, "player": player})
+        return
+
     prompt = generate_prompt(player, action, context)
-    result = call_deepseek(prompt)
-
-    # 更新玩家状态
-    if "状态变化" in result:
-        changes = result["状态变化"]
-        player["hp"] = max(0, min(100, player["hp"] + changes.get("hp", 0)))
-        player["spiritual_energy"] = max(0, min(100, player["spiritual_energy"] + changes.get("spiritual_energy", 0)))
-
-        if changes.get("new_items"):
-            player["inventory"].extend(changes["new_items"])
-        if changes.get("new_skills"):
-            player["skills"].extend(changes["new_skills"])
-        if changes.get("realm_change"):
-            player["realm"] = changes["realm_change"]
-
-    # 记录历史（限制长度）
-    player["history"].append({
-        "timestamp": datetime.now().isoformat(),
-        "action": action,
-        "result": result
-    })
+    parser = NarrationStreamParser()
+
+    upstream = services.client.stream_api(prompt, use_json_format=USE_JSON_FORMAT,
+                                          **routing_options(player, action, context))
+    result = None
+    try:
+        for kind, payload in upstream:
+            if result is not None:
+                # 已结算，继续读完剩余输出：token 用量与前缀缓存命中在最后一段中返回
+                continue
+            if kind == "delta":
+                narration = parser.feed(payload)
+                if narration:
+                    yield sse_message("narration", {"text": narration})
+                if not parser.closed:
+                    continue
+                # 顶层对象已闭合，立即结算，不再等待模型后续输出
+                payload = services.client.parse_content(parser.object_text)
+
+            with STAGE_SECONDS.time(stage="validate_result"):
+                result = validate_deepseek_result(payload)
+            remember_result(cache_key, result)
+            apply_result(player_id, player, action, result, resolves_event)
+            yield sse_message("result", {"result": result, "player": player})
+    except LLMUnavailableError:
+        # 结算后读取剩余输出时中断不影响本回合
+        if result is None:
+            yield sse_message("error", {"error": LLM_UNAVAILABLE_MESSAGE})
+    finally:
+        upstream.close()
+
+
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(generator):
+    return Response(
+        stream_with_context(generator),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# 事件选项对应的行动文字
+def choice_action_text(event, choice):
+    return f"在'{event['name']}'事件中，选择了：{choice['text']}"
+
+
+# 展示事件后预判全部选项
+def start_speculation(player_id, player, event):
+    if services.speculator is None:
+        return
+    actions = [(choice_action_text(event, choice), event['description'])
+               for choice in event.get("choices", [])]
+    services.speculator.speculate(player_id, player, make_state_key("speculation", player), actions)
+
+
+# 取出所选选项的预判结果（没有时返回 None）
+def take_speculation(player_id, player, choice_index, action_text, context):
+    if services.speculator is None:
+        return None
+    return services.speculator.take(player_id, choice_index, action_text, context,
+                           make_state_key("speculation", player))
+
+
+# 记录状态变化事件：先应用到内存中的玩家，再追加到日志
+def record_events(player_id, player, events):
+    for event in events:
+        apply_event(player, event)
+    with STAGE_SECONDS.time(stage="save_state"):
+        services.player_repo.append_events(player_id, events, player)
+
+
+# 结算行动结果：更新状态、记录历史并保存（resolves_event 表示该行动是对当前事件的选择）
+def apply_result(player_id, player, action, result, resolves_event=False):
+    events = result_events(result)
+    if resolves_event:
+        events.append(make_event(EVENT_CLEARED))
+
+    # 记录历史：只保存紧凑记录，描述文字单独存储；挤出的旧记录并入过往事迹
+    entry, narration = make_history_record(action, result)
+
+    def fold_evicted(evicted):
+        return [make_event(PAST_DEEDS_UPDATED, digest=fold_into_digest(player.get("past_deeds"), evicted))]
+
+    # 一个回合的历史记录与状态变化在同一次提交中写入
+    with STAGE_SECONDS.time(stage="save_state"):
+        events = services.player_repo.append_turn(player_id, entry, MAX_HISTORY_LENGTH, narration,
+                                                  events, fold_evicted)
+    for event in events:
+        apply_event(player, event)
 
     # 只保留最近的历史记录
+    player["history"].append(entry)
     if len(player["history"]) > MAX_HISTORY_LENGTH:
         player["history"] = player["history"][-MAX_HISTORY_LENGTH:]
 
-    # 保存玩家数据
-    save_player(player)
 
-    return result
+class EventChangedError(Exception):
+    """选择事件选项的任务执行时，玩家的当前事件已不是提交时的那个"""
+
+
+# 事件的标识：id 加描述，同一 id 被重新生成时也能区分
+def event_reference(event):
+    return [event.get("id"), event.get("description")] if event else None
+
+
+def ensure_event_unchanged(player, event_ref):
+    if event_reference(player.get("current_event")) != event_ref:
+        raise EventChangedError(EVENT_CHANGED_MESSAGE)
+
+
+def job_error_message(error):
+    if isinstance(error, LLMUnavailableError):
+        return LLM_UNAVAILABLE_MESSAGE
+    if isinstance(error, EventChangedError):
+        return EVENT_CHANGED_MESSAGE
+    return "推演失败，请稍后再试"
+
+
+# 后台任务：执行时重新读取玩家，判定完成且任务仍有效时才结算；
+# 事件选项任务带着提交时的事件标识（event_ref），事件已变化时拒绝执行
+def run_action_job(job, player_id, action, context=None, choice_index=None, event_ref=None):
+    player = load_player(player_id)
+    judged = None
+    if choice_index is not None:
+        ensure_event_unchanged(player, event_ref)
+        judged = take_speculation(player_id, player, choice_index, action, context)
+    if judged is None:
+        judged = judge_action(player, action, context)
+    if choice_index is not None:
+        # 判定期间玩家可能已获取了新事件
+        ensure_event_unchanged(services.player_repo.load(player_id) or {}, event_ref)
+    if not services.job_queue.begin_commit(job):
+        return None
+    apply_result(player_id, player, action, judged, resolves_event=(choice_index is not None))
+    return {"result": judged, "player": player}
+
+
+# 提交后台任务，返回 202 与任务地址
+def submit_action_job(player_id, kind, action, context=None, choice_index=None, event_ref=None):
+    job = services.job_queue.submit(player_id, kind, run_action_job, player_id, action, context,
+                                    choice_index, event_ref)
+    response = jsonify({"job": job.to_dict()})
+    response.status_code = 202
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return response
 
-@app.route('/api/event', methods=['GET'])
-def get_dynamic_event():
+
+def wants_job(data):
+    return services.job_queue is not None and bool(data.get('async'))
+
+
+# 任务状态的 SSE 推送：先推送当前状态，结束时推送结果或错误
+def job_events(job):
+    yield sse_message("status", {"job": job.to_dict()})
+    while not job.finished:
+        services.job_queue.wait(job, JOB_HEARTBEAT_SECONDS)
+        if not job.finished:
+            yield ": keep-alive\n\n"
+    if job.result is not None:
+        yield sse_message("result", job.result)
+    else:
+        yield sse_message("error", {"error": job.error, "status": job.status})
+
+
+# 由模型按玩家状态生成事件选项
+def generate_dynamic_event(player):
+    return {
+        "id": f"dynamic_{datetime.now().timestamp()}",
+        "name": "命运抉择",
+        "description": _generate_event_description(player),
+        "choices": services.event_generator.generate_event_choices(player)
+    }
+
+
+# 从本地事件池按命格、境界与状态抽取事件
+def sample_pool_event(player):
     try:
-        player = load_player()
-        event_choices = event_generator.generate_event_choices(player)
-
-        dynamic_event = {
-            "id": f"dynamic_{datetime.now().timestamp()}",
-            "name": "命运抉择",
-            "description": _generate_event_description(player),
-            "choices": event_choices
-        }
+        with STAGE_SECONDS.time(stage="event_pool"):
+            return services.event_pool.get().sample(player)
+    except Exception as e:
+        print(f"获取事件错误: {e}")
+        return None
 
-        player["current_event"] = dynamic_event
-        save_player(player)
-        return jsonify(dynamic_event)
 
+# 由模板合成器在本地生成事件
+def synthesize_event(player):
+    if services.event_synthesizer is None:
+        return None
+    try:
+        with STAGE_SECONDS.time(stage="event_synth"):
+            return services.event_synthesizer.synthesize_event(player)
     except Exception as e:
-        print(f"动态事件生成失败: {e}")
-        return jsonify({
-            "id": "fallback_event",
-            "name": "日常修炼",
-            "description": "又是平静的一天，你该如何度过？",
-            "choices": [
-                {"text": "潜心修炼", "action": "cultivate"},
-                {"text": "外出历练", "action": "explore"},
-                {"text": "整理收获", "action": "organize"}
-            ]
-        })
+        print(f"本地合成事件失败: {e}")
+        return None
+
+
+# 不调用模型的本地事件：按来源偏好依次尝试事件池与合成器，都不可用时返回默认事件
+def local_event(player, prefer_synth=False):
+    sources = (synthesize_event, sample_pool_event) if prefer_synth else (sample_pool_event, synthesize_event)
+    for source in sources:
+        event = source(player)
+        if event is not None:
+            return event
+    return dict(DEFAULT_EVENT)
+
 
 def _generate_event_description(player):
     descriptions = [
@@ -200,23 +751,77 @@ def _generate_event_description(player):
         f"天机涌动，因果纠缠，三条道路浮现在{player['name']}面前...",
         f"风云变幻，机缘与危机并存，{player['name']}该如何选择？"
     ]
-    import random
     return random.choice(descriptions)
 
 
+# 模型服务不可用时不结算行动，直接告知玩家稍后重试
+@bp.app_errorhandler(LLMUnavailableError)
+def handle_llm_unavailable(error):
+    response = jsonify({"error": LLM_UNAVAILABLE_MESSAGE})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(int(LLMConfig.BREAKER_RESET_SECONDS))
+    return response
+
+
+# 任务队列已满：返回 429 与建议的重试间隔
+@bp.app_errorhandler(QueueFullError)
+def handle_queue_full(error):
+    response = jsonify({"error": str(error)})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+@bp.app_errorhandler(PlayerBusyError)
+def handle_player_busy(error):
+    return jsonify({"error": str(error), "job": error.job.to_dict()}), 409
+
+
+# 请求指标：记录当前路由供模型 token 用量归类
+@bp.before_app_request
+def start_request_metrics():
+    if metrics_registry.enabled:
+        current_route.set(request.url_rule.rule if request.url_rule else "unmatched")
+        g.request_started = time.perf_counter()
+
+
+@bp.after_app_request
+def finish_request_metrics(response):
+    if metrics_registry.enabled and "request_started" in g:
+        route = current_route.get()
+        REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, route=route)
+    return response
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    if not metrics_registry.enabled:
+        return jsonify({"error": "指标统计未开启"}), 404
+    return Response(metrics_registry.render(), mimetype="text/plain; version=0.0.4")
+
+
 # 路由定义
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
 
-@app.route('/api/player', methods=['GET'])
+@bp.route('/api/player', methods=['GET'])
 def get_player():
-    player = load_player()
+    player = load_player(get_player_id())
     return jsonify(player)
 
 
-@app.route('/api/action', methods=['POST'])
+@bp.route('/api/history/<entry_id>', methods=['GET'])
+def get_history_narration(entry_id):
+    narration = services.player_repo.get_narration(get_player_id(), entry_id)
+    if narration is None:
+        return jsonify({"error": "记录不存在"}), 404
+    return jsonify(narration)
+
+
+@bp.route('/api/action', methods=['POST'])
 def player_action():
     data = request.json
     action = data.get('action', '')
@@ -224,8 +829,11 @@ def player_action():
     if not action:
         return jsonify({"error": "请输入行动"}), 400
 
-    player = load_player()
-    result = process_action(player, action)
+    player_id = get_player_id()
+    if wants_job(data):
+        return submit_action_job(player_id, "action", action)
+    player = load_player(player_id)
+    result = process_action(player_id, player, action)
 
     return jsonify({
         "result": result,
@@ -233,62 +841,76 @@ def player_action():
     })
 
 
-@app.route('/api/event', methods=['GET'])
-def get_random_event():
-    try:
-        events = load_events()
-        random_events = events.get("random_events", [])
-
-        if random_events:
-            event = random.choice(random_events)
-            player = load_player()
-            player["current_event"] = event
-            save_player(player)
-            return jsonify(event)
-        else:
-            return jsonify({"error": "没有可用事件"}), 404
-    except Exception as e:
-        print(f"获取事件错误: {e}")
-        # 如果加载失败，返回一个默认事件
-        default_event = {
-            "id": "default_event",
-            "name": "平静的一天",
-            "description": "今天风和日丽，适合修炼。你打算如何度过？",
-            "choices": [
-                {"text": "静心修炼", "action": "meditate"},
-                {"text": "外出历练", "action": "explore"},
-                {"text": "整理收获", "action": "organize"}
-            ]
-        }
-        player = load_player()
-        player["current_event"] = default_event
-        save_player(player)
-        return jsonify(default_event)
+@bp.route('/api/action/stream', methods=['POST'])
+def player_action_stream():
+    data = request.json
+    action = data.get('action', '')
 
+    if not action:
+        return jsonify({"error": "请输入行动"}), 400
 
-@app.route('/api/choice', methods=['POST'])
-def make_choice():
-    data = request.json
-    choice_index = data.get('choice_index', 0)
+    player_id = get_player_id()
+    player = load_player(player_id)
+    return sse_response(stream_action(player_id, player, action))
 
-    player = load_player()
+
+@bp.route('/api/event', methods=['GET'])
+def get_event():
+    player_id = get_player_id()
+    player = load_player(player_id)
+
+    event = None
+    if EventConfig.EVENT_SOURCE == "llm":
+        # 一部分低风险事件直接本地合成，不占用模型调用
+        if random.random() < EventConfig.EVENT_SYNTH_RATE:
+            event = synthesize_event(player)
+        if event is None:
+            try:
+                event = generate_dynamic_event(player)
+            except Exception as e:
+                print(f"动态事件生成失败: {e}")
+    if event is None:
+        event = local_event(player, prefer_synth=(EventConfig.EVENT_SOURCE != "pool"))
+
+    record_events(player_id, player, [make_event(EVENT_PRESENTED, event=event)])
+    start_speculation(player_id, player, event)
+    return jsonify(event)
+
+
+# 解析事件选择，返回 (行动文字, 事件描述) 或错误响应
+def resolve_choice(player, choice_index):
     current_event = player.get("current_event")
 
     if not current_event:
-        return jsonify({"error": "当前没有事件"}), 400
+        return None, (jsonify({"error": "当前没有事件"}), 400)
 
     choices = current_event.get("choices", [])
     if choice_index >= len(choices):
-        return jsonify({"error": "无效的选择"}), 400
+        return None, (jsonify({"error": "无效的选择"}), 400)
+
+    action_text = choice_action_text(current_event, choices[choice_index])
 
-    chosen = choices[choice_index]
-    action_text = f"在'{current_event['name']}'事件中，选择了：{chosen['text']}"
+    # 当前事件在结算时随行动结果一并清除
+    return (action_text, current_event['description']), None
+
+
+@bp.route('/api/choice', methods=['POST'])
+def make_choice():
+    data = request.json
+    choice_index = data.get('choice_index', 0)
 
-    result = process_action(player, action_text, current_event['description'])
+    player_id = get_player_id()
+    player = load_player(player_id)
+    choice, error = resolve_choice(player, choice_index)
+    if error:
+        return error
 
-    # 清除当前事件
-    player["current_event"] = None
-    save_player(player)
+    action_text, context = choice
+    if wants_job(data):
+        return submit_action_job(player_id, "choice", action_text, context, choice_index,
+                                 event_reference(player["current_event"]))
+    judged = take_speculation(player_id, player, choice_index, action_text, context)
+    result = process_action(player_id, player, action_text, context, judged=judged, resolves_event=True)
 
     return jsonify({
         "result": result,
@@ -296,12 +918,108 @@ def make_choice():
     })
 
 
-@app.route('/api/reset', methods=['POST'])
+@bp.route('/api/choice/stream', methods=['POST'])
+def make_choice_stream():
+    data = request.json
+    choice_index = data.get('choice_index', 0)
+
+    player_id = get_player_id()
+    player = load_player(player_id)
+    choice, error = resolve_choice(player, choice_index)
+    if error:
+        return error
+
+    action_text, context = choice
+    judged = take_speculation(player_id, player, choice_index, action_text, context)
+    return sse_response(stream_action(player_id, player, action_text, context,
+                                      judged=judged, resolves_event=True))
+
+
+@bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询任务；wait 参数（秒）用于长轮询，任务结束或等待超时后返回"""
+    job = services.job_queue.get(job_id, get_player_id()) if services.job_queue is not None else None
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    wait = min(request.args.get('wait', 0, type=float), JobConfig.JOB_MAX_WAIT_SECONDS)
+    if wait > 0 and not job.finished:
+        services.job_queue.wait(job, wait)
+    return jsonify({"job": job.to_dict()})
+
+
+@bp.route('/api/jobs/<job_id>/events', methods=['GET'])
+def subscribe_job(job_id):
+    job = services.job_queue.get(job_id, get_player_id()) if services.job_queue is not None else None
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return sse_response(job_events(job))
+
+
+@bp.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = services.job_queue.get(job_id, get_player_id()) if services.job_queue is not None else None
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    if not services.job_queue.cancel(job):
+        return jsonify({"error": "任务已结束或正在结算，无法取消", "job": job.to_dict()}), 409
+    return jsonify({"job": job.to_dict()})
+
+
+@bp.route('/api/stats', methods=['GET'])
+def get_stats():
+    return jsonify({
+        "model": services.client.model,
+        "model_router": services.model_router.stats() if services.model_router is not None else None,
+        "hedging": {hedged.model: hedged.stats() for hedged in services.hedged_clients} or None,
+        "usage": services.client.get_usage_stats(),
+        "resilience": services.client.get_resilience_stats(),
+        "response_cache": services.response_cache.stats() if services.response_cache is not None else None,
+        "speculation": services.speculator.stats() if services.speculator is not None else None,
+        "batching": services.batch_judge.stats() if services.batch_judge is not None else None,
+        "jobs": services.job_queue.stats() if services.job_queue is not None else None,
+        "rules_engine": services.rules_engine.stats() if services.rules_engine is not None else None,
+        "event_pool": services.event_pool.get().stats(),
+        "event_synthesizer": services.event_synthesizer.stats() if services.event_synthesizer is not None else None,
+        "prompt_budget": services.prompt_budget_report.stats(),
+        "world_settings": services.world_loader.store.stats(),
+        "save_writer": services.save_writer.stats() if services.save_writer is not None else None
+    })
+
+
+@bp.route('/api/journal', methods=['GET'])
+def get_journal():
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({"events": services.player_repo.get_journal(get_player_id(), limit)})
+
+
+@bp.route('/api/journal/restore', methods=['POST'])
+def restore_journal():
+    seq = (request.json or {}).get('seq')
+    if not isinstance(seq, int):
+        return jsonify({"error": "缺少 seq"}), 400
+
+    player_id = get_player_id()
+    restored = services.player_repo.load_at(player_id, seq)
+    if restored is None:
+        return jsonify({"error": "无法还原到该时间点"}), 404
+
+    # 还原本身也记为一次整体替换，日志不会被改写
+    save_player(player_id, restored)
+    if services.speculator is not None:
+        services.speculator.cancel(player_id)
+    return jsonify({"message": "已还原", "player": load_player(player_id)})
+
+
+@bp.route('/api/reset', methods=['POST'])
 def reset_game():
+    player_id = get_player_id()
     player = init_player()
-    save_player(player)
+    save_player(player_id, player)
+    services.player_repo.clear_history(player_id)
+    if services.speculator is not None:
+        services.speculator.cancel(player_id)
     return jsonify({"message": "游戏已重置", "player": player})
 
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    create_app(warm_up=True).run(debug=True, port=5000)
\ No newline at end of file
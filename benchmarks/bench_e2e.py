@@ -0,0 +1,150 @@
+"""
+离线端到端基准
+启动本地模拟模型服务，把 DEEPSEEK_BASE_URL 指向它，再通过 Flask 测试客户端
+以多个虚拟玩家并发执行：查看状态 -> 自由行动 -> 获取事件 -> 做出选择。
+报告吞吐量、各接口 p50/p95/p99 延迟与各处理阶段耗时，结果保存为 JSON 以便跨提交对比。
+
+用法：
+    python -m benchmarks.bench_e2e
+    python -m benchmarks.bench_e2e --players 8 --rounds 10 --latency lognormal:300,0.5 --stream
+    python -m benchmarks.bench_e2e --env RESPONSE_CACHE_ENABLED=0 --env BATCH_ENABLED=1
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.common import REPO_ROOT, StageTimer, summarize, save_results, git_revision
+from benchmarks.stub_llm_server import start_stub_server
+
+ACTIONS = ["打坐", "疗伤", "修炼功法", "探索附近的山洞", "挑战山中的妖狼", "去坊市打听消息"]
+
+
+def configure_environment(base_url: str, overrides: dict) -> str:
+    """在导入 app 之前设置环境变量，数据写入临时目录"""
+    data_dir = tempfile.mkdtemp(prefix="bench-e2e-")
+    os.environ.update({
+        "DEEPSEEK_API_KEY": "bench",
+        "DEEPSEEK_MODEL": "deepseek-chat",
+        "DEEPSEEK_BASE_URL": base_url,
+        "PLAYER_STORE_PATH": os.path.join(data_dir, "players.db"),
+        "RESPONSE_CACHE_PATH": os.path.join(data_dir, "response_cache.db"),
+        "LEGACY_PLAYER_FILE": "",
+    })
+    os.environ.update(overrides)
+    return data_dir
+
+
+def instrument(app_module, timer: StageTimer) -> None:
+    """给主要处理阶段套上计时（函数在调用时按全局名查找，替换模块属性即可生效）"""
+    for name in ("load_player", "judge_action", "resolve_locally", "generate_prompt", "apply_result"):
+        setattr(app_module, name, timer.wrap(name, getattr(app_module, name)))
+
+    client = app_module.client
+    client.call_api = timer.wrap("llm.call_api", client.call_api)
+    generator = app_module.event_generator
+    generator.generate_event_choices = timer.wrap("event_generator", generator.generate_event_choices)
+    repo = app_module.player_repo
+    for name in ("load", "append_events", "append_turn", "get_history"):
+        setattr(repo, name, timer.wrap(f"store.{name}", getattr(repo, name)))
+
+
+def run_player(client, rounds: int, stream: bool, rng: random.Random, latencies, errors, lock):
+    def timed(route, call):
+        start = time.perf_counter()
+        response = call()
+        # 流式响应在读取完正文后才算结束
+        body = response.get_data()
+        elapsed = time.perf_counter() - start
+        failed = response.status_code >= 400 or (stream and b"event: error" in body)
+        with lock:
+            latencies[route].append(elapsed)
+            if failed:
+                errors[route] += 1
+        return response
+
+    action_route = "/api/action/stream" if stream else "/api/action"
+    choice_route = "/api/choice/stream" if stream else "/api/choice"
+    for _ in range(rounds):
+        timed("/api/player", lambda: client.get("/api/player"))
+        timed(action_route, lambda: client.post(action_route, json={"action": rng.choice(ACTIONS)}))
+        event = timed("/api/event", lambda: client.get("/api/event"))
+        choices = (event.get_json(silent=True) or {}).get("choices") or [None]
+        timed(choice_route, lambda: client.post(choice_route, json={"choice_index": rng.randrange(len(choices))}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端基准")
+    parser.add_argument("--players", type=int, default=4, help="并发虚拟玩家数")
+    parser.add_argument("--rounds", type=int, default=5, help="每名玩家的回合数")
+    parser.add_argument("--latency", default="lognormal:200,0.4", help="模拟模型延迟分布")
+    parser.add_argument("--replay", help="回放文件（JSONL）")
+    parser.add_argument("--stream", action="store_true", help="使用流式接口")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env", action="append", default=[], help="额外的环境变量 KEY=VALUE")
+    parser.add_argument("--output", help="结果文件路径（默认 benchmarks/results/ 下）")
+    args = parser.parse_args()
+
+    overrides = dict(item.split("=", 1) for item in args.env)
+    server, base_url, stub_stats = start_stub_server(latency=args.latency, replay=args.replay, seed=args.seed)
+    configure_environment(base_url, overrides)
+
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+    import app as app_module
+
+    timer = StageTimer()
+    instrument(app_module, timer)
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_player, args=(app_module.app.test_client(), args.rounds, args.stream,
+                                                  random.Random(args.seed + i), latencies, errors, lock))
+        for i in range(args.players)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    total = sum(len(v) for v in latencies.values())
+    results = {
+        "meta": {
+            "benchmark": "e2e",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "args": vars(args),
+        },
+        "duration_seconds": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "routes": {route: dict(summarize(values), errors=errors[route]) for route, values in sorted(latencies.items())},
+        "stages": timer.summary(),
+        "stub_llm_requests": stub_stats["requests"],
+        "app_stats": app_module.app.test_client().get("/api/stats").get_json(),
+    }
+    path = save_results("e2e", results, args.output)
+
+    print(f"{total} 个请求，用时 {elapsed:.2f}s，吞吐 {results['throughput_rps']} req/s，"
+          f"模型调用 {stub_stats['requests']} 次")
+    print(f"{'接口/阶段':<28}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'错误':>6}")
+    for route, summary in results["routes"].items():
+        print(f"{route:<28}{summary['count']:>6}{summary['p50_ms']:>10}{summary['p95_ms']:>10}"
+              f"{summary['p99_ms']:>10}{summary['errors']:>6}")
+    for stage, summary in results["stages"].items():
+        print(f"  {stage:<26}{summary['count']:>6}{summary['p50_ms']:>10}{summary['p95_ms']:>10}"
+              f"{summary['p99_ms']:>10}")
+    print(f"结果已保存：{path}")
+
+
+if __name__ == "__main__":
+    main()
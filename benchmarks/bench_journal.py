@@ -0,0 +1,108 @@
+"""
+玩家日志基准
+在 SQLite 仓库中为若干玩家连续追加回合，对比保留全部日志与只保留最近几个快照时
+每回合写入、加载的耗时与表的行数，并检查：
+- 清理开启时每位玩家的事件与快照行数不随回合数增长（不超过 保留数 × 快照间隔 + 间隔）
+- 两种方式加载出的玩家状态完全一致
+检查不通过时以非零状态退出。
+
+用法：
+    python -m benchmarks.bench_journal [--players 5] [--turns 500] [--interval 20] [--keep 2]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from utils.player_store import SQLitePlayerRepository
+from utils.history import make_history_record
+from utils.player_journal import make_event, result_events, PAST_DEEDS_UPDATED
+from benchmarks.common import summarize
+
+PLAYER = {
+    "name": "无名修士", "realm": "炼气期一层", "hp": 100, "spiritual_energy": 100,
+    "artifacts": [], "skills": [], "fate": "普通", "side_effects": [], "inventory": [],
+    "attributes": {"strength": 10, "intelligence": 10, "agility": 10, "luck": 5},
+    "history": [], "past_deeds": None, "current_event": None,
+}
+
+
+def turn_result(turn: int) -> dict:
+    return {"成功": turn % 3 != 0, "描述": f"第{turn}回合", "建议": "继续修炼",
+            "状态变化": {"hp": -1 if turn % 2 else 1, "spiritual_energy": 2 if turn % 2 else -2,
+                     "new_items": [f"灵石{turn}"] if turn % 7 == 0 else [], "new_skills": [], "realm_change": None}}
+
+
+def play(repo: SQLitePlayerRepository, players: int, turns: int) -> dict:
+    timings = {"append_turn": [], "load": []}
+    for p in range(players):
+        repo.save(f"p{p}", PLAYER)
+    for turn in range(turns):
+        for p in range(players):
+            player_id = f"p{p}"
+            result = turn_result(turn)
+            entry, narration = make_history_record(f"行动{turn}", result)
+            start = time.perf_counter()
+            repo.append_turn(player_id, entry, 20, narration, result_events(result),
+                             lambda evicted: [make_event(PAST_DEEDS_UPDATED, digest={"count": len(evicted)})])
+            timings["append_turn"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            repo.load(player_id)
+            timings["load"].append(time.perf_counter() - start)
+    return timings
+
+
+def row_counts(repo: SQLitePlayerRepository, player_id: str) -> tuple:
+    conn = repo._connect()
+    events = conn.execute("SELECT COUNT(*) FROM player_events WHERE player_id = ?", (player_id,)).fetchone()[0]
+    snapshots = conn.execute("SELECT COUNT(*) FROM player_snapshots WHERE player_id = ?",
+                             (player_id,)).fetchone()[0]
+    return events, snapshots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="玩家日志基准")
+    parser.add_argument("--players", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--interval", type=int, default=20, help="快照间隔（事件数）")
+    parser.add_argument("--keep", type=int, default=2, help="保留的快照数")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-journal-")
+    repos = {
+        "全部保留": SQLitePlayerRepository(os.path.join(work_dir, "all.db"), snapshot_interval=args.interval,
+                                       keep_snapshots=0),
+        f"保留 {args.keep} 个快照": SQLitePlayerRepository(os.path.join(work_dir, "pruned.db"),
+                                                     snapshot_interval=args.interval, keep_snapshots=args.keep),
+    }
+    failures = []
+    print(f"{'方式':<14}{'每人事件行':>10}{'每人快照行':>10}{'写入 p50':>12}{'写入 p99':>12}{'加载 p50':>12}")
+    for name, repo in repos.items():
+        timings = play(repo, args.players, args.turns)
+        events, snapshots = row_counts(repo, "p0")
+        write, load = summarize(timings["append_turn"]), summarize(timings["load"])
+        print(f"{name:<14}{events:>10}{snapshots:>10}{write['p50_ms']:>10.2f}ms{write['p99_ms']:>10.2f}ms"
+              f"{load['p50_ms']:>10.2f}ms")
+
+    pruned = repos[f"保留 {args.keep} 个快照"]
+    # 每次写快照后清理：最多保留 keep 个快照，事件不超过最早保留快照之后的部分加上一个间隔的余量
+    max_events = args.keep * args.interval + args.interval
+    for p in range(args.players):
+        events, snapshots = row_counts(pruned, f"p{p}")
+        if events > max_events or snapshots > args.keep:
+            failures.append(f"p{p} 行数超出上限：事件 {events}（上限 {max_events}），快照 {snapshots}（上限 {args.keep}）")
+        if pruned.load(f"p{p}") != repos["全部保留"].load(f"p{p}"):
+            failures.append(f"p{p} 清理后加载的状态与完整日志不一致")
+    shutil.rmtree(work_dir)
+
+    for failure in failures:
+        print(f"失败：{failure}")
+    if failures:
+        sys.exit(1)
+    print("检查通过：清理后行数有界，状态一致")
+
+
+if __name__ == "__main__":
+    main()
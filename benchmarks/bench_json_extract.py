@@ -0,0 +1,84 @@
+"""
+JSON 提取微基准
+对比单次扫描提取器与原先两种正则写法在典型模型输出上的耗时与成功率。
+
+用法：
+    python -m benchmarks.bench_json_extract [--number 2000]
+"""
+import argparse
+import json
+import re
+import timeit
+
+from utils.json_extract import extract_json_object
+
+RESULT = {
+    "成功": True,
+    "描述": "无名修士盘膝而坐，周身灵气{如潮}汇聚，经脉中传来\"噼啪\"轻响。" * 3,
+    "建议": "稳固境界后再行突破",
+    "状态变化": {"hp": -5, "spiritual_energy": 20, "new_items": ["聚灵丹"],
+                 "new_skills": [], "realm_change": None}
+}
+RAW = json.dumps(RESULT, ensure_ascii=False, indent=4)
+
+SAMPLES = {
+    "clean": RAW,
+    "fenced": f"```json\n{RAW}\n```",
+    "prose": f"好的，以下是判定结果：\n{RAW}\n以上结果仅供参考。",
+    "plus_sign": RAW.replace('"hp": -5', '"hp": +5'),
+    "trailing_comma": RAW.replace('"realm_change": null', '"realm_change": null,'),
+    "long_prefix": "天机推演中……" * 200 + RAW,
+}
+
+
+def legacy_non_greedy(text):
+    """原 json_validator 的写法"""
+    match = re.search(r'\{[\s\S]*?\}', text)
+    return json.loads(match.group()) if match else None
+
+
+def legacy_greedy(text):
+    """原 DeepSeekClient._parse_response 的写法"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        match = re.search(r'\{.*\}', text, re.DOTALL)
+        return json.loads(match.group()) if match else None
+
+
+PARSERS = {
+    "extract_json_object": extract_json_object,
+    "legacy_non_greedy": legacy_non_greedy,
+    "legacy_greedy": legacy_greedy,
+}
+
+
+def succeeds(parser, text):
+    """解析出完整的外层对象（含嵌套的状态变化）才算成功"""
+    try:
+        result = parser(text)
+    except Exception:
+        return False
+    return isinstance(result, dict) and result.get("描述") == RESULT["描述"] \
+        and result.get("状态变化", {}).get("new_items") == RESULT["状态变化"]["new_items"]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="JSON 提取微基准")
+    arg_parser.add_argument("--number", type=int, default=2000, help="每个样本的重复次数")
+    args = arg_parser.parse_args()
+
+    print(f"{'样本':<16}{'解析器':<22}{'微秒/次':>10}  结果")
+    for sample_name, text in SAMPLES.items():
+        for parser_name, parser in PARSERS.items():
+            ok = succeeds(parser, text)
+            if ok:
+                seconds = timeit.timeit(lambda: parser(text), number=args.number)
+                cost = f"{seconds / args.number * 1e6:>10.1f}"
+            else:
+                cost = f"{'-':>10}"
+            print(f"{sample_name:<16}{parser_name:<22}{cost}  {'成功' if ok else '失败'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+玩家模型基准
+对比字典与 __slots__ Player 保存大量玩家时的内存占用、与字典 / JSON 互转的耗时，
+以及读取派生数值（境界等级、战力、状态档位）的耗时：字典直接计算、常驻的 Player、
+临时由字典构造 Player 再读取（构造开销计入）。
+
+用法：
+    python -m benchmarks.bench_player_model [--players 10000] [--reads 200000]
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from utils.player_model import Player, HP_TIER_LABELS
+from utils.realm import REALM_ORDER, get_realm_level, calculate_combat_power
+
+FATES = ["普通", "福星", "煞星", "天骄", "天煞孤星"]
+LEVEL_NAMES = ["一层", "二层", "三层", "四层", "五层", "六层", "七层", "八层", "九层"]
+
+
+def synthetic_player(i: int, rng: random.Random):
+    return {
+        "name": f"修士{i}",
+        "realm": f"{rng.choice(REALM_ORDER)}{rng.choice(LEVEL_NAMES)}",
+        "hp": rng.randint(1, 100),
+        "spiritual_energy": rng.randint(0, 100),
+        "artifacts": [],
+        "skills": [],
+        "fate": rng.choice(FATES),
+        "side_effects": [],
+        "attributes": {"strength": rng.randint(1, 20), "intelligence": rng.randint(1, 20),
+                       "agility": rng.randint(1, 20), "luck": rng.randint(1, 20)},
+    }
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    objects = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, size
+
+
+def timed(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for i in range(rounds):
+        fn(i)
+    return (time.perf_counter() - start) * 1e6 / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="玩家模型基准")
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--reads", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = [json.dumps(synthetic_player(i, random.Random(args.seed + i)), ensure_ascii=False)
+             for i in range(args.players)]
+    dicts, dict_bytes = measure_memory(lambda: [json.loads(text) for text in texts])
+    players, player_bytes = measure_memory(lambda: [Player.from_json(text) for text in texts])
+    n = len(players)
+
+    from_dict_us = timed(lambda i: Player.from_dict(dicts[i % n]), args.reads // 4)
+    to_dict_us = timed(lambda i: players[i % n].to_dict(), args.reads // 4)
+    json_us = timed(lambda i: Player.from_json(players[i % n].to_json()), args.reads // 10)
+
+    def dict_derived(i):
+        player = dicts[i % n]
+        get_realm_level(player["realm"])
+        calculate_combat_power(player)
+        hp = player["hp"]
+        return "重伤" if hp < 30 else "轻伤" if hp < 70 else "健康"
+
+    def player_derived(i):
+        player = players[i % n]
+        player.realm_level
+        player.combat_power
+        return HP_TIER_LABELS[player.hp_tier]
+
+    def converted_derived(i):
+        player = Player.from_dict(dicts[i % n])
+        player.realm_level
+        player.combat_power
+        return HP_TIER_LABELS[player.hp_tier]
+
+    dict_read_us = timed(dict_derived, args.reads)
+    player_read_us = timed(player_derived, args.reads)
+    converted_read_us = timed(converted_derived, args.reads // 4)
+
+    print(f"{n} 名玩家：字典 {dict_bytes / n:.0f}B/人，Player {player_bytes / n:.0f}B/人"
+          f"（节省 {100 * (1 - player_bytes / dict_bytes):.0f}%）")
+    print(f"from_dict {from_dict_us:.2f}µs，to_dict {to_dict_us:.2f}µs，JSON 往返 {json_us:.2f}µs")
+    print(f"派生数值读取：字典现算 {dict_read_us:.2f}µs，常驻 Player {player_read_us:.2f}µs，"
+          f"临时构造 Player {converted_read_us:.2f}µs（构造计入，{converted_read_us / dict_read_us:.1f}x 于字典）")
+
+
+if __name__ == "__main__":
+    main()
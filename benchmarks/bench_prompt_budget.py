@@ -0,0 +1,62 @@
+"""
+prompt token 预算报告
+用几名示例玩家分别生成判定、撰写描述与事件 prompt，在不同预算下
+比较估算的完整 token 数与实际发送的 token 数，以及被降级的段落。
+
+用法：
+    python -m benchmarks.bench_prompt_budget
+    python -m benchmarks.bench_prompt_budget --budgets 0,600,500,400
+"""
+import argparse
+import copy
+import json
+import os
+
+from benchmarks.common import REPO_ROOT
+from utils.prompt_budget import PromptBudgetReport
+from utils.prompt_builder import EnhancedPromptBuilder
+from utils.event_generator import EventGenerator
+from utils.world_loader import WorldSettingsLoader
+
+ACTIONS = ["探索附近的山洞", "挑战山中的妖狼", "去坊市打听消息"]
+OUTCOME = {"成功": True, "状态变化": {"hp": 0, "spiritual_energy": 12, "realm_change": None}}
+
+
+def sample_players():
+    with open(os.path.join(REPO_ROOT, "data", "player.json"), encoding="utf-8") as f:
+        base = json.load(f)
+    veteran = copy.deepcopy(base)
+    veteran.update(realm="筑基期三层", hp=42, spiritual_energy=18, fate="煞星",
+                   artifacts=["青锋剑", "玄龟甲"], skills=["御剑术", "敛息术"], side_effects=["经脉灼痛"])
+    return [base, veteran]
+
+
+def run(budget: int, loader: WorldSettingsLoader):
+    report = PromptBudgetReport()
+    builder = EnhancedPromptBuilder(loader, budgets={"judge": budget, "narration": budget},
+                                    budget_report=report)
+    generator = EventGenerator(None, loader, budget=budget, budget_report=report)
+    for player in sample_players():
+        for action in ACTIONS:
+            builder.generate_prompt(player, action)
+            builder.build_narration_prompt(player, action, OUTCOME)
+        generator._build_event_generation_prompt(player)
+    return report.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prompt token 预算报告")
+    parser.add_argument("--budgets", default="0,550,450,400,350", help="逗号分隔的预算，0 表示不限")
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    loader = WorldSettingsLoader()
+    print(f"{'预算':>6}  {'类型':<10}{'次数':>6}{'完整':>8}{'发送':>8}{'节省':>8}{'节省率':>8}{'超预算':>8}")
+    for budget in (int(b) for b in args.budgets.split(",")):
+        for kind, stats in sorted(run(budget, loader).items()):
+            print(f"{budget:>6}  {kind:<10}{stats['prompts']:>6}{stats['full_tokens']:>8}{stats['sent_tokens']:>8}"
+                  f"{stats['saved_tokens']:>8}{stats['saved_pct']:>7}%{stats['over_budget']:>8}")
+
+
+if __name__ == "__main__":
+    main()
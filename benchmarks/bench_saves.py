@@ -0,0 +1,111 @@
+"""
+存档写入基准
+多个虚拟玩家并发调用 /api/action，统计每秒完成的存档次数；
+行动使用本地规则可判定的"打坐"，不会调用模型，测得的是纯存储开销。
+每种存储后端/持久化模式在独立子进程中运行（配置在导入 app 时读取）。
+
+用法：
+    python -m benchmarks.bench_saves
+    python -m benchmarks.bench_saves --players 32 --actions 50 --configs json:always,json:never
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIGS = "sqlite:always,sqlite:interval,sqlite:never,json:always,json:interval,json:never"
+
+
+def run_single(backend: str, durability: str, players: int, actions: int) -> dict:
+    """在当前进程中运行一种配置（由子进程调用）"""
+    store_dir = tempfile.mkdtemp(prefix="bench-saves-")
+    os.environ.update({
+        "DEEPSEEK_API_KEY": os.environ.get("DEEPSEEK_API_KEY") or "bench",
+        "PLAYER_STORE_BACKEND": backend,
+        "PLAYER_STORE_PATH": os.path.join(store_dir, "players.db" if backend == "sqlite" else "players"),
+        "SAVE_DURABILITY": durability,
+        "LEGACY_PLAYER_FILE": "",
+        "RESPONSE_CACHE_ENABLED": "0",
+        "SPECULATION_ENABLED": "0",
+        "BATCH_ENABLED": "0",
+        "RULES_ENGINE_ENABLED": "1",
+        "RULES_ENGINE_LLM_NARRATION": "0",
+    })
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+    import app as app_module
+
+    clients = [app_module.app.test_client() for _ in range(players)]
+    for client in clients:
+        client.get("/api/player")
+
+    errors = []
+    barrier = threading.Barrier(players + 1)
+
+    def worker(client):
+        barrier.wait()
+        for _ in range(actions):
+            response = client.post("/api/action", json={"action": "打坐"})
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    saves = players * actions
+    result = {
+        "backend": backend,
+        "durability": durability,
+        "players": players,
+        "saves": saves,
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "saves_per_second": round(saves / elapsed, 1),
+    }
+    if app_module.save_writer is not None:
+        result["writer"] = app_module.save_writer.stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发 /api/action 下的存档写入基准")
+    parser.add_argument("--players", type=int, default=16, help="并发玩家数")
+    parser.add_argument("--actions", type=int, default=30, help="每名玩家的行动次数")
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS, help="逗号分隔的 后端:持久化模式 列表")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        backend, durability = args.single.split(":")
+        print(json.dumps(run_single(backend, durability, args.players, args.actions)))
+        return
+
+    print(f"{'后端':<8}{'持久化':<10}{'存档/秒':>10}{'耗时(s)':>10}{'错误':>6}  合并")
+    for config in args.configs.split(","):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_saves", "--single", config,
+             "--players", str(args.players), "--actions", str(args.actions)],
+            cwd=REPO_ROOT, capture_output=True, text=True
+        )
+        if output.returncode != 0:
+            print(f"{config} 运行失败:\n{output.stderr[-2000:]}")
+            continue
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        merged = result.get("writer", {}).get("avg_saves_per_commit", "-")
+        print(f"{result['backend']:<8}{result['durability']:<10}{result['saves_per_second']:>10}"
+              f"{result['seconds']:>10}{result['errors']:>6}  {merged}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+冷启动基准
+每次在新的 Python 进程中依次测量：导入 app、create_app()、首个 /api/player 请求、
+首个需要模型判定的 /api/action 请求（指向本地模拟模型服务），分别在不预热与 warm_up=True 两种方式下
+重复若干次取中位数，用来观察延迟初始化把开销从启动挪到了哪里。
+
+用法：
+    python -m benchmarks.bench_startup [--runs 5] [--env KEY=VALUE]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_e2e import configure_environment
+from benchmarks.common import REPO_ROOT, save_results, git_revision
+from benchmarks.stub_llm_server import start_stub_server
+
+PHASES = ("import", "create_app", "first_player", "first_action")
+
+
+def child(warm_up: bool) -> None:
+    """在子进程中执行，测量结果以一行 JSON 输出"""
+    timings = {}
+    start = time.perf_counter()
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+    import app as app_module
+    timings["import"] = time.perf_counter() - start
+
+    mark = time.perf_counter()
+    flask_app = app_module.create_app(warm_up=warm_up)
+    timings["create_app"] = time.perf_counter() - mark
+
+    test_client = flask_app.test_client()
+    mark = time.perf_counter()
+    player_status = test_client.get("/api/player").status_code
+    timings["first_player"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    action_status = test_client.post("/api/action", json={"action": "探索附近的山洞"}).status_code
+    timings["first_action"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - start
+
+    heavy = [name for name in ("openai", "httpx") if name in sys.modules]
+    print(json.dumps({"timings": timings, "status": [player_status, action_status], "modules": heavy}))
+
+
+def run_child(warm_up: bool, base_url: str, overrides: dict) -> dict:
+    # 每次使用新的数据目录，避免上一次运行的玩家与缓存影响首个请求
+    configure_environment(base_url, overrides)
+    command = [sys.executable, "-m", "benchmarks.bench_startup", "--child"] + (["--warm-up"] if warm_up else [])
+    start = time.perf_counter()
+    output = subprocess.run(command, cwd=REPO_ROOT, env=dict(os.environ), capture_output=True,
+                            text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - start
+    return result
+
+
+def summarize_runs(runs: list) -> dict:
+    summary = {
+        phase: round(statistics.median(run["timings"][phase] for run in runs) * 1000, 1)
+        for phase in PHASES + ("total",)
+    }
+    summary["process"] = round(statistics.median(run["process"] for run in runs) * 1000, 1)
+    summary["errors"] = sum(1 for run in runs if any(status >= 400 for status in run["status"]))
+    summary["heavy_modules_loaded"] = runs[-1]["modules"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动基准")
+    parser.add_argument("--runs", type=int, default=5, help="每种方式重复的次数")
+    parser.add_argument("--env", action="append", default=[], help="额外的环境变量 KEY=VALUE")
+    parser.add_argument("--output", help="结果文件路径（默认 benchmarks/results/ 下）")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warm-up", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.warm_up)
+        return
+
+    overrides = dict(item.split("=", 1) for item in args.env)
+    server, base_url, stub_stats = start_stub_server()
+    modes = {
+        "lazy": [run_child(False, base_url, overrides) for _ in range(args.runs)],
+        "warm_up": [run_child(True, base_url, overrides) for _ in range(args.runs)],
+    }
+    server.shutdown()
+
+    results = {
+        "meta": {
+            "benchmark": "startup",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "args": vars(args),
+        },
+        "modes": {mode: summarize_runs(runs) for mode, runs in modes.items()},
+    }
+    path = save_results("startup", results, args.output)
+
+    print(f"{'方式':<10}" + "".join(f"{phase:>14}" for phase in PHASES + ("total", "process")) + f"{'错误':>6}")
+    for mode, summary in results["modes"].items():
+        print(f"{mode:<10}" + "".join(f"{summary[phase]:>12}ms" for phase in PHASES + ("total", "process"))
+              + f"{summary['errors']:>6}")
+    print(f"结果已保存到 {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+世界设定快照基准
+对比启动时解析 JSON 并编译快照与读取二进制缓存的耗时，
+以及每次读取设定时的开销：逐次 stat 文件 + 线性查找命格（原加载器的做法）与监视模式下直接读快照。
+
+用法：
+    python -m benchmarks.bench_world_snapshot [--reads 200000] [--loads 200]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from utils.world_snapshot import DEFAULT_SETTINGS_PATH, WorldSnapshotStore
+from benchmarks.common import REPO_ROOT
+
+FATES = ["普通", "福星", "煞星", "天骄", "天煞孤星"]
+
+
+def timed(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for i in range(rounds):
+        fn(i)
+    return (time.perf_counter() - start) * 1e6 / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="世界设定快照基准")
+    parser.add_argument("--reads", type=int, default=200000)
+    parser.add_argument("--loads", type=int, default=200)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-world-")
+    settings_path = os.path.join(work_dir, "world_settings.json")
+    cache_path = os.path.join(work_dir, "world_settings.cache")
+    shutil.copy(os.path.join(REPO_ROOT, DEFAULT_SETTINGS_PATH), settings_path)
+
+    compile_us = timed(lambda i: WorldSnapshotStore(settings_path).current(), args.loads)
+    WorldSnapshotStore(settings_path, cache_path=cache_path).current()
+    cached_us = timed(lambda i: WorldSnapshotStore(settings_path, cache_path=cache_path).current(), args.loads)
+
+    with open(settings_path, 'r', encoding='utf-8') as f:
+        settings = json.load(f)
+
+    def stat_and_scan(i):
+        os.stat(settings_path)
+        for fate in settings["fate_system"]["types"]:
+            if fate["name"] == FATES[i % len(FATES)]:
+                return f"{fate['description']}，{fate['special_effect']}"
+        return "未知命格"
+
+    store = WorldSnapshotStore(settings_path)
+    store.watch(interval=60)
+    snapshot_us = timed(lambda i: store.current().fate_effect(FATES[i % len(FATES)]), args.reads)
+    store.stop_watching()
+    scan_us = timed(stat_and_scan, args.reads)
+    shutil.rmtree(work_dir)
+
+    print(f"启动加载：解析并编译 {compile_us:.0f}µs，二进制缓存 {cached_us:.0f}µs"
+          f"（{compile_us / cached_us:.1f}x）")
+    print(f"读取命格效果：stat + 线性查找 {scan_us:.2f}µs，监视模式快照 {snapshot_us:.2f}µs"
+          f"（{scan_us / snapshot_us:.1f}x）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+JSON 提取模糊测试
+语料来自 requests.jsonl（每行一个 JSON 对象，正文中夹杂括号与引号）、
+data/player.json 历史记录中格式错误的描述，以及一份标准判定结果；
+对语料做截断、插入、删除、包裹等随机变异后检查：
+- extract_json_object 不抛异常，只返回 dict 或 None
+- 合法对象被文字或代码块包裹时能原样取回
+- validate_deepseek_result 对任意字符串都返回字段齐全的结果
+- 耗时与输入长度大致成正比（报告每 KB 最长耗时）
+
+用法：
+    python -m benchmarks.fuzz_json_extract [--iterations 20000] [--seed 0]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from utils.json_extract import extract_json_object
+from utils.json_validator import validate_deepseek_result
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOISE = list('{}[]",:\\+ \n') + ["```", "```json\n", "\\u4e2d", "灵", "\""]
+PROSE = ["好的，", "判定如下：\n", "以上。", "注意：结果仅供参考", "“道友”请看"]
+
+STANDARD = {
+    "成功": False,
+    "描述": "妖狼扑来，{无名修士}仓促应战，\"左臂\"被利爪划伤。",
+    "建议": "先行疗伤",
+    "状态变化": {"hp": -15, "spiritual_energy": -10, "new_items": [], "new_skills": [], "realm_change": None}
+}
+
+
+def load_corpus():
+    """收集种子语料"""
+    corpus = [json.dumps(STANDARD, ensure_ascii=False), json.dumps(STANDARD, ensure_ascii=False, indent=4)]
+
+    requests_path = os.path.join(REPO_ROOT, "requests.jsonl")
+    if os.path.exists(requests_path):
+        with open(requests_path, encoding="utf-8") as f:
+            corpus.extend(line.strip() for line in f if line.strip())
+
+    player_path = os.path.join(REPO_ROOT, "data", "player.json")
+    if os.path.exists(player_path):
+        with open(player_path, encoding="utf-8") as f:
+            player = json.load(f)
+        for entry in player.get("history", []):
+            description = (entry.get("result") or {}).get("描述")
+            if isinstance(description, str):
+                corpus.append(description)
+    return corpus
+
+
+def mutate(rng, text):
+    kind = rng.choice(["truncate", "insert", "delete", "duplicate", "noise_prefix"])
+    if not text:
+        return rng.choice(NOISE)
+    pos = rng.randrange(len(text) + 1)
+    if kind == "truncate":
+        return text[:pos]
+    if kind == "insert":
+        return text[:pos] + rng.choice(NOISE) + text[pos:]
+    if kind == "delete":
+        return text[:pos] + text[pos + 1:]
+    if kind == "duplicate":
+        return text + text[:pos]
+    return "".join(rng.choice(NOISE) for _ in range(rng.randint(1, 8))) + text
+
+
+def wrap(rng, obj):
+    """用不含花括号的文字或代码块包裹合法对象，应能原样取回"""
+    raw = json.dumps(obj, ensure_ascii=False, indent=rng.choice([None, 2, 4]))
+    if rng.random() < 0.5:
+        return f"```json\n{raw}\n```"
+    return rng.choice(PROSE) + raw + rng.choice(PROSE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 提取模糊测试")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = load_corpus()
+    objects = [obj for obj in (extract_json_object(text) for text in corpus) if obj is not None]
+    failures = []
+    found = 0
+    worst_us_per_kb = 0.0
+
+    for iteration in range(args.iterations):
+        text = rng.choice(corpus)
+        for _ in range(rng.randint(1, 3)):
+            text = mutate(rng, text)
+
+        start = time.perf_counter()
+        try:
+            result = extract_json_object(text)
+        except Exception as e:
+            failures.append(("raised", repr(e), text))
+            continue
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        worst_us_per_kb = max(worst_us_per_kb, elapsed_us / max(1, len(text) / 1024))
+        if result is not None:
+            found += 1
+            if not isinstance(result, dict):
+                failures.append(("not_dict", type(result).__name__, text))
+
+        try:
+            validated = validate_deepseek_result(text)
+        except Exception as e:
+            failures.append(("validator_raised", repr(e), text))
+            continue
+        if not all(key in validated for key in ("成功", "描述", "建议", "状态变化")):
+            failures.append(("validator_fields", sorted(validated), text))
+
+        obj = rng.choice(objects)
+        wrapped = wrap(rng, obj)
+        if extract_json_object(wrapped) != obj:
+            failures.append(("wrapped_mismatch", iteration, wrapped))
+
+    print(f"语料 {len(corpus)} 条，迭代 {args.iterations} 次，变异样本中提取到对象 {found} 次")
+    print(f"最长耗时 {worst_us_per_kb:.1f} 微秒/KB")
+    if failures:
+        print(f"发现 {len(failures)} 个问题，前 5 个：")
+        for kind, detail, text in failures[:5]:
+            print(f"- {kind}: {detail}\n  {text[:200]!r}")
+        sys.exit(1)
+    print("全部通过")
+
+
+if __name__ == "__main__":
+    main()
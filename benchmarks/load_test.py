@@ -0,0 +1,339 @@
+"""
+并发玩家负载测试与容量报告
+模拟 N 名同时在线的虚拟玩家，每人按真实流程循环：
+查看状态 -> 获取事件 -> 阅读后做出选择 -> 自由行动，步骤之间有思考时间（对数正态分布）。
+默认在本进程内启动本地模拟模型服务与多线程 HTTP 服务（真实的套接字与会话 Cookie），
+也可以用 --target 指向已部署的实例。
+
+按 --players 给出的各档人数依次加压，每档统计吞吐量、各接口延迟分位数与错误率；
+每档前后抓取 /metrics，用存档相关阶段（save_state、load_player、cache_lookup 等）的耗时变化
+反映文件 / SQLite 写入争用。最后给出饱和曲线与满足延迟目标的最大在线人数。
+
+用法：
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --players 5,10,20,40,80 --duration 60 --latency lognormal:800,0.6
+    python -m benchmarks.load_test --jobs --env JOB_WORKERS=32
+    python -m benchmarks.load_test --target http://127.0.0.1:5000 --players 10,20
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+from benchmarks.common import REPO_ROOT, summarize, save_results, git_revision
+from benchmarks.stub_llm_server import start_stub_server
+
+ACTIONS = ["打坐", "疗伤", "修炼功法", "探索附近的山洞", "挑战山中的妖狼", "去坊市打听消息",
+           "向路过的散修请教功法", "在山涧边寻找灵草", "尝试突破当前境界"]
+# 反映存储与缓存争用的阶段
+CONTENTION_STAGES = ("save_state", "load_player", "cache_lookup")
+_METRIC_LINE = re.compile(r'^xiuxian_stage_seconds_(bucket|sum|count)\{stage="(\w+)"(?:,le="([^"]+)")?\} (\S+)$')
+
+
+class VirtualPlayer:
+    """一名虚拟玩家：独立的会话 Cookie 与随机数"""
+
+    def __init__(self, base_url: str, rng: random.Random, think: float, jobs: bool, timeout: float, record):
+        self.base_url = base_url
+        self.rng = rng
+        self.think_mean = think
+        self.jobs = jobs
+        self.timeout = timeout
+        self.record = record
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def run(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            self.request("GET", "/api/player")
+            self.think(stop, 0.5)
+            event = self.request("GET", "/api/event")
+            # 阅读事件描述
+            self.think(stop, 1.5)
+            choices = (event or {}).get("choices") or [None]
+            self.turn("/api/choice", {"choice_index": self.rng.randrange(len(choices))})
+            self.think(stop, 1.0)
+            self.turn("/api/action", {"action": self.rng.choice(ACTIONS)})
+            self.think(stop, 1.0)
+
+    def think(self, stop: threading.Event, weight: float) -> None:
+        if self.think_mean <= 0:
+            return
+        # 对数正态：多数玩家很快点击，少数停留较久
+        mean = self.think_mean * weight
+        stop.wait(self.rng.lognormvariate(math.log(mean) - 0.18, 0.6))
+
+    def turn(self, path: str, payload: Dict[str, Any]) -> None:
+        """结算一个回合；任务模式下提交任务并长轮询到结束，计入总耗时"""
+        if not self.jobs:
+            self.request("POST", path, payload)
+            return
+        start = time.perf_counter()
+        status, body = self._send("POST", path, dict(payload, **{"async": True}))
+        job = (body or {}).get("job") or {}
+        while status in (200, 202) and job.get("status") in ("queued", "running"):
+            status, body = self._send("GET", f"/api/jobs/{job['id']}?wait=30")
+            job = (body or {}).get("job") or {}
+        failed = status >= 400 or job.get("status") not in ("done", None)
+        self.record(f"{path} (job)", time.perf_counter() - start, status if failed else 0)
+
+    def request(self, method: str, path: str, payload: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        start = time.perf_counter()
+        status, body = self._send(method, path, payload)
+        self.record(path, time.perf_counter() - start, status if status >= 400 else 0)
+        return body
+
+    def _send(self, method: str, path: str, payload: Dict[str, Any] = None) -> Tuple[int, Optional[dict]]:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, None
+        except (urllib.error.URLError, OSError, ValueError):
+            # 连接失败、超时或响应无法解析
+            return 599, None
+
+
+class StepRecorder:
+    """一档负载内的请求耗时与错误"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.recording = False
+
+    def __call__(self, route: str, seconds: float, error_status: int) -> None:
+        if not self.recording:
+            return
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if error_status:
+                self.errors[route][error_status] += 1
+
+
+def scrape_stages(base_url: str) -> Dict[str, Dict[str, Any]]:
+    """读取 /metrics 中各阶段耗时直方图（累计值）"""
+    try:
+        with urllib.request.urlopen(base_url + "/metrics", timeout=10) as response:
+            text = response.read().decode("utf-8")
+    except (urllib.error.URLError, OSError):
+        return {}
+    stages = defaultdict(lambda: {"buckets": {}, "sum": 0.0, "count": 0})
+    for line in text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if not match:
+            continue
+        kind, stage, le, value = match.groups()
+        if kind == "bucket":
+            stages[stage]["buckets"][float(le)] = float(value)
+        elif kind == "sum":
+            stages[stage]["sum"] = float(value)
+        else:
+            stages[stage]["count"] = int(float(value))
+    return stages
+
+
+def stage_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """两次抓取之间各阶段的次数、平均耗时与 p95 所在分桶上界（毫秒）"""
+    report = {}
+    for stage, current in after.items():
+        previous = before.get(stage, {"buckets": {}, "sum": 0.0, "count": 0})
+        count = current["count"] - previous["count"]
+        if count <= 0:
+            continue
+        p95_bound = None
+        for bound in sorted(current["buckets"]):
+            if current["buckets"][bound] - previous["buckets"].get(bound, 0) >= 0.95 * count:
+                p95_bound = bound
+                break
+        report[stage] = {
+            "count": count,
+            "mean_ms": round((current["sum"] - previous["sum"]) / count * 1000, 2),
+            "p95_le_ms": None if p95_bound is None or math.isinf(p95_bound) else round(p95_bound * 1000, 1),
+        }
+    return report
+
+
+def run_step(base_url: str, players: int, args, seed: int) -> Dict[str, Any]:
+    recorder = StepRecorder()
+    stop = threading.Event()
+    threads = []
+    for i in range(players):
+        player = VirtualPlayer(base_url, random.Random(seed + i), args.think, args.jobs, args.timeout, recorder)
+        thread = threading.Thread(target=player.run, args=(stop,), daemon=True)
+        threads.append(thread)
+        thread.start()
+        # 错开进入，避免同一时刻全部请求事件
+        time.sleep(min(0.05, args.warmup / max(1, players)))
+
+    time.sleep(args.warmup)
+    before = scrape_stages(base_url)
+    recorder.recording = True
+    start = time.perf_counter()
+    time.sleep(args.duration)
+    recorder.recording = False
+    elapsed = time.perf_counter() - start
+    after = scrape_stages(base_url)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=args.timeout)
+
+    all_latencies = [v for values in recorder.latencies.values() for v in values]
+    total = len(all_latencies)
+    error_count = sum(sum(codes.values()) for codes in recorder.errors.values())
+    turns = sum(len(values) for route, values in recorder.latencies.items()
+                if route.startswith(("/api/choice", "/api/action")))
+    return {
+        "players": players,
+        "duration_seconds": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "turns_per_minute": round(turns / elapsed * 60, 1),
+        "error_rate": round(error_count / total, 4) if total else 0.0,
+        "overall": summarize(all_latencies),
+        "routes": {
+            route: dict(summarize(values), errors=dict(recorder.errors[route]))
+            for route, values in sorted(recorder.latencies.items())
+        },
+        "stages": stage_delta(before, after),
+    }
+
+
+def capacity(steps: List[Dict[str, Any]], slo_ms: float, max_error_rate: float, route: str) -> Optional[int]:
+    """满足延迟目标（指定接口的 p95）与错误率上限的最大在线人数"""
+    best = None
+    for step in steps:
+        summary = step["routes"].get(route) or step["overall"]
+        if summary["p95_ms"] <= slo_ms and step["error_rate"] <= max_error_rate:
+            best = step["players"]
+        else:
+            break
+    return best
+
+
+def start_local_app(args) -> Tuple[str, Any, Dict[str, Any]]:
+    """启动模拟模型服务与本进程内的多线程 HTTP 服务，返回 (地址, 模型服务, 模型服务统计)"""
+    import logging
+    from benchmarks.bench_e2e import configure_environment
+    from werkzeug.serving import make_server
+
+    # 每个请求一行的访问日志会淹没报告
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    stub, stub_url, stub_stats = start_stub_server(latency=args.latency, replay=args.replay, seed=args.seed)
+    overrides = dict(item.split("=", 1) for item in args.env)
+    overrides.setdefault("METRICS_ENABLED", "1")
+    configure_environment(stub_url, overrides)
+
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+    import app as app_module
+
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", stub, stub_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发玩家负载测试")
+    parser.add_argument("--players", default="2,5,10,20,40", help="各档同时在线人数，逗号分隔")
+    parser.add_argument("--duration", type=float, default=20, help="每档统计时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3, help="每档开始统计前的预热时长（秒）")
+    parser.add_argument("--think", type=float, default=2.0, help="平均思考时间（秒），0 表示不停顿")
+    parser.add_argument("--latency", default="lognormal:800,0.6", help="模拟模型延迟分布")
+    parser.add_argument("--replay", help="回放文件（JSONL）")
+    parser.add_argument("--jobs", action="store_true", help="行动与选择使用任务模式（提交后长轮询）")
+    parser.add_argument("--target", help="已部署实例的地址，不启动本地服务")
+    parser.add_argument("--timeout", type=float, default=120, help="单个请求的超时（秒）")
+    parser.add_argument("--slo-ms", type=float, default=3000, help="延迟目标：选择接口的 p95（毫秒）")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env", action="append", default=[], help="本地服务的额外环境变量 KEY=VALUE")
+    parser.add_argument("--output", help="结果文件路径（默认 benchmarks/results/ 下）")
+    args = parser.parse_args()
+
+    levels = [int(n) for n in args.players.split(",") if n.strip()]
+    stub, stub_stats = None, None
+    if args.target:
+        base_url = args.target.rstrip("/")
+    else:
+        base_url, stub, stub_stats = start_local_app(args)
+
+    steps = []
+    for index, players in enumerate(levels):
+        llm_before = stub_stats["requests"] if stub_stats else None
+        step = run_step(base_url, players, args, args.seed + index * 10000)
+        if stub_stats:
+            step["stub_llm_requests"] = stub_stats["requests"] - llm_before
+        steps.append(step)
+        print(f"{players:>4} 人：{step['throughput_rps']:>7} req/s，{step['turns_per_minute']:>7} 回合/分，"
+              f"p95 {step['overall']['p95_ms']:>8}ms，错误率 {step['error_rate']:.2%}")
+
+    slo_route = "/api/choice (job)" if args.jobs else "/api/choice"
+    max_players = capacity(steps, args.slo_ms, args.max_error_rate, slo_route)
+    results = {
+        "meta": {
+            "benchmark": "load_test",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "args": vars(args),
+        },
+        "steps": steps,
+        "capacity": {"slo_route": slo_route, "slo_p95_ms": args.slo_ms, "max_players": max_players},
+    }
+    if stub is not None:
+        results["app_stats"] = json.loads(urllib.request.urlopen(base_url + "/api/stats", timeout=10).read())
+        stub.shutdown()
+    path = save_results("load", results, args.output)
+
+    print()
+    print("饱和曲线")
+    print(f"{'人数':>6}{'req/s':>9}{'回合/分':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'错误率':>8}  存档 p95 / 缓存 p95")
+    for step in steps:
+        overall = step["overall"]
+        stages = step["stages"]
+        contention = " / ".join(
+            f"{stages[name]['p95_le_ms']}ms" if name in stages and stages[name]["p95_le_ms"] is not None else "-"
+            for name in ("save_state", "cache_lookup")
+        )
+        print(f"{step['players']:>6}{step['throughput_rps']:>9}{step['turns_per_minute']:>9}"
+              f"{overall['p50_ms']:>9.0f}{overall['p95_ms']:>9.0f}{overall['p99_ms']:>9.0f}"
+              f"{step['error_rate']:>8.2%}  {contention}")
+
+    last = steps[-1]
+    print()
+    print(f"最高一档（{last['players']} 人）各接口")
+    print(f"{'接口':<24}{'次数':>6}{'p50':>9}{'p95':>9}{'p99':>9}  错误")
+    for route, summary in last["routes"].items():
+        print(f"{route:<24}{summary['count']:>6}{summary['p50_ms']:>9.0f}{summary['p95_ms']:>9.0f}"
+              f"{summary['p99_ms']:>9.0f}  {summary['errors'] or '-'}")
+    for stage in CONTENTION_STAGES:
+        if stage in last["stages"]:
+            info = last["stages"][stage]
+            print(f"  阶段 {stage:<18}{info['count']:>6} 次，平均 {info['mean_ms']}ms，p95 ≤ {info['p95_le_ms']}ms")
+
+    print()
+    if max_players is None:
+        print(f"最低一档已不满足目标（{slo_route} p95 ≤ {args.slo_ms:.0f}ms，错误率 ≤ {args.max_error_rate:.0%}）")
+    else:
+        print(f"满足目标（{slo_route} p95 ≤ {args.slo_ms:.0f}ms，错误率 ≤ {args.max_error_rate:.0%}）"
+              f"的最大在线人数：{max_players}" + ("（已是最高一档，可继续加压）" if max_players == levels[-1] else ""))
+    print(f"结果已保存：{path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+本地模拟的 OpenAI 兼容模型服务
+实现 POST .../chat/completions（含 stream=true 的 SSE 流式输出），
+按配置的延迟分布返回合成结果或回放录制的结果，用于离线基准测试。
+
+延迟分布（毫秒）：
+    fixed:300              固定 300ms
+    uniform:100,800        均匀分布
+    lognormal:300,0.5      对数正态，中位数 300ms，sigma 0.5
+
+回放文件为 JSONL，每行 {"content": "..."}，按顺序循环使用。
+
+用法：
+    python -m benchmarks.stub_llm_server --port 8765 --latency lognormal:300,0.5
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8765/v1 python app.py
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, List, Tuple
+
+
+class LatencyModel:
+    """延迟分布"""
+
+    def __init__(self, kind: str = "fixed", params: Tuple[float, ...] = (0.0,), seed: Optional[int] = None):
+        self.kind = kind
+        self.params = params
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: Optional[int] = None) -> "LatencyModel":
+        kind, _, raw = spec.partition(":")
+        params = tuple(float(p) for p in raw.split(",")) if raw else (0.0,)
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"未知的延迟分布: {spec}")
+        return cls(kind, params, seed)
+
+    def sample(self) -> float:
+        """采样一次延迟（秒）"""
+        with self._lock:
+            if self.kind == "fixed":
+                ms = self.params[0]
+            elif self.kind == "uniform":
+                ms = self._rng.uniform(self.params[0], self.params[1])
+            else:
+                ms = self._rng.lognormvariate(math.log(max(self.params[0], 1e-3)), self.params[1])
+        return ms / 1000
+
+
+class StubResponder:
+    """根据 prompt 生成合成回复，或循环回放录制的回复"""
+
+    def __init__(self, replay: Optional[List[str]] = None, seed: Optional[int] = None):
+        self._replay = itertools.cycle(replay) if replay else None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def reply(self, prompt: str) -> str:
+        with self._lock:
+            if self._replay is not None:
+                return next(self._replay)
+            success = self._rng.random() < 0.6
+            hp = self._rng.randint(-15, 10)
+            energy = self._rng.randint(-20, 20)
+
+        if '"events"' in prompt:
+            return json.dumps({"events": [
+                {"text": "山涧深处传来异香", "action": "follow_scent"},
+                {"text": "路遇散修求助", "action": "help_cultivator"},
+                {"text": "闭关参悟功法", "action": "seclusion"},
+            ]}, ensure_ascii=False)
+
+        judgment = {
+            "成功": success,
+            "描述": "灵气在经脉中奔涌，" + ("一番周折后终有所得。" if success else "可惜功亏一篑，只得暂退。"),
+            "建议": "稳扎稳打，量力而行",
+            "状态变化": {"hp": hp, "spiritual_energy": energy, "new_items": [],
+                         "new_skills": [], "realm_change": None}
+        }
+        # 微批判定：按玩家编号返回结果数组
+        batch_ids = re.findall(r"【玩家 (p\d+)】", prompt)
+        if batch_ids:
+            return json.dumps({"results": [dict(judgment, id=pid) for pid in batch_ids]}, ensure_ascii=False)
+        return json.dumps(judgment, ensure_ascii=False)
+
+
+def _usage(prompt: str, content: str) -> dict:
+    # 粗略按 1.5 字符一个 token 估算；前半部分视为前缀缓存命中
+    prompt_tokens = max(1, int(len(prompt) / 1.5))
+    completion_tokens = max(1, int(len(content) / 1.5))
+    hit = prompt_tokens // 2
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_cache_hit_tokens": hit,
+        "prompt_cache_miss_tokens": prompt_tokens - hit,
+    }
+
+
+def make_handler(latency: LatencyModel, responder: StubResponder, stream_chunks: int, stats: dict):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # 头部与正文分两次写出，不关闭 Nagle 会叠加约 40ms 的延迟确认
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+            model = body.get("model", "deepseek-chat")
+            content = responder.reply(prompt)
+            delay = latency.sample()
+            with stats["lock"]:
+                stats["requests"] += 1
+                stats["streamed"] += 1 if body.get("stream") else 0
+
+            if body.get("stream"):
+                self._stream(model, prompt, content, delay)
+                return
+
+            time.sleep(delay)
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": _usage(prompt, content),
+            })
+
+        def _stream(self, model: str, prompt: str, content: str, delay: float):
+            # 首个 token 前等待 30% 的延迟，其余延迟平均分摊到各个分片
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+            size = max(1, math.ceil(len(content) / stream_chunks))
+            pieces = [content[i:i + size] for i in range(0, len(content), size)]
+            time.sleep(delay * 0.3)
+            gap = delay * 0.7 / max(1, len(pieces))
+            try:
+                for index, piece in enumerate(pieces):
+                    delta = {"content": piece}
+                    if index == 0:
+                        delta["role"] = "assistant"
+                    self._send_event({"id": chunk_id, "object": "chat.completion.chunk",
+                                      "created": int(time.time()), "model": model,
+                                      "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                    time.sleep(gap)
+                self._send_event({"id": chunk_id, "object": "chat.completion.chunk",
+                                  "created": int(time.time()), "model": model,
+                                  "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                self._send_event({"id": chunk_id, "object": "chat.completion.chunk",
+                                  "created": int(time.time()), "model": model, "choices": [],
+                                  "usage": _usage(prompt, content)})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端提前关闭（例如 JSON 闭合后提前结算）
+                pass
+
+        def _send_event(self, payload: dict):
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def _send_json(self, status: int, payload: dict):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def load_replay(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["content"] for line in f if line.strip()]
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, latency: str = "fixed:0",
+                      replay: Optional[str] = None, stream_chunks: int = 8, seed: Optional[int] = None):
+    """在后台线程启动模拟服务，返回 (server, base_url, stats)"""
+    stats = {"requests": 0, "streamed": 0, "lock": threading.Lock()}
+    handler = make_handler(LatencyModel.parse(latency, seed),
+                           StubResponder(load_replay(replay) if replay else None, seed),
+                           stream_chunks, stats)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1", stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:300,0.5", help="延迟分布，见模块说明")
+    parser.add_argument("--replay", help="回放文件（JSONL，每行 {\"content\": ...}）")
+    parser.add_argument("--stream-chunks", type=int, default=8, help="流式输出的分片数")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server, base_url, _ = start_stub_server(args.host, args.port, args.latency, args.replay,
+                                            args.stream_chunks, args.seed)
+    print(f"模拟模型服务已启动：DEEPSEEK_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,16 @@
 # 这个文件让 utils 成为一个 Python 包
+import os
+
+
 class EventConfig:
+    # 事件来源：llm（模型按玩家状态生成，失败时退回本地事件）、pool（只用本地事件池）
+    # 或 synth（只用模板合成器），后两者不调用模型
+    EVENT_SOURCE = os.getenv('EVENT_SOURCE', 'llm')
+    # 合成器的模板文法文件
+    EVENT_TEMPLATES_PATH = os.getenv('EVENT_TEMPLATES_PATH', 'data/event_templates.json')
+    # llm 模式下直接由合成器生成的事件比例（低风险事件的快速路径）
+    EVENT_SYNTH_RATE = float(os.getenv('EVENT_SYNTH_RATE', '0'))
+
     EVENT_TYPE_WEIGHTS = {
         'combat': 0.25,
         'opportunity': 0.25,
@@ -21,3 +32,134 @@ class EventConfig:
         '天骄': {'cultivation': 1.5, 'social': 0.8},
         '天煞孤星': {'combat': 1.3, 'social': 0.5}
     }
+
+
+class StorageConfig:
+    # 玩家存储后端：sqlite（默认）或 json（每个玩家一个文件）
+    PLAYER_STORE_BACKEND = os.getenv('PLAYER_STORE_BACKEND', 'sqlite')
+    # sqlite 为数据库文件路径，json 为目录路径；留空使用默认位置
+    PLAYER_STORE_PATH = os.getenv('PLAYER_STORE_PATH') or None
+    # SQLite 后端每追加多少条状态事件写一次快照
+    JOURNAL_SNAPSHOT_INTERVAL = int(os.getenv('JOURNAL_SNAPSHOT_INTERVAL', '50'))
+    # 每位玩家保留的快照数，更早的快照与事件被删除（可还原范围约为 保留数 × 快照间隔 条事件）；0 不清理
+    JOURNAL_KEEP_SNAPSHOTS = int(os.getenv('JOURNAL_KEEP_SNAPSHOTS', '2'))
+    # 持久化模式：always（文件与目录每次提交 fsync）/ interval（文件每次 fsync，目录按间隔 fsync）/ never（不主动 fsync）
+    SAVE_DURABILITY = os.getenv('SAVE_DURABILITY', 'interval')
+    SAVE_FSYNC_INTERVAL_MS = float(os.getenv('SAVE_FSYNC_INTERVAL_MS', '100'))
+    # json 后端合并并发保存的时间窗口
+    SAVE_GROUP_COMMIT_WINDOW_MS = float(os.getenv('SAVE_GROUP_COMMIT_WINDOW_MS', '5'))
+    # 单人版本的存档，首个新会话会接管并导入（导入后改名为 .imported）；留空不导入
+    LEGACY_PLAYER_FILE = os.getenv('LEGACY_PLAYER_FILE', 'data/player.json')
+
+
+class CacheConfig:
+    # 是否启用 LLM 判定结果缓存
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', '1') == '1'
+    RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', 'data/response_cache.db')
+    RESPONSE_CACHE_MAX_SIZE = int(os.getenv('RESPONSE_CACHE_MAX_SIZE', '5000'))
+    RESPONSE_CACHE_TTL_SECONDS = float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', str(6 * 3600)))
+    # 命中时仍有该比例的请求直接调用模型，保持描述多样
+    RESPONSE_CACHE_BYPASS_RATE = float(os.getenv('RESPONSE_CACHE_BYPASS_RATE', '0.2'))
+
+
+class SpeculationConfig:
+    # 事件展示后并行预判全部选项（会增加模型调用次数）
+    SPECULATION_ENABLED = os.getenv('SPECULATION_ENABLED', '0') == '1'
+    SPECULATION_MAX_WORKERS = int(os.getenv('SPECULATION_MAX_WORKERS', '8'))
+    # 每位玩家在时间窗口内最多发起的预判次数
+    SPECULATION_MAX_CALLS_PER_PLAYER = int(os.getenv('SPECULATION_MAX_CALLS_PER_PLAYER', '30'))
+    SPECULATION_WINDOW_SECONDS = float(os.getenv('SPECULATION_WINDOW_SECONDS', '3600'))
+    # 玩家选择时等待进行中预判的最长时间
+    SPECULATION_RESULT_TIMEOUT = float(os.getenv('SPECULATION_RESULT_TIMEOUT', '90'))
+
+
+class LLMConfig:
+    DEEPSEEK_BASE_URL = os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/v1')
+    # 单次请求超时与整次调用（含重试）的截止时间，单位秒
+    DEEPSEEK_TIMEOUT = float(os.getenv('DEEPSEEK_TIMEOUT', '30'))
+    DEEPSEEK_DEADLINE = float(os.getenv('DEEPSEEK_DEADLINE', '60'))
+    DEEPSEEK_MAX_RETRIES = int(os.getenv('DEEPSEEK_MAX_RETRIES', '3'))
+    DEEPSEEK_MAX_CONNECTIONS = int(os.getenv('DEEPSEEK_MAX_CONNECTIONS', '100'))
+    # 连续失败多少次后熔断，以及熔断后多久放行试探请求
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+    BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '30'))
+    # sync：每个请求线程阻塞调用；async：共享事件循环，限制并发并合并相同请求
+    LLM_CLIENT_MODE = os.getenv('LLM_CLIENT_MODE', 'sync')
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+
+
+class JobConfig:
+    # 任务模式：请求带 "async": true 时立即返回任务编号，判定在后台线程池中完成
+    JOB_QUEUE_ENABLED = os.getenv('JOB_QUEUE_ENABLED', '1') == '1'
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '16'))
+    # 排队任务上限，超出时返回 429
+    JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', '64'))
+    # 任务截止时间、结束后保留结果的时间与单次长轮询的最长等待，单位秒
+    JOB_DEADLINE_SECONDS = float(os.getenv('JOB_DEADLINE_SECONDS', '120'))
+    JOB_RESULT_TTL_SECONDS = float(os.getenv('JOB_RESULT_TTL_SECONDS', '300'))
+    JOB_MAX_WAIT_SECONDS = float(os.getenv('JOB_MAX_WAIT_SECONDS', '30'))
+
+
+class HedgeConfig:
+    # 调用超过近期延迟的百分位仍未返回时发出对冲请求，先到的可解析结果胜出
+    HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', '0') == '1'
+    HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+    # 对冲请求占调用次数的比例上限
+    HEDGE_MAX_RATIO = float(os.getenv('HEDGE_MAX_RATIO', '0.1'))
+    # 最短等待（秒），避免延迟样本偏小时过早对冲
+    HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '2'))
+    # 对冲请求使用的模型，留空时与原请求相同（可设为 deepseek-chat）
+    HEDGE_MODEL = os.getenv('HEDGE_MODEL', '')
+
+
+class RouterConfig:
+    # 按行动复杂度在对话模型与推理模型之间选择，开启后忽略 DEEPSEEK_MODEL
+    MODEL_ROUTER_ENABLED = os.getenv('MODEL_ROUTER_ENABLED', '0') == '1'
+    ROUTER_FAST_MODEL = os.getenv('ROUTER_FAST_MODEL', 'deepseek-chat')
+    ROUTER_STRONG_MODEL = os.getenv('ROUTER_STRONG_MODEL', 'deepseek-reasoner')
+    # 复杂度达到阈值（0~1）才使用推理模型
+    ROUTER_COMPLEXITY_THRESHOLD = float(os.getenv('ROUTER_COMPLEXITY_THRESHOLD', '0.6'))
+    # 推理模型的截止时间（秒），超时改用对话模型；近期 p95 超过预算时不再选用
+    ROUTER_STRONG_DEADLINE = float(os.getenv('ROUTER_STRONG_DEADLINE', '25'))
+    ROUTER_LATENCY_BUDGET = float(os.getenv('ROUTER_LATENCY_BUDGET', '20'))
+    ROUTER_MAX_PARSE_FAILURE_RATE = float(os.getenv('ROUTER_MAX_PARSE_FAILURE_RATE', '0.2'))
+    # 推理模型被降级期间仍放行的试探比例
+    ROUTER_PROBE_RATE = float(os.getenv('ROUTER_PROBE_RATE', '0.05'))
+
+
+class BatchConfig:
+    # 将短时间内多名玩家的行动合并为一次模型调用
+    BATCH_ENABLED = os.getenv('BATCH_ENABLED', '0') == '1'
+    # 收集窗口（毫秒）与单批最大行动数：窗口越长、批越大，吞吐越高但单次延迟越大
+    BATCH_WINDOW_MS = float(os.getenv('BATCH_WINDOW_MS', '30'))
+    BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '8'))
+
+
+class RulesConfig:
+    # 打坐、疗伤、修炼等常规行动由本地规则直接判定
+    RULES_ENGINE_ENABLED = os.getenv('RULES_ENGINE_ENABLED', '1') == '1'
+    # 本地判定后是否仍请模型撰写描述（结果不变，只换文字）
+    RULES_ENGINE_LLM_NARRATION = os.getenv('RULES_ENGINE_LLM_NARRATION', '0') == '1'
+
+
+class WorldConfig:
+    # 世界设定文件修改后无需重启即可生效：开启监视时由后台线程检查，否则在读取时按间隔检查
+    WORLD_SETTINGS_WATCH = os.getenv('WORLD_SETTINGS_WATCH', '1') == '1'
+    WORLD_SETTINGS_CHECK_SECONDS = float(os.getenv('WORLD_SETTINGS_CHECK_SECONDS', '1'))
+    # 编译结果的二进制缓存，源文件未变时启动直接读取；留空不使用
+    WORLD_SETTINGS_CACHE_PATH = os.getenv('WORLD_SETTINGS_CACHE_PATH', '')
+
+
+class PromptConfig:
+    # 各类 prompt 的 token 预算（按字符估算），超出时依次精简副作用示例、境界列表、判定规则；0 表示不限
+    # narration 只需撰写描述，判定细节用处不大，默认收紧
+    PROMPT_TOKEN_BUDGETS = {
+        'judge': int(os.getenv('PROMPT_BUDGET_JUDGE', '0')),
+        'narration': int(os.getenv('PROMPT_BUDGET_NARRATION', '450')),
+        'event': int(os.getenv('PROMPT_BUDGET_EVENT', '0')),
+    }
+
+
+class MetricsConfig:
+    # 阶段耗时与 token 指标，关闭后记录调用直接返回，/metrics 返回 404
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
@@ -0,0 +1,179 @@
+"""
+崩溃安全的文件写入
+先写入同目录下的临时文件，再用 os.replace 原子替换，任何时刻磁盘上都是完整的旧文件或新文件；
+GroupCommitWriter 把短时间窗口内的多次保存合并为一次落盘（同一文件只写最后一个版本），
+并按配置决定持久化的程度：
+- always：替换前 fsync 文件内容，替换后 fsync 目录，返回即已持久化
+- interval：替换前 fsync 文件内容（断电后不会出现空文件或半个文件），目录由后台按间隔 fsync，
+  断电最多丢失最近一个间隔内的替换，文件回到上一个完整版本
+- never：不 fsync，只依赖操作系统回写；进程崩溃不影响，断电后文件可能为空或不完整
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, List, Tuple
+
+DURABILITY_MODES = ("always", "interval", "never")
+
+
+def atomic_write_text(path: str, text: str, fsync: bool = True, fsync_directory: Optional[bool] = None) -> None:
+    """原子写入文本文件；fsync_directory 缺省与 fsync 相同"""
+    _atomic_write(path, text, 'w', fsync, fsync_directory, encoding='utf-8')
+
+
+def atomic_write_bytes(path: str, data: bytes, fsync: bool = True) -> None:
+    """原子写入二进制文件"""
+    _atomic_write(path, data, 'wb', fsync, None)
+
+
+def _atomic_write(path: str, data, mode: str, fsync: bool, fsync_directory: Optional[bool],
+                  **open_options) -> None:
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **open_options) as f:
+            f.write(data)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if fsync if fsync_directory is None else fsync_directory:
+        _fsync_directory(directory)
+
+
+def atomic_write_json(path: str, document: Any, fsync: bool = True) -> None:
+    """原子写入 JSON 文件"""
+    atomic_write_text(path, json.dumps(document, ensure_ascii=False, indent=2), fsync=fsync)
+
+
+def _fsync_directory(directory: str) -> None:
+    """fsync 目录，确保 rename 本身已持久化（部分平台不支持）"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class GroupCommitWriter:
+    """分组提交写入器"""
+
+    def __init__(self, durability: str = "interval", window_ms: float = 5,
+                 fsync_interval_ms: float = 100):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"未知的持久化模式: {durability}")
+        self.durability = durability
+        self.window = window_ms / 1000
+        self.fsync_interval = fsync_interval_ms / 1000
+        self._cond = threading.Condition()
+        self._pending: Dict[str, Tuple[str, List[Future]]] = {}
+        # 正在写入磁盘的批次，写完之前读取仍以它为准
+        self._committing: Dict[str, Tuple[str, List[Future]]] = {}
+        self._last_fsync = 0.0
+        # interval 模式下已替换、目录尚未 fsync 的目录
+        self._unsynced_dirs = set()
+        self._stats = {"saves": 0, "commits": 0, "files_written": 0, "fsyncs": 0}
+        self._thread = threading.Thread(target=self._commit_loop, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, document: Any) -> Future:
+        """提交一次保存，返回在落盘后完成的 Future；同一文件未落盘的旧版本会被覆盖"""
+        text = json.dumps(document, ensure_ascii=False, indent=2)
+        future = Future()
+        with self._cond:
+            _, waiters = self._pending.get(path, (None, []))
+            self._pending[path] = (text, waiters + [future])
+            self._stats["saves"] += 1
+            self._cond.notify()
+        return future
+
+    def write(self, path: str, document: Any) -> None:
+        """提交并等待落盘"""
+        self.submit(path, document).result()
+
+    def pending(self, path: str) -> Optional[Any]:
+        """尚未落盘的最新版本（读取时优先使用，保证读到自己刚写的内容）"""
+        with self._cond:
+            entry = self._pending.get(path) or self._committing.get(path)
+        return json.loads(entry[0]) if entry else None
+
+    def flush(self) -> None:
+        """等待当前所有保存落盘"""
+        with self._cond:
+            futures = [f for batch in (self._pending, self._committing)
+                       for _, waiters in batch.values() for f in waiters]
+        for future in futures:
+            future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+        stats["durability"] = self.durability
+        stats["avg_saves_per_commit"] = round(stats["saves"] / stats["commits"], 2) if stats["commits"] else 0.0
+        return stats
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    if not self._unsynced_dirs:
+                        self._cond.wait()
+                        continue
+                    # 没有新的保存时也按间隔把已替换的目录落盘，空闲的服务器不会一直停留在未同步状态
+                    remaining = self._last_fsync + self.fsync_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            if not self._pending:
+                self._sync_directories()
+                continue
+            # 等待一个窗口，让并发的保存合并到同一次提交
+            if self.window > 0:
+                time.sleep(self.window)
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._committing = batch
+            self._commit(batch)
+            with self._cond:
+                self._committing = {}
+
+    def _commit(self, batch: Dict[str, Tuple[str, List[Future]]]):
+        fsync = self.durability != "never"
+        written = 0
+        for path, (text, waiters) in batch.items():
+            try:
+                atomic_write_text(path, text, fsync=fsync, fsync_directory=self.durability == "always")
+                written += 1
+                if self.durability == "interval":
+                    self._unsynced_dirs.add(os.path.dirname(path) or ".")
+                for future in waiters:
+                    future.set_result(None)
+            except Exception as e:
+                print(f"保存文件失败 {path}: {e}")
+                for future in waiters:
+                    future.set_exception(e)
+        with self._cond:
+            self._stats["commits"] += 1
+            self._stats["files_written"] += len(batch)
+            self._stats["fsyncs"] += written if fsync else 0
+        if self._unsynced_dirs and time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self._sync_directories()
+
+    def _sync_directories(self) -> None:
+        """fsync 已替换文件所在的目录（只在提交线程中调用）"""
+        directories, self._unsynced_dirs = self._unsynced_dirs, set()
+        for directory in directories:
+            _fsync_directory(directory)
+        self._last_fsync = time.monotonic()
@@ -0,0 +1,154 @@
+"""
+行动判定微批处理
+在很短的时间窗口内收集多名玩家的待判定行动，合并为一次模型调用：
+静态规则前缀只发送一次，随后是按编号排列的各玩家状况，
+模型返回的结果数组再按编号分发回各个等待中的请求
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from api_config import DeepSeekClient, LLMUnavailableError
+from utils.json_validator import validate_deepseek_result
+from utils.prompt_builder import EnhancedPromptBuilder
+
+
+class _PendingJudgment:
+    def __init__(self, player: Dict[str, Any], action: str, context: Optional[str], routing: Dict[str, Any]):
+        self.player = player
+        self.action = action
+        self.context = context
+        self.routing = routing
+        self.future = Future()
+
+
+class BatchJudge:
+    """微批判定器"""
+
+    def __init__(self, client: DeepSeekClient, prompt_builder: EnhancedPromptBuilder,
+                 window_ms: float = 30, max_batch_size: int = 8,
+                 use_json_format: bool = True, max_concurrent_batches: int = 8):
+        self.client = client
+        self.prompt_builder = prompt_builder
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.use_json_format = use_json_format
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix="batch-judge")
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "items": 0, "single_fallbacks": 0}
+        self._collector = threading.Thread(target=self._collect_loop, name="batch-collector", daemon=True)
+        self._collector.start()
+
+    def judge(self, player: Dict[str, Any], action: str, context: Optional[str] = None,
+              **routing) -> Dict[str, Any]:
+        """提交一次判定并等待结果（routing 为模型路由参数，随调用原样传给客户端）"""
+        pending = _PendingJudgment(player, action, context, routing)
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_batch_size"] = round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+    def _collect_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # 批次在线程池中执行，收集下一批不必等待当前批次返回
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[_PendingJudgment]):
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+
+        if len(batch) == 1:
+            self._run_single(batch[0])
+            return
+
+        try:
+            reply = self.client.call_api(self._build_batch_prompt(batch), use_json_format=self.use_json_format,
+                                         **self._batch_routing(batch))
+            results = self._split_results(reply, len(batch))
+        except LLMUnavailableError as e:
+            # 服务不可用时不再逐个重试，直接通知所有等待者
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+        except Exception as e:
+            print(f"批量判定失败，改为逐个判定: {e}")
+            results = {}
+
+        for index, pending in enumerate(batch):
+            result = results.get(index)
+            if result is not None:
+                pending.future.set_result(result)
+            else:
+                self._run_single(pending, fallback=True)
+
+    def _run_single(self, pending: _PendingJudgment, fallback: bool = False):
+        if fallback:
+            with self._stats_lock:
+                self._stats["single_fallbacks"] += 1
+        try:
+            prompt = self.prompt_builder.generate_prompt(pending.player, pending.action, pending.context)
+            result = self.client.call_api(prompt, use_json_format=self.use_json_format, **pending.routing)
+            pending.future.set_result(validate_deepseek_result(result))
+        except Exception as e:
+            pending.future.set_exception(e)
+
+    @staticmethod
+    def _batch_routing(batch: List[_PendingJudgment]) -> Dict[str, Any]:
+        """整批按其中最复杂的行动选择模型"""
+        complexities = [p.routing["complexity"] for p in batch if p.routing.get("complexity") is not None]
+        return {"complexity": max(complexities)} if complexities else {}
+
+    def _build_batch_prompt(self, batch: List[_PendingJudgment]) -> str:
+        prefix = self.prompt_builder.get_static_prefix()
+        situations = "\n".join(
+            f"【玩家 p{index}】\n"
+            f"{self.prompt_builder.build_situation(p.player, p.action, p.context)}"
+            for index, p in enumerate(batch)
+        )
+        return f"""{prefix}
+=== 批量判定 ===
+以下是{len(batch)}名互不相关的玩家各自的当前状况与行动，请分别独立判定。
+
+{situations}
+请严格返回以下JSON格式，results 中每一项的其余字段与【输出格式】相同，id 与上文玩家编号一一对应，不要有任何额外说明：
+{{
+    "results": [
+        {{"id": "p0", "成功": true或false, "描述": "...", "建议": "...", "状态变化": {{...}}}}
+    ]
+}}
+"""
+
+    def _split_results(self, reply: Dict[str, Any], size: int) -> Dict[int, Dict[str, Any]]:
+        """按编号拆分批量结果，缺失或格式错误的项不返回"""
+        results = {}
+        items = reply.get("results") if isinstance(reply, dict) else None
+        if not isinstance(items, list):
+            return results
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            key = str(item.pop("id", ""))
+            if not key.startswith("p") or not key[1:].isdigit():
+                continue
+            index = int(key[1:])
+            if index < size and index not in results and "描述" in item:
+                results[index] = validate_deepseek_result(item)
+        return results
@@ -0,0 +1,8 @@
+"""
+模型调用相关的异常
+单独放在不依赖 openai 的模块中，应用启动时即可注册错误处理，无需导入模型客户端
+"""
+
+
+class LLMUnavailableError(Exception):
+    """模型服务暂不可用（熔断打开、超过截止时间或重试耗尽）"""
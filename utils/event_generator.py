@@ -6,21 +6,79 @@ import json
 from typing import List, Dict, Any
 from api_config import DeepSeekClient
 from utils.world_loader import WorldSettingsLoader
+from utils.player_model import HP_TIER_LABELS, hp_tier, energy_tier
+from utils.realm import get_realm_level
+from utils.history import recent_summary
 from utils.json_validator import validate_deepseek_result
+from utils.response_cache import ResponseCache, make_state_key
+from utils.event_synthesizer import EventSynthesizer
+from utils.prompt_budget import PromptSection, PromptBudgetReport, estimate_tokens, fit_sections, render_sections
+
+# 事件 prompt 中灵气档位的措辞
+ENERGY_STATUS = ("枯竭", "不足", "充足")
+
+EVENT_TASK = """【任务要求】
+你是一个玄幻修仙世界的事件生成器。基于主角当前的状态（见文末【当前状况分析】），生成3个合理且有趣的事件选项供玩家选择。
+
+要求：
+1. 每个事件要符合玄幻世界观，考虑主角的境界、命格、当前状态
+2. 事件难度要适中，既有挑战也有机遇
+3. 事件类型要多样化（如：战斗、机缘、社交、修炼、探索等）
+4. 考虑主角的副作用逆转系统特性
+5. 事件描述要简洁有力，激发玩家探索欲望"""
+
+EVENT_NOTES = """特别注意：
+- 炼气期修士不应遇到元婴期才能处理的事件
+- 命格会影响遭遇概率（福星多机缘，煞星多冲突）
+- 低灵气/低血量时应有恢复类选项
+- 事件action使用英文下划线命名法"""
+
+EVENT_OUTPUT_FORMAT = """请严格按照以下JSON格式返回：
+{
+    "events": [
+        {
+            "text": "事件选项描述（10-20字）",
+            "action": "event_action_name"
+        },
+        {
+            "text": "事件选项描述",
+            "action": "event_action_name"
+        },
+        {
+            "text": "事件选项描述",
+            "action": "event_action_name"
+        }
+    ]
+}"""
 
 
 class EventGenerator:
     """动态事件生成器"""
 
-    def __init__(self, api_client: DeepSeekClient, world_loader: WorldSettingsLoader = None):
+    def __init__(self, api_client: DeepSeekClient, world_loader: WorldSettingsLoader = None,
+                 cache: ResponseCache = None, budget: int = 0, budget_report: PromptBudgetReport = None,
+                 synthesizer: EventSynthesizer = None):
         self.client = api_client
         self.world_loader = world_loader or WorldSettingsLoader()
+        self.cache = cache
+        # 模型不可用时由本地合成器生成备用选项
+        self.synthesizer = synthesizer
+        # 事件 prompt 的 token 预算，0 表示不限
+        self.budget = budget
+        self.budget_report = budget_report
+        self._prompt_sections = None
 
     def generate_event_choices(self, player: Dict[str, Any]) -> List[Dict[str, str]]:
         """
         基于玩家当前状态生成三个事件选项
         返回格式: [{"text": "选项文字", "action": "动作标识"}, ...]
         """
+        cache_key = make_state_key("event", player)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         prompt = self._build_event_generation_prompt(player)
 
         try:
@@ -32,7 +90,10 @@ class EventGenerator:
                 events = result["events"]
                 if isinstance(events, list) and len(events) >= 3:
                     # 只取前三个，确保格式正确
-                    return self._validate_events(events[:3])
+                    validated = self._validate_events(events[:3])
+                    if self.cache is not None:
+                        self.cache.put(cache_key, validated)
+                    return validated
 
             # 如果格式不对，返回默认事件
             return self._get_fallback_events(player)
@@ -43,71 +104,46 @@ class EventGenerator:
 
     def _build_event_generation_prompt(self, player: Dict[str, Any]) -> str:
         """构建事件生成的prompt"""
-        # 获取世界设定信息
-        world_desc = self.world_loader.get_world_description()
-
         # 分析玩家状态
         player_analysis = self._analyze_player_state(player)
 
-        prompt = f"""
-{world_desc}
+        # 静态说明在前、玩家状态在后，便于命中服务端前缀缓存
+        tail = f"""
 
 【当前状况分析】
 {player_analysis}
-
-【任务要求】
-你是一个玄幻修仙世界的事件生成器。基于主角当前的状态，生成3个合理且有趣的事件选项供玩家选择。
-
-要求：
-1. 每个事件要符合玄幻世界观，考虑主角的境界、命格、当前状态
-2. 事件难度要适中，既有挑战也有机遇
-3. 事件类型要多样化（如：战斗、机缘、社交、修炼、探索等）
-4. 考虑主角的副作用逆转系统特性
-5. 事件描述要简洁有力，激发玩家探索欲望
-
-特别注意：
-- 炼气期修士不应遇到元婴期才能处理的事件
-- 命格会影响遭遇概率（福星多机缘，煞星多冲突）
-- 低灵气/低血量时应有恢复类选项
-- 事件action使用英文下划线命名法
-
-请严格按照以下JSON格式返回：
-{{
-    "events": [
-        {{
-            "text": "事件选项描述（10-20字）",
-            "action": "event_action_name"
-        }},
-        {{
-            "text": "事件选项描述",
-            "action": "event_action_name"
-        }},
-        {{
-            "text": "事件选项描述",
-            "action": "event_action_name"
-        }}
-    ]
-}}
 """
-        return prompt
+        sections = self._get_prompt_sections()
+        dynamic_tokens = estimate_tokens(tail)
+        choice, full, fitted = fit_sections(
+            sections, max(self.budget - dynamic_tokens, 1) if self.budget > 0 else 0)
+        if self.budget_report is not None:
+            self.budget_report.record("event", full + dynamic_tokens, fitted + dynamic_tokens, self.budget)
+        return "\n" + "\n\n".join(render_sections(sections, choice)) + tail
+
+    def _get_prompt_sections(self) -> List[PromptSection]:
+        """事件 prompt 的静态段落，世界设定文件变化时重建；超出预算时先精简世界观，再省略注意事项"""
+        snapshot = self.world_loader.snapshot
+        if self._prompt_sections is None or self._prompt_sections[0] != snapshot.version:
+            sections = [
+                PromptSection("world", snapshot.sections["world"], priority=0),
+                PromptSection("task", [EVENT_TASK]),
+                PromptSection("notes", [EVENT_NOTES, None], priority=1),
+                PromptSection("output_format", [EVENT_OUTPUT_FORMAT]),
+            ]
+            self._prompt_sections = (snapshot.version, sections)
+        return self._prompt_sections[1]
 
     def _analyze_player_state(self, player: Dict[str, Any]) -> str:
         """分析玩家当前状态，生成状态描述"""
         # 获取命格效果
         fate_effect = self.world_loader.get_fate_effect(player.get('fate', '普通'))
-
-        # 判断玩家状态
-        hp_status = "重伤" if player['hp'] < 30 else "轻伤" if player['hp'] < 70 else "健康"
-        energy_status = "枯竭" if player['spiritual_energy'] < 20 else "不足" if player[
-                                                                                     'spiritual_energy'] < 50 else "充足"
-
-        # 计算综合实力
-        realm_level = self._get_realm_level(player['realm'])
+        hp, energy = player['hp'], player['spiritual_energy']
 
         analysis = f"""
 主角：{player['name']}
-境界：{player['realm']}（修真界第{realm_level}层次）
-状态：生命{hp_status}({player['hp']}/100)，灵气{energy_status}({player['spiritual_energy']}/100)
+境界：{player['realm']}（修真界第{get_realm_level(player['realm'])}层次）
+状态：生命{HP_TIER_LABELS[hp_tier(hp)]}({hp}/100)，灵气{ENERGY_STATUS[energy_tier(energy)]}({energy}/100)
 命格：{player['fate']} - {fate_effect}
 装备：{len(player['artifacts'])}件法宝，{len(player['skills'])}项技能
 特殊：拥有副作用逆转系统
@@ -116,32 +152,13 @@ class EventGenerator:
 """
         return analysis
 
-    def _get_realm_level(self, realm: str) -> int:
-        """获取境界等级数值"""
-        realm_order = ["炼气期", "筑基期", "金丹期", "元婴期", "化神期", "合体期", "渡劫期", "大乘期"]
-        for i, r in enumerate(realm_order):
-            if r in realm:
-                # 计算具体层次
-                try:
-                    level_match = realm.split(r)[1]
-                    level_num = {"一": 1, "二": 2, "三": 3, "四": 4, "五": 5,
-                                 "六": 6, "七": 7, "八": 8, "九": 9}.get(level_match[0], 1)
-                    return i * 9 + level_num
-                except:
-                    return (i + 1) * 9
-        return 1
-
     def _get_recent_history(self, player: Dict[str, Any]) -> str:
         """获取玩家最近的行动历史"""
         history = player.get('history', [])
         if not history:
             return "初入修真界"
 
-        recent = history[-1]
-        action = recent.get('action', '未知行动')
-        success = recent.get('result', {}).get('成功', False)
-
-        return f"{action}（{'成功' if success else '失败'}）"
+        return recent_summary(history, limit=1)
 
     def _validate_events(self, events: List[Dict]) -> List[Dict[str, str]]:
         """验证事件格式"""
@@ -170,6 +187,14 @@ class EventGenerator:
 
     def _get_fallback_events(self, player: Dict[str, Any]) -> List[Dict[str, str]]:
         """获取备用事件（当AI生成失败时）"""
+        if self.synthesizer is not None:
+            try:
+                synthesized = self.synthesizer.synthesize_choices(player)
+                if len(synthesized) >= 3:
+                    return synthesized[:3]
+            except Exception as e:
+                print(f"本地合成事件失败: {e}")
+
         # 根据玩家状态生成合理的备用选项
         events = []
 
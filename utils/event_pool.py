@@ -0,0 +1,188 @@
+"""
+本地加权事件池
+加载 events.json 时按类型、境界范围与难度建立索引：每个大境界一个桶，
+桶内事件的权重 = 类型权重 × 命格修正 ÷ 该类型在桶内的事件总权重 × 事件自身权重；
+玩家重伤或灵气枯竭时排除难度修正大于 1 的事件。
+每个（命格，境界桶，是否虚弱）组合首次使用时构建一张别名表并缓存，之后每次抽取 O(1)，
+事件库到数万条时也只在首次构建时付出 O(n)
+"""
+import os
+import random
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from .realm import REALM_ORDER, parse_realm
+
+DEFAULT_EVENT_TYPE = "exploration"
+DEFAULT_DIFFICULTY = "normal"
+
+
+class AliasTable:
+    """Vose 别名法：O(n) 构建，O(1) 按权重抽取下标"""
+
+    __slots__ = ("_prob", "_alias")
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError("权重必须非空且总和为正")
+
+        scaled = [w * n / total for w in weights]
+        prob = [0.0] * n
+        alias = [0] * n
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # 剩余项因浮点误差未配对，概率视为 1
+        for i in large + small:
+            prob[i] = 1.0
+        self._prob = prob
+        self._alias = alias
+
+    def __len__(self) -> int:
+        return len(self._prob)
+
+    def sample(self, rng: random.Random) -> int:
+        column = rng.randrange(len(self._prob))
+        return column if rng.random() < self._prob[column] else self._alias[column]
+
+
+def realm_bucket(realm: str) -> int:
+    """玩家境界所在的大境界下标（炼气期为 0）"""
+    return parse_realm(realm)[0]
+
+
+def _realm_index(name: str, default: int) -> int:
+    for i, realm in enumerate(REALM_ORDER):
+        if realm in name:
+            return i
+    return default
+
+
+class EventPool:
+    """按命格与境界加权抽取的本地事件池"""
+
+    def __init__(self, events: List[Dict[str, Any]], type_weights: Dict[str, float],
+                 fate_modifiers: Dict[str, Dict[str, float]] = None,
+                 difficulty_modifiers: Dict[str, float] = None, rng: random.Random = None):
+        self.type_weights = type_weights
+        self.fate_modifiers = fate_modifiers or {}
+        self.difficulty_modifiers = difficulty_modifiers or {}
+        self.rng = rng or random.Random()
+        self.events: List[Dict[str, Any]] = []
+        # 境界桶 -> [(事件下标, 类型, 是否高难度)]
+        self._buckets: List[List[Tuple[int, str, bool]]] = [[] for _ in REALM_ORDER]
+        self._tables: Dict[Tuple[str, int, bool], Optional[Tuple[AliasTable, List[int]]]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"samples": 0, "tables_built": 0}
+        for event in events:
+            self._index(event)
+
+    @classmethod
+    def from_file(cls, events: Dict[str, Any], **kwargs) -> "EventPool":
+        return cls(events.get("random_events", []), **kwargs)
+
+    def _index(self, event: Dict[str, Any]) -> None:
+        if not event.get("choices"):
+            return
+        event_type = event.get("type") or DEFAULT_EVENT_TYPE
+        hard = self.difficulty_modifiers.get(event.get("difficulty") or DEFAULT_DIFFICULTY, 1.0) > 1.0
+        low, high = (event.get("realm_range") or [REALM_ORDER[0], REALM_ORDER[-1]])[:2]
+        low = _realm_index(low, 0)
+        high = _realm_index(high, len(REALM_ORDER) - 1)
+        index = len(self.events)
+        self.events.append(event)
+        for bucket in range(low, high + 1):
+            self._buckets[bucket].append((index, event_type, hard))
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def sample(self, player: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """按玩家命格、境界与状态抽取一个事件（返回副本），没有合适的事件时返回 None"""
+        index = self.sample_index(player)
+        return dict(self.events[index]) if index is not None else None
+
+    def sample_index(self, player: Dict[str, Any]) -> Optional[int]:
+        """同 sample，返回事件在 events 中的下标"""
+        fate = player.get("fate", "普通")
+        bucket = realm_bucket(player["realm"])
+        table = None
+        if player.get("hp", 100) < 30 or player.get("spiritual_energy", 100) < 20:
+            table = self._table_for(fate, bucket, weakened=True)
+        if table is None:
+            table = self._table_for(fate, bucket, weakened=False)
+        if table is None:
+            return None
+        alias, indices = table
+        self._stats["samples"] += 1
+        return indices[alias.sample(self.rng)]
+
+    def _table_for(self, fate: str, bucket: int, weakened: bool) -> Optional[Tuple[AliasTable, List[int]]]:
+        # 没有修正的命格共用一张表
+        fate_key = fate if fate in self.fate_modifiers else ""
+        key = (fate_key, bucket, weakened)
+        table = self._tables.get(key, False)
+        if table is not False:
+            return table
+        with self._lock:
+            if key not in self._tables:
+                self._tables[key] = self._build_table(self.fate_modifiers.get(fate_key, {}), bucket, weakened)
+                self._stats["tables_built"] += 1
+            return self._tables[key]
+
+    def _build_table(self, fate_modifier: Dict[str, float], bucket: int,
+                     weakened: bool) -> Optional[Tuple[AliasTable, List[int]]]:
+        members = [(index, event_type) for index, event_type, hard in self._buckets[bucket]
+                   if not (weakened and hard)]
+        type_totals: Dict[str, float] = {}
+        for index, event_type in members:
+            type_totals[event_type] = type_totals.get(event_type, 0.0) + self._event_weight(index)
+
+        indices, weights = [], []
+        for index, event_type in members:
+            type_weight = self.type_weights.get(event_type, 0.0) * fate_modifier.get(event_type, 1.0)
+            weight = type_weight * self._event_weight(index) / type_totals[event_type]
+            if weight > 0:
+                indices.append(index)
+                weights.append(weight)
+        if not indices:
+            return None
+        return AliasTable(weights), indices
+
+    def _event_weight(self, index: int) -> float:
+        return float(self.events[index].get("weight", 1.0))
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, events=len(self.events), tables=len(self._tables))
+
+
+class EventPoolLoader:
+    """事件文件修改后自动重建事件池"""
+
+    def __init__(self, path: str, load_events, **pool_options):
+        self.path = path
+        self._load_events = load_events
+        self._pool_options = pool_options
+        self._pool = None
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+
+    def get(self) -> EventPool:
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if self._pool is None or mtime_ns != self._mtime_ns:
+            with self._lock:
+                if self._pool is None or mtime_ns != self._mtime_ns:
+                    # load_events 会在文件缺失时写入默认事件
+                    self._pool = EventPool.from_file(self._load_events(), **self._pool_options)
+                    self._mtime_ns = os.stat(self.path).st_mtime_ns
+        return self._pool
@@ -0,0 +1,171 @@
+"""
+离线事件合成器
+把 data/event_templates.json 中按 README 特殊事件、秘境、法宝、丹药、敌人模板整理的
+文法编译成参数化生成器：文本中的 {符号} 在加载时拆成字面量与槽位，符号取值本身也可以
+引用其他符号；按境界分档的符号只取玩家所在大境界（或最近的较低档）的候选。
+同一事件内同名符号只取一次值，描述与选项前后一致。模板的抽取沿用事件池的
+类型权重、命格修正与虚弱时的难度过滤，无需调用模型，单次合成在几十微秒内
+"""
+import json
+import random
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from .event_pool import EventPool, realm_bucket
+from .realm import REALM_ORDER, get_realm_level, realm_name_for_level
+
+_SLOT = re.compile(r"\{(\w+)\}")
+# 符号互相引用的最大深度，防止文法写成环
+MAX_DEPTH = 8
+
+
+class CompiledText:
+    """预先拆分好的模板文本：偶数位为字面量，奇数位为符号名"""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, text: str):
+        self.parts = tuple(_SLOT.split(text))
+
+    def render(self, resolve) -> str:
+        parts = self.parts
+        if len(parts) == 1:
+            return parts[0]
+        return "".join(resolve(part) if i % 2 else part for i, part in enumerate(parts))
+
+
+class CompiledTemplate:
+    """单个事件模板：名称、描述候选、三个选项与用于备用选项的一句话钩子"""
+
+    __slots__ = ("id", "name", "descriptions", "choices", "hook", "enemy_level_offset")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.id = spec["id"]
+        self.name = CompiledText(spec["name"])
+        self.descriptions = [CompiledText(text) for text in _as_list(spec["description"])]
+        self.choices = [(CompiledText(choice["text"]), choice["action"]) for choice in spec["choices"]]
+        self.hook = (CompiledText(spec["hook"]["text"]), spec["hook"]["action"])
+        self.enemy_level_offset = tuple(spec.get("enemy_level_offset", (-2, 2)))
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+class _Bindings:
+    """一次合成中的符号取值，同名符号只取一次"""
+
+    __slots__ = ("_synth", "_player", "_tier", "_template", "_values", "_depth")
+
+    def __init__(self, synth: "EventSynthesizer", player: Dict[str, Any], tier: int,
+                 template: Optional[CompiledTemplate]):
+        self._synth = synth
+        self._player = player
+        self._tier = tier
+        self._template = template
+        self._values = {"player": player.get("name", "主角"), "realm": REALM_ORDER[tier]}
+        self._depth = 0
+
+    def __call__(self, name: str) -> str:
+        value = self._values.get(name)
+        if value is None:
+            value = self._values[name] = self._draw(name)
+        return value
+
+    def _draw(self, name: str) -> str:
+        rng = self._synth.rng
+        if name == "enemy_realm":
+            low, high = self._template.enemy_level_offset if self._template else (-2, 2)
+            return realm_name_for_level(get_realm_level(self._player["realm"]) + rng.randint(low, high))
+
+        candidates = self._synth.symbols.get(name)
+        if candidates is None:
+            return name
+        if isinstance(candidates, tuple):
+            candidates = candidates[self._tier]
+        if self._depth >= MAX_DEPTH:
+            return "".join(candidates[0].parts[::2])
+        self._depth += 1
+        try:
+            return rng.choice(candidates).render(self)
+        finally:
+            self._depth -= 1
+
+
+class EventSynthesizer:
+    """按模板文法在本地合成事件与事件选项"""
+
+    def __init__(self, spec: Dict[str, Any], type_weights: Dict[str, float],
+                 fate_modifiers: Dict[str, Dict[str, float]] = None,
+                 difficulty_modifiers: Dict[str, float] = None, rng: random.Random = None):
+        self.rng = rng or random.Random()
+        self.symbols = {name: self._compile_symbol(values) for name, values in spec.get("symbols", {}).items()}
+        self.rest_hooks = [(CompiledText(hook["text"]), hook["action"]) for hook in spec.get("rest_hooks", [])]
+        # 模板的类型、境界范围与难度标注交给事件池做加权抽取，编译结果与事件池下标一一对应
+        self._pool = EventPool(spec.get("templates", []), type_weights, fate_modifiers,
+                               difficulty_modifiers, rng=self.rng)
+        self.templates = [CompiledTemplate(template) for template in self._pool.events]
+        self._stats = {"events": 0, "choices": 0}
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "EventSynthesizer":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    @staticmethod
+    def _compile_symbol(values):
+        if isinstance(values, dict):
+            # 按境界分档（编译为按大境界下标排列的元组）：每个大境界取定义在它之下最近的一档
+            tiers, current = [], None
+            for realm in REALM_ORDER:
+                if realm in values:
+                    current = [CompiledText(text) for text in values[realm]]
+                tiers.append(current)
+            first = next(tier for tier in tiers if tier is not None)
+            return tuple(tier if tier is not None else first for tier in tiers)
+        return [CompiledText(text) for text in values]
+
+    def synthesize_event(self, player: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """合成一个完整事件（名称、描述、三个选项），没有适用的模板时返回 None"""
+        index = self._pool.sample_index(player)
+        if index is None:
+            return None
+        template, source = self.templates[index], self._pool.events[index]
+        bind = _Bindings(self, player, realm_bucket(player["realm"]), template)
+        self._stats["events"] += 1
+        return {
+            "id": f"synth_{template.id}_{self.rng.getrandbits(32):08x}",
+            "name": template.name.render(bind),
+            "type": source.get("type"),
+            "difficulty": source.get("difficulty"),
+            "description": self.rng.choice(template.descriptions).render(bind),
+            "choices": [{"text": text.render(bind), "action": action} for text, action in template.choices]
+        }
+
+    def synthesize_choices(self, player: Dict[str, Any], count: int = 3) -> List[Dict[str, str]]:
+        """合成 count 个互不相同的事件选项（取各模板的钩子）；重伤或灵气不足时必有一个休整选项"""
+        tier = realm_bucket(player["realm"])
+        picked: List[Tuple[CompiledText, str, Optional[CompiledTemplate]]] = []
+        if self.rest_hooks and (player.get("hp", 100) < 50 or player.get("spiritual_energy", 100) < 30):
+            text, action = self.rng.choice(self.rest_hooks)
+            picked.append((text, action, None))
+
+        seen = set()
+        for _ in range(count * 4):
+            if len(picked) >= count:
+                break
+            index = self._pool.sample_index(player)
+            if index is None:
+                break
+            template = self.templates[index]
+            if template.id in seen:
+                continue
+            seen.add(template.id)
+            picked.append(template.hook + (template,))
+
+        self._stats["choices"] += 1
+        return [{"text": text.render(_Bindings(self, player, tier, template)), "action": action}
+                for text, action, template in picked]
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats, templates=len(self.templates))
@@ -0,0 +1,167 @@
+"""
+对冲请求
+调用超过近期延迟的指定百分位仍未返回时，再发出一份相同的请求（可发给更快的模型），
+先返回可解析结果的一方胜出，另一方取消；对冲次数按最近调用的比例封顶，成本可控。
+异步客户端（AsyncClientBridge）的落选请求会真正取消上游连接；
+同步客户端无法中断进行中的 HTTP 请求，落选结果直接丢弃。
+同步客户端只在可能发出对冲时才把原请求放进线程池（对冲另用一个线程池，不排在原请求之后），
+样本不足、对冲比例已用完或线程池已满时直接在调用方线程中请求
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Optional
+
+from .metrics import registry
+
+HEDGES = registry.counter("xiuxian_llm_hedges_total", "对冲请求（sent 发出，won 对冲胜出，lost 原请求胜出，"
+                                                      "skipped_budget 超出比例上限未发出）", ["model", "outcome"])
+
+
+class HedgedClient:
+    """在客户端外包一层对冲策略，接口与 DeepSeekClient 一致"""
+
+    def __init__(self, primary, hedge_client=None, percentile: float = 95, max_hedge_ratio: float = 0.1,
+                 min_delay: float = 1.0, window: int = 200, min_samples: int = 20, max_workers: int = 64,
+                 hedge_workers: int = 16):
+        self.primary = primary
+        # 不指定时对冲请求发给同一模型
+        self.hedge_client = hedge_client or primary
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge-primary")
+        self._hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="hedge")
+        # 原请求线程池的空闲名额，用完时不再排队而是直接调用
+        self._primary_slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        # 最近调用是否发出了对冲，用于限制对冲比例
+        self._hedged = deque(maxlen=window)
+        self._stats = {"calls": 0, "sent": 0, "won": 0, "lost": 0, "skipped_budget": 0}
+
+    def __getattr__(self, name):
+        # 流式调用、解析与统计等直接转发给主客户端
+        return getattr(self.primary, name)
+
+    def call_api(self, prompt, use_json_format=False):
+        delay = self.hedge_delay()
+        primary = None
+        if delay is not None and self._hedge_budget_left():
+            primary = self._submit_primary(prompt, use_json_format)
+        if primary is None:
+            # 不可能发出对冲，直接调用，只记录耗时
+            start = time.monotonic()
+            result = self.primary.call_api(prompt, use_json_format=use_json_format)
+            self._record_latency(time.monotonic() - start)
+            self._finish_call(hedged=False)
+            return result
+
+        start = time.monotonic()
+        primary.add_done_callback(lambda f: self._on_primary_done(f, start))
+        futures = [primary]
+        done, _ = wait(futures, timeout=delay)
+        hedged = not done and self._reserve_hedge()
+        if hedged:
+            futures.append(self._submit(self.hedge_client, prompt, use_json_format, coalesce=False,
+                                        executor=self._hedge_executor))
+            HEDGES.inc(model=self.hedge_client.model, outcome="sent")
+        self._finish_call(hedged)
+        return self._first_valid(futures, hedged)
+
+    def hedge_delay(self) -> Optional[float]:
+        """发出对冲前的等待时间：近期延迟的指定百分位，样本不足时返回 None"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+    def _submit_primary(self, prompt, use_json_format) -> Optional[Future]:
+        """提交原请求；同步客户端的线程池已满时返回 None"""
+        if getattr(self.primary, "submit_api", None) is not None:
+            return self._submit(self.primary, prompt, use_json_format, coalesce=True)
+        if not self._primary_slots.acquire(blocking=False):
+            return None
+        future = self._submit(self.primary, prompt, use_json_format, coalesce=True, executor=self._executor)
+        future.add_done_callback(lambda f: self._primary_slots.release())
+        return future
+
+    def _submit(self, client, prompt, use_json_format, coalesce, executor=None) -> Future:
+        submit = getattr(client, "submit_api", None)
+        if submit is not None:
+            return submit(prompt, use_json_format=use_json_format, coalesce=coalesce)
+        # 同步客户端在线程池中执行，沿用调用方的上下文（指标路由）
+        context = contextvars.copy_context()
+        return executor.submit(context.run, client.call_api, prompt, use_json_format)
+
+    def _first_valid(self, futures, hedged):
+        """返回最先完成且可解析的结果；都不可解析时返回先到的结果，都失败时抛出原请求的异常"""
+        pending = set(futures)
+        fallback, errors = None, {}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors[future] = e
+                    continue
+                if self.primary.is_degraded_response(result):
+                    fallback = fallback or result
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                if hedged:
+                    outcome = "lost" if future is futures[0] else "won"
+                    self._count(outcome)
+                    HEDGES.inc(model=self.hedge_client.model, outcome=outcome)
+                return result
+        if fallback is not None:
+            return fallback
+        raise errors.get(futures[0]) or next(iter(errors.values()))
+
+    def _on_primary_done(self, future: Future, start: float) -> None:
+        # 被取消的原请求按已等待的时间计入（真实耗时只会更长），避免百分位被低估
+        if future.cancelled() or future.exception() is None:
+            self._record_latency(time.monotonic() - start)
+
+    def _record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def _hedge_budget_left(self) -> bool:
+        """当前是否还能发出对冲（不占用额度）"""
+        with self._lock:
+            return sum(self._hedged) + 1 <= self.max_hedge_ratio * (len(self._hedged) + 1)
+
+    def _reserve_hedge(self) -> bool:
+        with self._lock:
+            if sum(self._hedged) + 1 > self.max_hedge_ratio * (len(self._hedged) + 1):
+                self._stats["skipped_budget"] += 1
+                allowed = False
+            else:
+                self._stats["sent"] += 1
+                allowed = True
+        if not allowed:
+            HEDGES.inc(model=self.hedge_client.model, outcome="skipped_budget")
+        return allowed
+
+    def _finish_call(self, hedged: bool) -> None:
+        with self._lock:
+            self._stats["calls"] += 1
+            self._hedged.append(hedged)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        delay = self.hedge_delay()
+        with self._lock:
+            return dict(self._stats, samples=len(self._latencies),
+                        hedge_delay=round(delay, 3) if delay is not None else None)
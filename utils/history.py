@@ -0,0 +1,86 @@
+"""
+历史记录压缩
+玩家历史只保存紧凑的结构化记录（行动、成败、状态变化、时间），
+描述文字另存并按需读取；被挤出历史的旧记录汇总为"过往事迹"摘要供 prompt 使用
+"""
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+# 摘要中保留的物品/技能/境界数量
+DIGEST_KEEP = 5
+
+
+def make_history_record(action: str, result: Dict[str, Any],
+                        timestamp: Optional[str] = None,
+                        entry_id: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """把一次行动结果拆成 (紧凑记录, 描述文字)"""
+    changes = result.get("状态变化") or {}
+    compact_changes = {
+        key: value for key, value in changes.items()
+        if value not in (0, None, [], "")
+    }
+    record = {
+        "id": entry_id or uuid.uuid4().hex[:16],
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "action": action,
+        "success": bool(result.get("成功", False)),
+        "changes": compact_changes
+    }
+    narration = {
+        "描述": result.get("描述", ""),
+        "建议": result.get("建议", "")
+    }
+    return record, narration
+
+
+def split_legacy_entry(entry: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """把单人版本存档（data/player.json）中内含完整 result 的历史记录转换为紧凑记录"""
+    if "result" not in entry:
+        return entry, {}
+    return make_history_record(entry.get("action", ""), entry["result"] or {},
+                               timestamp=entry.get("timestamp"))
+
+
+def new_digest() -> Dict[str, Any]:
+    return {"count": 0, "successes": 0, "hp": 0, "spiritual_energy": 0,
+            "items": [], "skills": [], "realms": []}
+
+
+def fold_into_digest(digest: Optional[Dict[str, Any]],
+                     records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """把被挤出历史的记录累加进过往事迹摘要"""
+    digest = dict(digest or new_digest())
+    for record in records:
+        changes = record.get("changes", {})
+        digest["count"] += 1
+        digest["successes"] += 1 if record.get("success") else 0
+        digest["hp"] += changes.get("hp", 0)
+        digest["spiritual_energy"] += changes.get("spiritual_energy", 0)
+        digest["items"] = (digest["items"] + changes.get("new_items", []))[-DIGEST_KEEP:]
+        digest["skills"] = (digest["skills"] + changes.get("new_skills", []))[-DIGEST_KEEP:]
+        if changes.get("realm_change"):
+            digest["realms"] = (digest["realms"] + [changes["realm_change"]])[-DIGEST_KEEP:]
+    return digest
+
+
+def digest_summary(digest: Optional[Dict[str, Any]]) -> str:
+    """过往事迹的简短文字描述"""
+    if not digest or not digest.get("count"):
+        return ""
+    parts = [f"此前历经{digest['count']}次行动，成功{digest['successes']}次"]
+    if digest["realms"]:
+        parts.append(f"曾突破至{'、'.join(digest['realms'])}")
+    if digest["items"]:
+        parts.append(f"得到过{'、'.join(digest['items'])}")
+    if digest["skills"]:
+        parts.append(f"习得{'、'.join(digest['skills'])}")
+    return "，".join(parts) + "。"
+
+
+def recent_summary(history: List[Dict[str, Any]], limit: int = 3) -> str:
+    """最近几次行动的简短描述"""
+    return "；".join(
+        f"{record.get('action', '未知行动')}（{'成功' if record.get('success') else '失败'}）"
+        for record in history[-limit:]
+    )
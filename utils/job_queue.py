@@ -0,0 +1,233 @@
+"""
+后台任务队列
+耗时的行动判定以任务方式提交：请求立即返回任务编号，由有界线程池执行，
+客户端长轮询或订阅任务完成。排队任务超过上限时拒绝提交并给出建议的重试间隔；
+任务带截止时间，排队超时直接放弃，执行超时或被取消的任务不再结算结果。
+同一玩家同时只能有一个未完成的任务，避免两次行动并发修改玩家状态
+"""
+import contextvars
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional
+
+from .metrics import registry
+
+JOBS = registry.counter("xiuxian_jobs_total", "后台任务数（按最终状态）", ["status"])
+JOB_SECONDS = registry.histogram("xiuxian_job_seconds", "后台任务耗时（秒，queue 为排队，run 为执行）", ["phase"])
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+EXPIRED = "expired"
+FINISHED_STATES = frozenset((DONE, FAILED, CANCELLED, EXPIRED))
+
+
+class QueueFullError(Exception):
+    """排队任务已满，retry_after 为建议的重试间隔（秒）"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"任务队列已满，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+class PlayerBusyError(Exception):
+    """玩家已有未完成的任务"""
+
+    def __init__(self, job: "Job"):
+        super().__init__("上一次行动仍在推演中")
+        self.job = job
+
+
+class Job:
+    """单个后台任务；状态只在 JobQueue 的锁内修改"""
+
+    def __init__(self, player_id: str, kind: str, deadline: float):
+        self.id = uuid.uuid4().hex
+        self.player_id = player_id
+        self.kind = kind
+        self.status = QUEUED
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.deadline = deadline
+        # 结果开始结算后不能再取消或判为超时
+        self.committing = False
+        self._finished = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "deadline_in": max(0.0, round(self.deadline - now, 1)) if not self.finished else None,
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """有界的后台任务队列"""
+
+    def __init__(self, max_workers: int = 8, max_queued: int = 64, deadline_seconds: float = 120,
+                 result_ttl_seconds: float = 300, on_error: Callable[[Exception], str] = None):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.deadline_seconds = deadline_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        # 把任务异常转换为返回给客户端的错误文字
+        self._on_error = on_error or str
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._active_by_player: Dict[str, Job] = {}
+        self._finished_order: deque = deque()
+        self._queued = 0
+        self._running = 0
+        # 执行耗时的指数滑动平均，用于估算 Retry-After
+        self._avg_run_seconds = 5.0
+        self._stats = {"submitted": 0, "rejected": 0, DONE: 0, FAILED: 0, CANCELLED: 0, EXPIRED: 0}
+
+    def submit(self, player_id: str, kind: str, fn: Callable[..., Any], *args,
+               deadline_seconds: float = None) -> Job:
+        """
+        提交任务，fn(job, *args) 在线程池中执行，返回值作为任务结果
+        fn 在修改玩家状态前应调用 begin_commit(job)，返回 False 时放弃结算
+        队列已满时抛出 QueueFullError，玩家已有未完成任务时抛出 PlayerBusyError
+        """
+        deadline = time.monotonic() + (deadline_seconds or self.deadline_seconds)
+        with self._lock:
+            self._sweep()
+            active = self._active_by_player.get(player_id)
+            if active is not None:
+                raise PlayerBusyError(active)
+            if self._queued >= self.max_queued:
+                self._stats["rejected"] += 1
+                raise QueueFullError(self._retry_after())
+            job = Job(player_id, kind, deadline)
+            self._jobs[job.id] = job
+            self._active_by_player[player_id] = job
+            self._queued += 1
+            self._stats["submitted"] += 1
+        # 沿用提交时的上下文（当前路由等），指标归类不变
+        context = contextvars.copy_context()
+        self._executor.submit(context.run, self._run, job, fn, args)
+        return job
+
+    def get(self, job_id: str, player_id: str) -> Optional[Job]:
+        """按编号取任务，只能取到本玩家的任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.player_id != player_id:
+                return None
+            self._expire_if_due(job)
+            return job
+
+    def wait(self, job: Job, timeout: float) -> Job:
+        """等待任务结束，最多等到 timeout 秒或任务截止时间"""
+        remaining = min(timeout, job.deadline - time.monotonic())
+        if remaining > 0:
+            job._finished.wait(remaining)
+        with self._lock:
+            self._expire_if_due(job)
+        return job
+
+    def cancel(self, job: Job) -> bool:
+        """取消任务；已开始结算或已结束的任务无法取消"""
+        with self._lock:
+            if job.finished or job.committing:
+                return False
+            self._finish(job, CANCELLED, error="任务已取消")
+            return True
+
+    def begin_commit(self, job: Job) -> bool:
+        """任务即将修改玩家状态；已取消或已超时时返回 False"""
+        with self._lock:
+            self._expire_if_due(job)
+            if job.finished:
+                return False
+            job.committing = True
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, queued=self._queued, running=self._running,
+                        tracked=len(self._jobs), avg_run_seconds=round(self._avg_run_seconds, 3))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple) -> None:
+        with self._lock:
+            self._queued -= 1
+            self._expire_if_due(job)
+            if job.finished:
+                # 排队期间已取消或超时，不再执行
+                return
+            job.status = RUNNING
+            job.started_at = time.monotonic()
+            self._running += 1
+        JOB_SECONDS.observe(job.started_at - job.created_at, phase="queue")
+
+        result, error = None, None
+        try:
+            result = fn(job, *args)
+        except Exception as e:
+            print(f"后台任务执行失败: {e}")
+            error = self._on_error(e)
+
+        elapsed = time.monotonic() - job.started_at
+        JOB_SECONDS.observe(elapsed, phase="run")
+        with self._lock:
+            self._running -= 1
+            self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * elapsed
+            if job.finished:
+                return
+            if error is not None:
+                self._finish(job, FAILED, error=error)
+            elif not job.committing:
+                # 没有进入结算（执行中被判超时或任务自行放弃）
+                self._finish(job, EXPIRED, error="任务已超时")
+            else:
+                self._finish(job, DONE, result=result)
+
+    def _expire_if_due(self, job: Job) -> None:
+        if not job.finished and not job.committing and time.monotonic() >= job.deadline:
+            self._finish(job, EXPIRED, error="任务已超时")
+
+    def _finish(self, job: Job, status: str, result: Dict[str, Any] = None, error: str = None) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.monotonic()
+        if self._active_by_player.get(job.player_id) is job:
+            del self._active_by_player[job.player_id]
+        self._finished_order.append(job)
+        self._stats[status] += 1
+        JOBS.inc(status=status)
+        job._finished.set()
+
+    def _sweep(self) -> None:
+        """清理超过保留时间的已结束任务"""
+        cutoff = time.monotonic() - self.result_ttl_seconds
+        while self._finished_order and self._finished_order[0].finished_at < cutoff:
+            self._jobs.pop(self._finished_order.popleft().id, None)
+
+    def _retry_after(self) -> int:
+        # 排在前面的任务大约需要多少秒才能腾出位置
+        waves = (self._queued + self._running) / max(1, self.max_workers)
+        return max(1, round(waves * self._avg_run_seconds))
@@ -0,0 +1,89 @@
+"""
+从模型输出中提取 JSON 对象
+单次线性扫描（用预编译正则在字符串与括号之间跳转），识别字符串、转义与括号嵌套，
+找到最外层的完整对象；
+会去掉 ```json 代码块标记，并容忍模型常见的小错误（数字前的 + 号、末尾多余的逗号）。
+json_validator 与 DeepSeekClient 共用这一实现
+"""
+import json
+import re
+from typing import Any, Dict, Optional
+
+FENCE = "```"
+
+
+def strip_code_fence(text: str) -> str:
+    """去掉包裹整段输出的 ```json 开头标记与位于结尾的 ```；
+    不在中间查找闭合标记，以免误截字符串中的反引号"""
+    start = len(text) - len(text.lstrip())
+    if not text.startswith(FENCE, start):
+        return text
+    body_start = text.find("\n", start)
+    if body_start == -1:
+        return text
+    body = text[body_start + 1:].rstrip()
+    return body[:-len(FENCE)] if body.endswith(FENCE) else body
+
+
+# 对象内部只关心字符串（整体跳过，包括其中的转义与括号）和花括号；
+# 末尾未闭合的字符串一直匹配到文本结束
+_INNER_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"?|[{}]', re.S)
+# 修正时字符串原样保留，只删除字符串之外的 "+数字" 的加号和闭合括号前多余的逗号
+_REPAIR_TOKEN = re.compile(r'("[^"\\]*(?:\\.[^"\\]*)*")|\+(?=\d)|,(?=\s*[}\]])', re.S)
+
+
+def find_object_spans(text: str):
+    """依次产出顶层 {...} 片段的 (起点, 终点)，字符串内的括号与转义不计入；
+    对象之外的文字（包括不成对的引号）直接跳过；某个 { 到结尾都没有闭合时，
+    从它的下一个字符继续寻找后面的对象"""
+    pos = 0
+    while True:
+        start = text.find("{", pos)
+        if start == -1:
+            return
+        depth = 0
+        for token in _INNER_TOKEN.finditer(text, start):
+            char = token.group()
+            if char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    yield start, token.end()
+                    pos = token.end()
+                    break
+        else:
+            # 这个 { 没有闭合（零散的括号或输出被截断），跳过它继续找
+            pos = start + 1
+
+
+def repair_json(candidate: str) -> str:
+    """修正字符串以外的 "+数字" 与 ",}" / ",]"，其余内容原样保留"""
+    return _REPAIR_TOKEN.sub(lambda m: m.group(1) or "", candidate)
+
+
+def _loads_object(candidate: str) -> Optional[Dict[str, Any]]:
+    try:
+        value = json.loads(candidate)
+    except ValueError:
+        try:
+            value = json.loads(repair_json(candidate))
+        except ValueError:
+            return None
+    return value if isinstance(value, dict) else None
+
+
+def extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """提取文本中第一个可解析的最外层 JSON 对象，找不到时返回 None"""
+    if not isinstance(text, str):
+        return None
+    body = strip_code_fence(text)
+    # 常见情况：整段就是一个对象
+    parsed = _loads_object(body) if body.lstrip().startswith("{") else None
+    if parsed is not None:
+        return parsed
+    for start, end in find_object_spans(body):
+        parsed = _loads_object(body[start:end])
+        if parsed is not None:
+            return parsed
+    return None
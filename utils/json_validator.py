@@ -1,29 +1,37 @@
-import json
-import re
 from typing import Union, Dict, Any
 
+from utils.json_extract import extract_json_object
+
+
+def _to_number(value: Any) -> Union[int, float]:
+    """把模型给出的数值字段转成数字：null、布尔与无法解析的值按 0 处理，"10" / "+10" 之类的字符串转为整数"""
+    if isinstance(value, bool) or value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return value if value == value else 0  # NaN 按 0 处理
+    if isinstance(value, str):
+        try:
+            return int(float(value.strip()))
+        except (ValueError, OverflowError):
+            return 0
+    return 0
+
 
 def validate_deepseek_result(result: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
     """
     处理和验证 DeepSeek 返回结果，确保其为完整的结构化 dict。
-    - 如果输入是字符串，会尝试解析 JSON 块；
+    - 如果输入是字符串，会提取其中最外层的 JSON 对象；
     - 补齐缺失字段；
-    - 对数值进行范围限制。
+    - 把数值字段转成数字（null 或无法解析时按 0）并限制范围。
     """
 
     # STEP 1: 处理字符串输入，尝试提取 JSON
     if isinstance(result, str):
-        try:
-            # 尝试提取 JSON 块
-            match = re.search(r'\{[\s\S]*?\}', result)
-            if match:
-                result = json.loads(match.group())
-            else:
-                raise ValueError("找不到 JSON 结构")
-        except Exception as e:
+        parsed = extract_json_object(result)
+        if parsed is None:
             return {
                 "成功": False,
-                "描述": f"系统输出格式错误：{str(e)}",
+                "描述": "系统输出格式错误：找不到 JSON 结构",
                 "建议": "请尝试重新提交或换个描述",
                 "状态变化": {
                     "hp": 0,
@@ -33,6 +41,7 @@ def validate_deepseek_result(result: Union[str, Dict[str, Any]]) -> Dict[str, An
                     "realm_change": None
                 }
             }
+        result = parsed
 
     # STEP 2: 补齐顶层字段
     required_fields = {
@@ -57,8 +66,8 @@ def validate_deepseek_result(result: Union[str, Dict[str, Any]]) -> Dict[str, An
     for field, default in status_defaults.items():
         result["状态变化"].setdefault(field, default)
 
-    # STEP 4: 限制数值范围（避免模型失控）
-    result["状态变化"]["hp"] = max(-100, min(100, result["状态变化"]["hp"]))
-    result["状态变化"]["spiritual_energy"] = max(-100, min(100, result["状态变化"]["spiritual_energy"]))
+    # STEP 4: 数值字段转成数字并限制范围（避免模型失控）
+    for field in ("hp", "spiritual_energy"):
+        result["状态变化"][field] = max(-100, min(100, _to_number(result["状态变化"][field])))
 
     return result
@@ -0,0 +1,209 @@
+"""
+轻量指标统计
+计数器、耗时直方图与读取时取值的仪表，以 Prometheus 文本格式输出，不依赖第三方库；
+关闭时各记录方法在第一行直接返回，计时上下文为共享的空对象，开销可以忽略。
+当前路由保存在 contextvar 中，模型调用的 token 用量据此按路由归类
+"""
+import bisect
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# 当前处理的路由，后台线程（预判、微批等）中为 background
+current_route = contextvars.ContextVar("current_route", default="background")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 处理阶段（缓存查找、规则判定、prompt 组装等）多在毫秒以内，补充亚毫秒分桶
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025) + DEFAULT_BUCKETS
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: "Histogram", labels: Dict[str, str]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+        return False
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, labels: Sequence[str]):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(self.label_names, key)} {value:g}" for key, value in items)
+        return lines
+
+
+class Gauge(_Metric):
+    """仪表：登记取值函数，输出时读取当前值"""
+
+    kind = "gauge"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._sources: Dict[Tuple, Callable[[], float]] = {}
+
+    def track(self, source: Callable[[], float], **labels) -> None:
+        """登记一组标签的取值函数，同一组标签后登记的覆盖先登记的"""
+        with self._lock:
+            self._sources[self._key(labels)] = source
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._sources.items())
+        lines.extend(f"{self.name}{_format_labels(self.label_names, key)} {source():g}" for key, source in items)
+        return lines
+
+
+class Histogram(_Metric):
+    """固定分桶的直方图"""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(*args)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [各桶计数..., +Inf 桶, 总和]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, **labels):
+        """计时上下文：with histogram.time(stage="xxx"): ..."""
+        if not self._registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _format_labels(self.label_names, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: List[_Metric] = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(self, name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(self, name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(self, name, help_text, labels, buckets=buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 进程内共用的注册表与指标，由 app 按配置开启
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter("xiuxian_http_requests_total", "HTTP 请求数", ["route", "method", "status"])
+REQUEST_SECONDS = registry.histogram("xiuxian_http_request_seconds", "HTTP 请求处理耗时（秒）", ["route"])
+STAGE_SECONDS = registry.histogram("xiuxian_stage_seconds", "单回合各处理阶段耗时（秒）", ["stage"],
+                                   buckets=STAGE_BUCKETS)
+LLM_CALLS = registry.counter("xiuxian_llm_calls_total", "模型调用次数", ["model", "route", "outcome"])
+LLM_RETRIES = registry.counter("xiuxian_llm_retries_total", "模型调用重试次数", ["model", "route"])
+LLM_BREAKER_STATE = registry.gauge("xiuxian_llm_breaker_state", "模型熔断器状态（0 关闭，1 半开，2 打开）", ["model"])
+LLM_SECONDS = registry.histogram("xiuxian_llm_call_seconds", "模型调用耗时（秒，含重试）", ["model", "route"])
+LLM_TOKENS = registry.counter("xiuxian_llm_tokens_total", "模型 token 用量",
+                              ["model", "route", "kind"])
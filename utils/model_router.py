@@ -0,0 +1,181 @@
+"""
+模型路由
+在 deepseek-chat 与 deepseek-reasoner 两个客户端前按请求选择模型：
+自由行动、涉及突破渡劫等高风险的行动交给推理模型，预设选项与事件生成、描述润色等交给对话模型；
+首选模型近期 p95 延迟超过预算或解析失败率过高、而另一个模型表现正常时改用另一个模型
+（两个模型都超标时保持首选，并保留少量试探请求以便恢复）；批量判定与事件生成同样经过这一选择。
+推理模型超过截止时间、不可用或输出无法解析时，同一请求改由对话模型重新判定。
+接口与 DeepSeekClient 一致，额外接受 complexity 参数（0~1，见 action_complexity）
+"""
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+from .errors import LLMUnavailableError
+from .metrics import registry
+from .realm import LEVELS_PER_REALM, parse_realm
+
+MODEL_ROUTES = registry.counter("xiuxian_model_routes_total", "模型路由决策（reason 为选择或降级原因）",
+                                ["model", "reason"])
+
+# 行动文字中表示高风险的关键词
+HIGH_STAKES_KEYWORDS = ("突破", "渡劫", "结丹", "结婴", "化神", "挑战", "决战", "生死", "禁地", "夺")
+
+
+def action_complexity(player: Dict[str, Any], action: str, context: Optional[str] = None) -> float:
+    """估算行动的判定难度（0~1）：自由行动高于预设选项，高风险行动与临近突破时更高"""
+    score = 0.2 if context else 0.5
+    if not context:
+        # 长段自由描述往往包含多个步骤
+        score += min(0.2, len(action) / 100)
+    if any(keyword in action for keyword in HIGH_STAKES_KEYWORDS):
+        score += 0.3
+    if parse_realm(player["realm"])[1] >= LEVELS_PER_REALM:
+        score += 0.2
+    if player["hp"] < 30:
+        score += 0.1
+    return min(1.0, score)
+
+
+class _ModelHealth:
+    """单个模型最近若干次调用的耗时与解析结果"""
+
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)
+        self.parse_failures = deque(maxlen=window)
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def failure_rate(self) -> float:
+        return sum(self.parse_failures) / len(self.parse_failures) if self.parse_failures else 0.0
+
+
+class ModelRouter:
+    """按行动复杂度与模型近期表现选择 chat / reasoner 客户端"""
+
+    def __init__(self, fast_client, strong_client, complexity_threshold: float = 0.6,
+                 latency_budget: float = 20.0, max_parse_failure_rate: float = 0.2,
+                 probe_rate: float = 0.05, window: int = 50, min_samples: int = 5,
+                 rng: random.Random = None):
+        self.fast = fast_client
+        self.strong = strong_client
+        self.complexity_threshold = complexity_threshold
+        self.latency_budget = latency_budget
+        self.max_parse_failure_rate = max_parse_failure_rate
+        self.probe_rate = probe_rate
+        self.min_samples = min_samples
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._health = {client.model: _ModelHealth(window) for client in (fast_client, strong_client)}
+        self._stats: Dict[str, int] = {}
+
+    def __getattr__(self, name):
+        # parse_content、is_degraded_response 等与模型无关的方法转发给对话模型客户端
+        return getattr(self.fast, name)
+
+    @property
+    def model(self) -> str:
+        return f"{self.fast.model}+{self.strong.model}"
+
+    def choose(self, complexity: Optional[float]):
+        """返回 (客户端, 原因)：按复杂度选出首选模型，
+        首选模型近期延迟或解析失败率超标、而另一个模型未超标时改用另一个模型"""
+        if complexity is None or complexity < self.complexity_threshold:
+            preferred, other, reason = self.fast, self.strong, "simple"
+        else:
+            preferred, other, reason = self.strong, self.fast, "complex"
+        with self._lock:
+            problem = self._problem(self._health[preferred.model])
+            other_problem = self._problem(self._health[other.model])
+        if problem is None or other_problem is not None or self.rng.random() < self.probe_rate:
+            return preferred, reason
+        return other, problem
+
+    def _problem(self, health: _ModelHealth) -> Optional[str]:
+        """样本足够且 p95 延迟或解析失败率超标时返回原因（调用方持锁）"""
+        if len(health.latencies) < self.min_samples:
+            return None
+        if health.p95() > self.latency_budget:
+            return "latency"
+        if health.failure_rate() > self.max_parse_failure_rate:
+            return "parse_failures"
+        return None
+
+    def call_api(self, prompt, use_json_format=False, complexity: float = None):
+        client, reason = self.choose(complexity)
+        self._record_route(client.model, reason)
+        if client is self.fast:
+            return self._timed_call(client, prompt, use_json_format)
+
+        try:
+            result = self._timed_call(client, prompt, use_json_format)
+        except LLMUnavailableError as e:
+            print(f"{client.model} 未能按时完成，改用 {self.fast.model}: {e}")
+            self._record_route(self.fast.model, "fallback_deadline")
+            return self._timed_call(self.fast, prompt, use_json_format)
+        if client.is_degraded_response(result):
+            self._record_route(self.fast.model, "fallback_parse")
+            return self._timed_call(self.fast, prompt, use_json_format)
+        return result
+
+    def stream_api(self, prompt, use_json_format=False, complexity: float = None):
+        """流式调用只在开始时选择模型，中途不切换"""
+        client, reason = self.choose(complexity)
+        self._record_route(client.model, reason)
+        return client.stream_api(prompt, use_json_format=use_json_format)
+
+    def _timed_call(self, client, prompt, use_json_format):
+        start = time.monotonic()
+        degraded = False
+        try:
+            result = client.call_api(prompt, use_json_format=use_json_format)
+            degraded = client.is_degraded_response(result)
+            return result
+        finally:
+            # 超时失败的调用同样计入延迟，才能反映截止时间前拿不到结果的情况
+            health = self._health[client.model]
+            with self._lock:
+                health.latencies.append(time.monotonic() - start)
+                health.parse_failures.append(degraded)
+
+    def _record_route(self, model: str, reason: str) -> None:
+        key = f"{model}:{reason}"
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + 1
+        MODEL_ROUTES.inc(model=model, reason=reason)
+
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """各模型 token 用量之和，models 中为分模型统计"""
+        per_model = {client.model: client.get_usage_stats() for client in (self.fast, self.strong)}
+        totals: Dict[str, Any] = {}
+        for stats in per_model.values():
+            for key, value in stats.items():
+                if key != "prompt_cache_hit_rate":
+                    totals[key] = totals.get(key, 0) + value
+        cached_total = totals.get("prompt_cache_hit_tokens", 0) + totals.get("prompt_cache_miss_tokens", 0)
+        totals["prompt_cache_hit_rate"] = (
+            round(totals["prompt_cache_hit_tokens"] / cached_total, 4) if cached_total else 0.0
+        )
+        totals["models"] = per_model
+        return totals
+
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        return {client.model: client.get_resilience_stats() for client in (self.fast, self.strong)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            health = {
+                model: {
+                    "samples": len(h.latencies),
+                    "p95_seconds": round(h.p95(), 3) if h.latencies else None,
+                    "parse_failure_rate": round(h.failure_rate(), 4),
+                }
+                for model, h in self._health.items()
+            }
+            return {"routes": dict(self._stats), "models": health}
@@ -0,0 +1,91 @@
+"""
+玩家状态日志
+玩家状态的每次变化记为一条类型化事件，按顺序追加到日志中；
+当前状态 = 最近快照 + 之后事件的重放，定期写入新快照以缩短重放长度
+"""
+import copy
+import time
+from typing import Dict, Any, List, Optional
+
+# 事件类型
+STATE_REPLACED = "state_replaced"          # 整体替换（创建、重置、恢复）
+HP_CHANGED = "hp_changed"
+ENERGY_CHANGED = "energy_changed"
+ITEMS_GAINED = "items_gained"
+SKILLS_GAINED = "skills_gained"
+REALM_CHANGED = "realm_changed"
+EVENT_PRESENTED = "event_presented"
+EVENT_CLEARED = "event_cleared"
+PAST_DEEDS_UPDATED = "past_deeds_updated"
+
+# 不属于日志状态的字段（历史记录单独存储）
+EXCLUDED_FIELDS = ("history",)
+
+
+def make_event(event_type: str, **data) -> Dict[str, Any]:
+    return {"type": event_type, "data": data, "timestamp": time.time()}
+
+
+def journal_state(player: Dict[str, Any]) -> Dict[str, Any]:
+    """去掉不入日志的字段"""
+    return {k: v for k, v in player.items() if k not in EXCLUDED_FIELDS}
+
+
+def apply_event(state: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    """把一条事件应用到状态上（原地修改并返回）"""
+    event_type, data = event["type"], event["data"]
+
+    if event_type == STATE_REPLACED:
+        history = state.get("history")
+        state.clear()
+        state.update(copy.deepcopy(data["state"]))
+        if history is not None:
+            state["history"] = history
+    elif event_type == HP_CHANGED:
+        state["hp"] = max(0, min(100, state["hp"] + data["delta"]))
+    elif event_type == ENERGY_CHANGED:
+        state["spiritual_energy"] = max(0, min(100, state["spiritual_energy"] + data["delta"]))
+    elif event_type == ITEMS_GAINED:
+        state["inventory"].extend(data["items"])
+    elif event_type == SKILLS_GAINED:
+        state["skills"].extend(data["skills"])
+    elif event_type == REALM_CHANGED:
+        state["realm"] = data["realm"]
+    elif event_type == EVENT_PRESENTED:
+        state["current_event"] = data["event"]
+    elif event_type == EVENT_CLEARED:
+        state["current_event"] = None
+    elif event_type == PAST_DEEDS_UPDATED:
+        state["past_deeds"] = data["digest"]
+    else:
+        raise ValueError(f"未知的日志事件类型: {event_type}")
+    return state
+
+
+def replay(state: Optional[Dict[str, Any]], events: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """从快照开始依次重放事件；没有快照且事件中也没有整体替换时返回 None"""
+    state = copy.deepcopy(state) if state is not None else None
+    for event in events:
+        if state is None:
+            if event["type"] != STATE_REPLACED:
+                continue
+            state = {}
+        apply_event(state, event)
+    return state
+
+
+def result_events(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """把一次判定结果的状态变化转换为日志事件"""
+    changes = result.get("状态变化") or {}
+    events = []
+    if changes.get("hp"):
+        events.append(make_event(HP_CHANGED, delta=changes["hp"]))
+    if changes.get("spiritual_energy"):
+        events.append(make_event(ENERGY_CHANGED, delta=changes["spiritual_energy"]))
+    if changes.get("new_items"):
+        events.append(make_event(ITEMS_GAINED, items=list(changes["new_items"])))
+    if changes.get("new_skills"):
+        events.append(make_event(SKILLS_GAINED, skills=list(changes["new_skills"])))
+    if changes.get("realm_change"):
+        events.append(make_event(REALM_CHANGED, realm=changes["realm_change"]))
+    return events
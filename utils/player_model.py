@@ -0,0 +1,129 @@
+"""
+紧凑的玩家模型
+__slots__ 对象，境界名称驻留并解析为大境界下标与层数（修改境界时重新解析），
+战力与状态档位每次读取时由字段直接计算；适合大量常驻内存的玩家。
+存储、接口与单回合的处理（prompt 构建、本地判定等）仍直接使用字典：
+为一次读取临时构造 Player 的开销远大于派生数值本身，这些地方使用下面的档位函数与 realm 模块
+"""
+import json
+import sys
+from typing import Dict, Any, Union
+
+from .realm import LEVELS_PER_REALM, REALM_ORDER, parse_realm, realm_base_power
+
+# 状态档位：0 最差，2 最好；各处文案按档位取词
+HP_TIER_LABELS = ("重伤", "轻伤", "健康")
+ENERGY_TIER_LABELS = ("枯竭", "不足", "充沛")
+
+ATTRIBUTE_NAMES = ("strength", "intelligence", "agility", "luck")
+_KNOWN_KEYS = frozenset(("name", "realm", "hp", "spiritual_energy", "artifacts", "skills",
+                         "fate", "side_effects", "attributes"))
+
+
+def hp_tier(hp: int) -> int:
+    return 0 if hp < 30 else 1 if hp < 70 else 2
+
+
+def energy_tier(energy: int) -> int:
+    return 0 if energy < 20 else 1 if energy < 50 else 2
+
+
+class Player:
+    """玩家状态；extra 保存历史记录、当前事件等其余字段，转换时原样带回"""
+
+    __slots__ = ("name", "realm", "realm_index", "sub_level", "hp", "spiritual_energy",
+                 "strength", "intelligence", "agility", "luck", "other_attributes",
+                 "artifacts", "skills", "fate", "side_effects", "extra")
+
+    def __setattr__(self, name, value):
+        if name == "realm":
+            value = sys.intern(value)
+            index, sub_level = parse_realm(value)
+            object.__setattr__(self, "realm_index", index)
+            object.__setattr__(self, "sub_level", sub_level)
+        object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Player":
+        player = cls.__new__(cls)
+        init = object.__setattr__
+        realm = sys.intern(data.get("realm", "炼气期一层"))
+        index, sub_level = parse_realm(realm)
+        attributes = data.get("attributes") or {}
+
+        init(player, "name", data.get("name", ""))
+        init(player, "realm", realm)
+        init(player, "realm_index", index)
+        init(player, "sub_level", sub_level)
+        init(player, "hp", data.get("hp", 100))
+        init(player, "spiritual_energy", data.get("spiritual_energy", 100))
+        init(player, "strength", attributes.get("strength", 0))
+        init(player, "intelligence", attributes.get("intelligence", 0))
+        init(player, "agility", attributes.get("agility", 0))
+        init(player, "luck", attributes.get("luck", 0))
+        init(player, "other_attributes", {k: v for k, v in attributes.items() if k not in ATTRIBUTE_NAMES} or None)
+        init(player, "artifacts", data.get("artifacts", []))
+        init(player, "skills", data.get("skills", []))
+        init(player, "fate", data.get("fate", "普通"))
+        init(player, "side_effects", data.get("side_effects", []))
+        init(player, "extra", {k: v for k, v in data.items() if k not in _KNOWN_KEYS})
+        return player
+
+    def to_dict(self) -> Dict[str, Any]:
+        attributes = {"strength": self.strength, "intelligence": self.intelligence,
+                      "agility": self.agility, "luck": self.luck}
+        if self.other_attributes:
+            attributes.update(self.other_attributes)
+        data = {
+            "name": self.name,
+            "realm": self.realm,
+            "hp": self.hp,
+            "spiritual_energy": self.spiritual_energy,
+            "artifacts": self.artifacts,
+            "skills": self.skills,
+            "fate": self.fate,
+            "side_effects": self.side_effects,
+            "attributes": attributes,
+        }
+        data.update(self.extra)
+        return data
+
+    @classmethod
+    def from_json(cls, text: Union[str, bytes]) -> "Player":
+        return cls.from_dict(json.loads(text))
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    @property
+    def realm_level(self) -> int:
+        """境界等级数值（炼气期一层为 1）"""
+        return self.realm_index * LEVELS_PER_REALM + self.sub_level
+
+    @property
+    def major_realm(self) -> str:
+        return REALM_ORDER[self.realm_index]
+
+    @property
+    def combat_power(self) -> int:
+        power = realm_base_power(self.realm_index) + self.strength + self.intelligence + self.agility + self.luck
+        if self.other_attributes:
+            power += sum(self.other_attributes.values())
+        return power
+
+    @property
+    def hp_tier(self) -> int:
+        return hp_tier(self.hp)
+
+    @property
+    def energy_tier(self) -> int:
+        return energy_tier(self.spiritual_energy)
+
+    @property
+    def hp_label(self) -> str:
+        return HP_TIER_LABELS[self.hp_tier]
+
+    @property
+    def energy_label(self) -> str:
+        return ENERGY_TIER_LABELS[self.energy_tier]
+
@@ -0,0 +1,489 @@
+"""
+玩家数据仓库
+按会话/账号区分玩家，默认使用 SQLite（WAL 模式）存储，
+玩家状态与历史记录分表保存，读写均为按主键的行级操作；
+历史记录只保存紧凑记录，描述文字存放在单独的表/文件中按需读取；
+SQLite 后端的玩家状态以事件日志 + 定期快照的方式保存，每回合只追加少量事件
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Callable
+
+from .history import split_legacy_entry
+from .atomic_writer import GroupCommitWriter, DURABILITY_MODES
+from .player_journal import STATE_REPLACED, make_event, journal_state, replay
+
+
+class PlayerRepository:
+    """玩家仓库接口"""
+
+    def load(self, player_id: str) -> Optional[Dict[str, Any]]:
+        """读取玩家状态（不含历史记录），不存在时返回 None"""
+        raise NotImplementedError
+
+    def save(self, player_id: str, player: Dict[str, Any]) -> None:
+        """整体保存玩家状态（历史记录单独存储，会被忽略）"""
+        raise NotImplementedError
+
+    def append_events(self, player_id: str, events: List[Dict[str, Any]],
+                      state: Optional[Dict[str, Any]] = None) -> None:
+        """追加状态变化事件；state 为调用方应用事件后的状态，仅在尚无存档时作为初始状态。
+        不支持日志的后端直接重放后整体保存"""
+        if not events:
+            return
+        current = self.load(player_id)
+        if current is None:
+            current = state
+        else:
+            current = replay(current, events)
+        self.save(player_id, current)
+
+    def append_turn(self, player_id: str, entry: Dict[str, Any], max_length: int,
+                    narration: Optional[Dict[str, Any]], events: List[Dict[str, Any]],
+                    fold_evicted: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """一个回合的历史记录与状态事件一并写入；fold_evicted 把被挤出的历史记录转为追加的事件。
+        返回实际追加的全部事件。默认实现分两步写入，各后端应覆盖为一次提交"""
+        evicted = self.append_history(player_id, entry, max_length, narration)
+        events = events + (fold_evicted(evicted) if evicted else [])
+        self.append_events(player_id, events)
+        return events
+
+    def get_journal(self, player_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """按时间顺序返回最近 limit 条状态事件（不支持日志的后端返回空列表）"""
+        return []
+
+    def load_at(self, player_id: str, seq: int) -> Optional[Dict[str, Any]]:
+        """还原到第 seq 条事件之后的状态，无法还原时返回 None"""
+        return None
+
+    def append_history(self, player_id: str, entry: Dict[str, Any], max_length: int,
+                       narration: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """追加一条紧凑历史记录（描述文字单独保存），只保留最近 max_length 条，
+        返回被挤出的旧记录（供汇总为过往事迹）"""
+        raise NotImplementedError
+
+    def get_narration(self, player_id: str, entry_id: str) -> Optional[Dict[str, Any]]:
+        """读取某条历史记录的描述文字"""
+        raise NotImplementedError
+
+    def get_history(self, player_id: str, limit: int) -> List[Dict[str, Any]]:
+        """按时间顺序返回最近 limit 条历史记录"""
+        raise NotImplementedError
+
+    def clear_history(self, player_id: str) -> None:
+        """清空玩家历史记录"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _strip_history(player: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in player.items() if k != "history"}
+
+
+class SQLitePlayerRepository(PlayerRepository):
+    """SQLite 玩家仓库（每线程一个连接，WAL 模式支持并发读写）"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS player_events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        player_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        data TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_player_events_player
+        ON player_events (player_id, seq);
+    CREATE TABLE IF NOT EXISTS player_snapshots (
+        player_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        state TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (player_id, seq)
+    );
+    CREATE TABLE IF NOT EXISTS history_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        player_id TEXT NOT NULL,
+        entry_id TEXT NOT NULL,
+        record TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_history_entries_player
+        ON history_entries (player_id, id);
+    CREATE TABLE IF NOT EXISTS narrations (
+        entry_id TEXT PRIMARY KEY,
+        player_id TEXT NOT NULL,
+        narration TEXT NOT NULL
+    );
+    """
+
+    # 持久化模式对应的 synchronous 级别（WAL 下 NORMAL 只在检查点时 fsync）
+    SYNCHRONOUS = {"always": "FULL", "interval": "NORMAL", "never": "OFF"}
+
+    def __init__(self, db_path: str = "data/players.db", busy_timeout_ms: int = 5000,
+                 snapshot_interval: int = 50, durability: str = "interval", keep_snapshots: int = 2):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"未知的持久化模式: {durability}")
+        self.db_path = db_path
+        self.synchronous = self.SYNCHRONOUS[durability]
+        self.busy_timeout_ms = busy_timeout_ms
+        self.snapshot_interval = snapshot_interval
+        # 每位玩家保留的快照数（0 不清理）；更早的快照与其之前的事件在写新快照时删除，
+        # 可还原的范围因此约为最近 keep_snapshots 个快照间隔
+        self.keep_snapshots = keep_snapshots
+        self._local = threading.local()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _insert_entry(conn: sqlite3.Connection, player_id: str,
+                      record: Dict[str, Any], narration: Optional[Dict[str, Any]]):
+        conn.execute(
+            "INSERT INTO history_entries (player_id, entry_id, record) VALUES (?, ?, ?)",
+            (player_id, record["id"], json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        )
+        if narration:
+            conn.execute(
+                "INSERT OR REPLACE INTO narrations (entry_id, player_id, narration) VALUES (?, ?, ?)",
+                (record["id"], player_id, json.dumps(narration, ensure_ascii=False, separators=(",", ":")))
+            )
+
+    def load(self, player_id: str) -> Optional[Dict[str, Any]]:
+        return self._materialize(player_id)
+
+    def load_at(self, player_id: str, seq: int) -> Optional[Dict[str, Any]]:
+        return self._materialize(player_id, seq)
+
+    def _materialize(self, player_id: str, until_seq: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """最近快照 + 之后的事件重放"""
+        conn = self._connect()
+        limit = until_seq if until_seq is not None else -1
+        snapshot = conn.execute(
+            "SELECT seq, state FROM player_snapshots WHERE player_id = ? "
+            "AND (? < 0 OR seq <= ?) ORDER BY seq DESC LIMIT 1",
+            (player_id, limit, limit)
+        ).fetchone()
+        snapshot_seq, state = (snapshot[0], json.loads(snapshot[1])) if snapshot else (0, None)
+        rows = conn.execute(
+            "SELECT type, data FROM player_events WHERE player_id = ? AND seq > ? "
+            "AND (? < 0 OR seq <= ?) ORDER BY seq",
+            (player_id, snapshot_seq, limit, limit)
+        ).fetchall()
+        return replay(state, [{"type": t, "data": json.loads(d)} for t, d in rows])
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def save(self, player_id: str, player: Dict[str, Any]) -> None:
+        # 整体替换记为一条事件，并立即写快照，之后的加载无需重放更早的事件
+        with self._transaction() as conn:
+            self._insert_events(conn, player_id, [make_event(STATE_REPLACED, state=journal_state(player))],
+                                force_snapshot=True)
+
+    def append_events(self, player_id: str, events: List[Dict[str, Any]],
+                      state: Optional[Dict[str, Any]] = None) -> None:
+        if events:
+            with self._transaction() as conn:
+                self._insert_events(conn, player_id, events)
+
+    def append_turn(self, player_id: str, entry: Dict[str, Any], max_length: int,
+                    narration: Optional[Dict[str, Any]], events: List[Dict[str, Any]],
+                    fold_evicted: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        with self._transaction() as conn:
+            evicted = self._insert_history(conn, player_id, entry, max_length, narration)
+            events = events + (fold_evicted(evicted) if evicted else [])
+            if events:
+                self._insert_events(conn, player_id, events)
+        return events
+
+    def _insert_events(self, conn: sqlite3.Connection, player_id: str, events: List[Dict[str, Any]],
+                       force_snapshot: bool = False) -> None:
+        """在当前事务中追加事件；需要快照时按日志重放出的状态写入，而不是调用方手中可能过期的副本"""
+        seq = None
+        for event in events:
+            seq = conn.execute(
+                "INSERT INTO player_events (player_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+                (player_id, event["type"],
+                 json.dumps(event["data"], ensure_ascii=False, separators=(",", ":")),
+                 event.get("timestamp", time.time()))
+            ).lastrowid
+        if force_snapshot or self._snapshot_due(conn, player_id):
+            # 同一连接、同一事务内读取，包含刚写入的事件与其他请求已提交的事件
+            state = self._materialize(player_id)
+            if state is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO player_snapshots (player_id, seq, state, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (player_id, seq, json.dumps(state, ensure_ascii=False, separators=(",", ":")), time.time())
+                )
+                self._prune_journal(conn, player_id)
+
+    def _prune_journal(self, conn: sqlite3.Connection, player_id: str) -> None:
+        """删除保留的最早快照之前的快照与事件（与写快照在同一事务中）"""
+        if self.keep_snapshots <= 0:
+            return
+        oldest_kept = conn.execute(
+            "SELECT seq FROM player_snapshots WHERE player_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?",
+            (player_id, self.keep_snapshots - 1)
+        ).fetchone()
+        if oldest_kept is None:
+            return
+        conn.execute("DELETE FROM player_snapshots WHERE player_id = ? AND seq < ?", (player_id, oldest_kept[0]))
+        conn.execute("DELETE FROM player_events WHERE player_id = ? AND seq <= ?", (player_id, oldest_kept[0]))
+
+    def _snapshot_due(self, conn: sqlite3.Connection, player_id: str) -> bool:
+        """距上次快照的事件数达到间隔时写新快照"""
+        pending = conn.execute(
+            "SELECT COUNT(*) FROM player_events WHERE player_id = ? AND seq > "
+            "COALESCE((SELECT MAX(seq) FROM player_snapshots WHERE player_id = ?), 0)",
+            (player_id, player_id)
+        ).fetchone()[0]
+        return pending >= self.snapshot_interval
+
+    def get_journal(self, player_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT seq, type, data, created_at FROM player_events "
+            "WHERE player_id = ? ORDER BY seq DESC LIMIT ?",
+            (player_id, limit)
+        ).fetchall()
+        return [
+            {"seq": seq, "type": event_type, "data": json.loads(data), "timestamp": created_at}
+            for seq, event_type, data, created_at in reversed(rows)
+        ]
+
+    def append_history(self, player_id: str, entry: Dict[str, Any], max_length: int,
+                       narration: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        with self._transaction() as conn:
+            return self._insert_history(conn, player_id, entry, max_length, narration)
+
+    def _insert_history(self, conn: sqlite3.Connection, player_id: str, entry: Dict[str, Any],
+                        max_length: int, narration: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self._insert_entry(conn, player_id, entry, narration)
+        # 只保留最近 max_length 条，被挤出的记录连同描述一并删除
+        evicted = conn.execute(
+            "SELECT id, entry_id, record FROM history_entries WHERE player_id = ? "
+            "ORDER BY id DESC LIMIT -1 OFFSET ?",
+            (player_id, max_length)
+        ).fetchall()
+        if evicted:
+            conn.execute(
+                "DELETE FROM history_entries WHERE player_id = ? AND id <= ?",
+                (player_id, evicted[0][0])
+            )
+            conn.executemany(
+                "DELETE FROM narrations WHERE entry_id = ?",
+                [(entry_id,) for _, entry_id, _ in evicted]
+            )
+        return [json.loads(record) for _, _, record in reversed(evicted)]
+
+    def get_history(self, player_id: str, limit: int) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT record FROM history_entries WHERE player_id = ? ORDER BY id DESC LIMIT ?",
+            (player_id, limit)
+        ).fetchall()
+        return [json.loads(record) for record, in reversed(rows)]
+
+    def get_narration(self, player_id: str, entry_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT narration FROM narrations WHERE entry_id = ? AND player_id = ?",
+            (entry_id, player_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def clear_history(self, player_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM history_entries WHERE player_id = ?", (player_id,))
+            conn.execute("DELETE FROM narrations WHERE player_id = ?", (player_id,))
+
+
+class JsonFilePlayerRepository(PlayerRepository):
+    """JSON 文件玩家仓库（每个玩家一个文件，描述文字另存一个文件，便于调试查看）
+    文件经分组提交写入器原子替换，持锁期间只提交，落盘等待在锁外进行，
+    并发的保存因此能合并到同一次提交"""
+
+    def __init__(self, directory: str = "data/players", writer: Optional[GroupCommitWriter] = None):
+        self.directory = directory
+        self.writer = writer or GroupCommitWriter()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, player_id: str, suffix: str = "") -> str:
+        safe_id = "".join(c for c in player_id if c.isalnum() or c in "-_")
+        return os.path.join(self.directory, f"{safe_id}{suffix}.json")
+
+    def _read(self, player_id: str, suffix: str = "") -> Optional[Dict[str, Any]]:
+        path = self._path(player_id, suffix)
+        pending = self.writer.pending(path)
+        if pending is not None:
+            return pending
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, player_id: str, document: Dict[str, Any], suffix: str = "") -> Future:
+        return self.writer.submit(self._path(player_id, suffix), document)
+
+    @staticmethod
+    def _wait(futures: List[Future]) -> None:
+        for future in futures:
+            future.result()
+
+    def load(self, player_id: str) -> Optional[Dict[str, Any]]:
+        document = self._read(player_id)
+        return self._strip_history(document) if document is not None else None
+
+    def save(self, player_id: str, player: Dict[str, Any]) -> None:
+        with self._lock:
+            document = self._read(player_id) or {}
+            history = document.get("history", [])
+            document = self._strip_history(player)
+            document["history"] = history
+            future = self._write(player_id, document)
+        future.result()
+
+    def append_events(self, player_id: str, events: List[Dict[str, Any]],
+                      state: Optional[Dict[str, Any]] = None) -> None:
+        # 读取、重放与写回都在锁内完成，避免与同一玩家的 append_turn / save 交错而丢失更新
+        if not events:
+            return
+        with self._lock:
+            document = self._read(player_id)
+            if document is None:
+                if state is None:
+                    return
+                document = self._strip_history(state)
+                document["history"] = []
+            else:
+                history = document.get("history", [])
+                document = replay(self._strip_history(document), events)
+                document["history"] = history
+            future = self._write(player_id, document)
+        future.result()
+
+    def append_history(self, player_id: str, entry: Dict[str, Any], max_length: int,
+                       narration: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        futures = []
+        with self._lock:
+            document = self._read(player_id) or {}
+            evicted = self._push_history(player_id, document, entry, max_length, narration, futures)
+            futures.append(self._write(player_id, document))
+        self._wait(futures)
+        return evicted
+
+    def append_turn(self, player_id: str, entry: Dict[str, Any], max_length: int,
+                    narration: Optional[Dict[str, Any]], events: List[Dict[str, Any]],
+                    fold_evicted: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # 状态与历史记录在同一个文件中，一次原子替换即写入整个回合
+        futures = []
+        with self._lock:
+            document = self._read(player_id) or {}
+            evicted = self._push_history(player_id, document, entry, max_length, narration, futures)
+            events = events + (fold_evicted(evicted) if evicted else [])
+            state = replay(self._strip_history(document) or None, events)
+            if state is not None:
+                state["history"] = document["history"]
+                document = state
+            futures.append(self._write(player_id, document))
+        self._wait(futures)
+        return events
+
+    def _push_history(self, player_id: str, document: Dict[str, Any], entry: Dict[str, Any], max_length: int,
+                      narration: Optional[Dict[str, Any]], futures: List[Future]) -> List[Dict[str, Any]]:
+        """把记录加入文档中的历史记录并写入描述文件，返回被挤出的旧记录（文档由调用方写回）"""
+        history = document.get("history", [])
+        history.append(entry)
+        evicted = history[:-max_length] if len(history) > max_length else []
+        document["history"] = history[-max_length:]
+
+        narrations = self._read(player_id, ".narrations") or {}
+        if narration:
+            narrations[entry["id"]] = narration
+        for record in evicted:
+            narrations.pop(record.get("id"), None)
+        futures.append(self._write(player_id, narrations, ".narrations"))
+        return evicted
+
+    def get_history(self, player_id: str, limit: int) -> List[Dict[str, Any]]:
+        document = self._read(player_id) or {}
+        return document.get("history", [])[-limit:]
+
+    def get_narration(self, player_id: str, entry_id: str) -> Optional[Dict[str, Any]]:
+        narrations = self._read(player_id, ".narrations") or {}
+        return narrations.get(entry_id)
+
+    def clear_history(self, player_id: str) -> None:
+        futures = []
+        with self._lock:
+            document = self._read(player_id)
+            if document is not None:
+                document["history"] = []
+                futures.append(self._write(player_id, document))
+            futures.append(self._write(player_id, {}, ".narrations"))
+        self._wait(futures)
+
+
+def import_legacy_save(repo: PlayerRepository, player_id: str, path: str,
+                       max_length: int) -> Optional[Dict[str, Any]]:
+    """
+    把单人版本的存档（data/player.json）导入为该玩家的存档，返回导入后的状态，没有旧存档时返回 None。
+    只导入一次：先改名占用（并发的新会话只有一个能拿到），导入完成后改名为 .imported
+    """
+    claimed = path + ".importing"
+    try:
+        os.replace(path, claimed)
+    except FileNotFoundError:
+        return None
+    try:
+        with open(claimed, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+        repo.save(player_id, legacy)
+        for entry in legacy.get("history", [])[-max_length:]:
+            record, narration = split_legacy_entry(entry)
+            repo.append_history(player_id, record, max_length, narration)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"导入旧存档失败 {path}: {e}")
+        os.replace(claimed, path)
+        return None
+    os.replace(claimed, path + ".imported")
+    print(f"已将旧存档 {path} 导入为玩家 {player_id}")
+    return repo.load(player_id)
+
+
+def create_player_repository(backend: str = "sqlite", path: Optional[str] = None,
+                             snapshot_interval: int = 50, durability: str = "interval",
+                             writer: Optional[GroupCommitWriter] = None, keep_snapshots: int = 2) -> PlayerRepository:
+    """按配置创建玩家仓库"""
+    if backend == "sqlite":
+        return SQLitePlayerRepository(path or "data/players.db", snapshot_interval=snapshot_interval,
+                                      durability=durability, keep_snapshots=keep_snapshots)
+    if backend == "json":
+        return JsonFilePlayerRepository(path or "data/players", writer or GroupCommitWriter(durability))
+    raise ValueError(f"未知的玩家存储后端: {backend}")
@@ -0,0 +1,95 @@
+"""
+按 token 预算组装 prompt
+每个段落给出从完整到精简的若干版本（None 表示整段省略），超出预算时
+按优先级逐段降级：副作用示例 → 境界列表 → 判定规则，必需段落不动。
+段落版本只有有限几种组合，每种组合渲染出的前缀字节固定，仍能命中服务端前缀缓存
+"""
+import re
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from .metrics import registry
+
+# DeepSeek 文档给出的经验值：一个汉字约 0.6 token，一个英文字符约 0.3 token
+_CJK = re.compile(r"[　-〿一-鿿＀-￯]")
+
+PROMPT_TOKENS = registry.counter("xiuxian_prompt_tokens_total", "prompt 估算 token 数（sent 为实际发送，saved 为预算裁剪掉的部分）",
+                                 ["kind", "measure"])
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数，只用于预算比较，不求精确"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return round(cjk * 0.6 + (len(text) - cjk) * 0.3)
+
+
+class PromptSection:
+    """prompt 段落：variants 从完整到精简排列；priority 越小越先降级，None 为必需段落"""
+
+    __slots__ = ("name", "variants", "priority", "tokens")
+
+    def __init__(self, name: str, variants: Sequence[Optional[str]], priority: Optional[int] = None):
+        self.name = name
+        self.variants = tuple(variants)
+        self.priority = priority
+        self.tokens = tuple(estimate_tokens(v) for v in self.variants)
+
+
+def fit_sections(sections: Sequence[PromptSection], budget: int) -> Tuple[Tuple[int, ...], int, int]:
+    """
+    选出满足预算的段落版本，返回 (各段版本下标, 完整 token 数, 选中后 token 数)
+    budget <= 0 表示不限；全部降级后仍超出时返回降到最低的组合
+    """
+    choice = [0] * len(sections)
+    full = sum(section.tokens[0] for section in sections)
+    total = full
+    if budget <= 0 or total <= budget:
+        return tuple(choice), full, total
+
+    reducible = sorted((i for i, s in enumerate(sections) if s.priority is not None),
+                       key=lambda i: sections[i].priority)
+    for index in reducible:
+        section = sections[index]
+        for level in range(1, len(section.variants)):
+            total += section.tokens[level] - section.tokens[choice[index]]
+            choice[index] = level
+            if total <= budget:
+                return tuple(choice), full, total
+    return tuple(choice), full, total
+
+
+def render_sections(sections: Sequence[PromptSection], choice: Sequence[int]) -> List[str]:
+    """按选中的版本取出段落文本，省略的段落不出现"""
+    return [text for text in (section.variants[level] for section, level in zip(sections, choice))
+            if text is not None]
+
+
+class PromptBudgetReport:
+    """按 prompt 类型累计完整与实际发送的 token 数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, kind: str, full_tokens: int, sent_tokens: int, budget: int) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(kind, {"prompts": 0, "full_tokens": 0, "sent_tokens": 0,
+                                                  "trimmed": 0, "over_budget": 0})
+            stats["prompts"] += 1
+            stats["full_tokens"] += full_tokens
+            stats["sent_tokens"] += sent_tokens
+            stats["trimmed"] += 1 if sent_tokens < full_tokens else 0
+            stats["over_budget"] += 1 if 0 < budget < sent_tokens else 0
+        PROMPT_TOKENS.inc(sent_tokens, kind=kind, measure="sent")
+        PROMPT_TOKENS.inc(full_tokens - sent_tokens, kind=kind, measure="saved")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            report = {kind: dict(stats) for kind, stats in self._stats.items()}
+        for stats in report.values():
+            saved = stats["full_tokens"] - stats["sent_tokens"]
+            stats["saved_tokens"] = saved
+            stats["saved_pct"] = round(saved * 100 / stats["full_tokens"], 1) if stats["full_tokens"] else 0.0
+        return report
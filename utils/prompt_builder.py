@@ -1,110 +1,157 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from .world_loader import WorldSettingsLoader
+from .world_snapshot import WorldSnapshot
+from .realm import calculate_combat_power, combat_power_label
+from .player_model import HP_TIER_LABELS, ENERGY_TIER_LABELS, hp_tier, energy_tier
+from .history import digest_summary, recent_summary
+from .prompt_budget import PromptSection, PromptBudgetReport, estimate_tokens, fit_sections, render_sections
+
+OUTPUT_FORMAT = """【输出格式】
+你是游戏裁判，必须严格返回以下JSON格式：
+{
+    "成功": true或false,
+    "描述": "详细描述发生了什么（100-200字，要有画面感）",
+    "建议": "给玩家的下一步建议",
+    "状态变化": {
+        "hp": 数值变化（-100到+100）,
+        "spiritual_energy": 数值变化（-100到+100）,
+        "new_items": ["获得的物品列表"],
+        "new_skills": ["学会的技能列表"],
+        "realm_change": "新的境界（如有突破）"
+    }
+}
+"""
 
 
 class EnhancedPromptBuilder:
     """增强版Prompt构建器"""
 
-    def __init__(self, world_loader: WorldSettingsLoader = None):
+    def __init__(self, world_loader: WorldSettingsLoader = None, budgets: Dict[str, int] = None,
+                 budget_report: PromptBudgetReport = None):
         self.world_loader = world_loader or WorldSettingsLoader()
+        # 各类 prompt（judge / narration）的 token 预算，0 或缺省表示不限
+        self.budgets = budgets or {}
+        self.budget_report = budget_report
+        # (设定版本, 前缀段落, 已渲染的前缀版本)
+        self._prefix_state = None
 
     def generate_prompt(self, player: Dict[str, Any],
                         user_input: str,
                         context: Optional[str] = None) -> str:
         """生成完整的prompt"""
 
-        # 1. 从文件加载世界设定
-        world_desc = self.world_loader.get_world_description()
-        cultivation_system = self.world_loader.get_cultivation_system()
-        side_effect_system = self.world_loader.get_side_effect_system()
-        judgment_rules = self.world_loader.get_judgment_rules()
-
-        # 2. 构建玩家状态
-        player_status = self._build_player_status(player)
-
-        # 3. 组装完整prompt
-        prompt = f"""
-{world_desc}
+        # 1. 动态部分（玩家状态与行动）放在最后
+        situation = self.build_situation(player, user_input, context)
+        tail = f"""
+=== 当前状况 ===
+{situation}
+请你作为游戏裁判，判断这个行动的结果，严格按照【输出格式】返回JSON，不要有任何额外说明。
+"""
 
-{cultivation_system}
+        # 2. 静态前缀（世界设定、规则、输出格式）按预算选版本，同一版本字节稳定以命中服务端前缀缓存
+        return self._fit_prefix("judge", tail) + tail
 
-{side_effect_system}
+    def build_situation(self, player: Dict[str, Any],
+                        user_input: str,
+                        context: Optional[str] = None) -> str:
+        """构建单个玩家的当前状况与行动（prompt 的动态部分）"""
+        player_status = self._build_player_status(player)
 
-=== 当前状况 ===
-{player_status}
+        return f"""{player_status}{self._build_experience(player)}
 
 当前情境：{context if context else '主角正在修炼中'}
 
 玩家行动：{user_input}
+"""
 
-{judgment_rules}
-
-请你作为游戏裁判，判断这个行动的结果。必须严格返回以下JSON格式：
-{{
-    "成功": true或false,
-    "描述": "详细描述发生了什么（100-200字，要有画面感）",
-    "建议": "给玩家的下一步建议",
-    "状态变化": {{
-        "hp": 数值变化（-100到+100）,
-        "spiritual_energy": 数值变化（-100到+100）,
-        "new_items": ["获得的物品列表"],
-        "new_skills": ["学会的技能列表"],
-        "realm_change": "新的境界（如有突破）"
-    }}
-}}
+    def build_narration_prompt(self, player: Dict[str, Any], user_input: str,
+                               outcome: Dict[str, Any], context: Optional[str] = None) -> str:
+        """结果已由本地规则判定，只请模型撰写描述"""
+        situation = self.build_situation(player, user_input, context)
+        changes = outcome["状态变化"]
 
-重要：请直接返回JSON，不要有任何额外说明。
+        tail = f"""
+=== 当前状况 ===
+{situation}
+该行动已判定为：{'成功' if outcome['成功'] else '失败'}，生命值变化 {changes['hp']:+d}，灵气值变化 {changes['spiritual_energy']:+d}{f"，境界提升至{changes['realm_change']}" if changes.get('realm_change') else ''}。
+请不要改变判定结果，只为其撰写"描述"，按【输出格式】返回JSON，不要有任何额外说明。
 """
-        return prompt
+        return self._fit_prefix("narration", tail) + tail
+
+    def get_static_prefix(self, choice: Optional[Tuple[int, ...]] = None) -> str:
+        """获取静态前缀（默认完整版本），每种段落组合只渲染一次，世界设定文件变化时重建"""
+        _, sections, rendered = self._get_prefix_state()
+        if choice is None:
+            choice = (0,) * len(sections)
+        prefix = rendered.get(choice)
+        if prefix is None:
+            prefix = rendered[choice] = "\n" + "\n\n".join(render_sections(sections, choice))
+        return prefix
+
+    def _fit_prefix(self, kind: str, dynamic: str) -> str:
+        """按预算扣除动态部分后选择前缀版本，并记录节省的 token"""
+        _, sections, _ = self._get_prefix_state()
+        budget = self.budgets.get(kind, 0)
+        dynamic_tokens = estimate_tokens(dynamic)
+        choice, full, fitted = fit_sections(sections, max(budget - dynamic_tokens, 1) if budget > 0 else 0)
+        if self.budget_report is not None:
+            self.budget_report.record(kind, full + dynamic_tokens, fitted + dynamic_tokens, budget)
+        return self.get_static_prefix(choice)
+
+    def _get_prefix_state(self):
+        snapshot = self.world_loader.snapshot
+        state = self._prefix_state
+        if state is None or state[0] != snapshot.version:
+            state = self._prefix_state = (snapshot.version, self._build_prefix_sections(snapshot), {})
+        return state
+
+    @staticmethod
+    def _build_prefix_sections(snapshot: WorldSnapshot):
+        """静态前缀的各段落（取自快照中预渲染的设定）；降级顺序：副作用示例 → 境界列表 → 判定规则"""
+        sections = snapshot.sections
+        return [
+            PromptSection("world", [sections["world"][0]]),
+            PromptSection("cultivation", [*sections["cultivation"], None], priority=1),
+            PromptSection("side_effect", [*sections["side_effect"], None], priority=0),
+            PromptSection("rules", sections["rules"], priority=2),
+            PromptSection("output_format", [OUTPUT_FORMAT]),
+        ]
 
     def _build_player_status(self, player: Dict[str, Any]) -> str:
         """构建玩家状态描述"""
-        fate_effect = self.world_loader.get_fate_effect(player.get('fate', '普通'))
+        fate = player.get('fate', '普通')
+        fate_effect = self.world_loader.get_fate_effect(fate)
+        attributes = player['attributes']
 
         # 计算综合战力评估
-        combat_power = self._calculate_combat_power(player)
+        combat_power = combat_power_label(calculate_combat_power(player))
 
         return f"""
 【主角状态】
 姓名：{player['name']}
 境界：{player['realm']}（战力评估：{combat_power}）
-生命值：{player['hp']}/100 {'[重伤]' if player['hp'] < 30 else '[轻伤]' if player['hp'] < 70 else '[健康]'}
-灵气值：{player['spiritual_energy']}/100 {'[枯竭]' if player['spiritual_energy'] < 20 else '[不足]' if player['spiritual_energy'] < 50 else '[充沛]'}
+生命值：{player['hp']}/100 [{HP_TIER_LABELS[hp_tier(player['hp'])]}]
+灵气值：{player['spiritual_energy']}/100 [{ENERGY_TIER_LABELS[energy_tier(player['spiritual_energy'])]}]
 
 法宝装备：{', '.join(player['artifacts']) if player['artifacts'] else '无'}
 掌握技能：{', '.join(player['skills']) if player['skills'] else '基础功法'}
-特殊命格：{player['fate']}（{fate_effect}）
+特殊命格：{fate}（{fate_effect}）
 副作用状态：{', '.join(player['side_effects']) if player['side_effects'] else '无'}
 
 属性面板：
-- 力量：{player['attributes']['strength']}
-- 智慧：{player['attributes']['intelligence']}
-- 敏捷：{player['attributes']['agility']}
-- 幸运：{player['attributes']['luck']}
+- 力量：{attributes.get('strength', 0)}
+- 智慧：{attributes.get('intelligence', 0)}
+- 敏捷：{attributes.get('agility', 0)}
+- 幸运：{attributes.get('luck', 0)}
 """
 
-    def _calculate_combat_power(self, player: Dict[str, Any]) -> str:
-        """计算战力评估"""
-        # 简化的战力计算
-        realm_power = {
-            "炼气期": 10, "筑基期": 50, "金丹期": 200,
-            "元婴期": 500, "化神期": 1000
-        }
-
-        base_power = 10  # 默认炼气期
-        for realm, power in realm_power.items():
-            if realm in player['realm']:
-                base_power = power
-                break
-
-        # 加上属性加成
-        total_power = base_power + sum(player['attributes'].values())
-
-        if total_power < 50:
-            return f"{total_power} - 弱小"
-        elif total_power < 200:
-            return f"{total_power} - 普通"
-        elif total_power < 500:
-            return f"{total_power} - 较强"
-        else:
-            return f"{total_power} - 强大"
\ No newline at end of file
+    def _build_experience(self, player: Dict[str, Any]) -> str:
+        """近期经历与过往事迹摘要（只用紧凑记录，不带描述原文）"""
+        lines = []
+        past_deeds = digest_summary(player.get('past_deeds'))
+        if past_deeds:
+            lines.append(f"过往事迹：{past_deeds}")
+        recent = recent_summary(player.get('history', []))
+        if recent:
+            lines.append(f"近期经历：{recent}")
+        return "\n" + "\n".join(lines) if lines else ""
@@ -0,0 +1,67 @@
+"""
+境界与战力计算
+供 prompt 构建、事件生成与本地判定共用
+"""
+from functools import lru_cache
+from typing import Dict, Any, Tuple
+
+REALM_ORDER = ["炼气期", "筑基期", "金丹期", "元婴期", "化神期", "合体期", "渡劫期", "大乘期"]
+LEVEL_NUMERALS = {"一": 1, "二": 2, "三": 3, "四": 4, "五": 5,
+                  "六": 6, "七": 7, "八": 8, "九": 9}
+LEVELS_PER_REALM = 9
+
+# 简化的战力计算
+REALM_POWER = {
+    "炼气期": 10, "筑基期": 50, "金丹期": 200,
+    "元婴期": 500, "化神期": 1000
+}
+
+
+@lru_cache(maxsize=1024)
+def parse_realm(realm: str) -> Tuple[int, int]:
+    """解析境界名称为 (大境界下标, 层数)，如 筑基期三层 -> (1, 3)；结果按字符串缓存"""
+    for i, r in enumerate(REALM_ORDER):
+        if r in realm:
+            # 计算具体层次，没有层数时视为该境界圆满
+            suffix = realm.split(r)[1]
+            if not suffix:
+                return i, LEVELS_PER_REALM
+            return i, LEVEL_NUMERALS.get(suffix[0], 1)
+    return 0, 1
+
+
+def get_realm_level(realm: str) -> int:
+    """获取境界等级数值（炼气期一层为 1，每个大境界 9 层）"""
+    index, sub_level = parse_realm(realm)
+    return index * LEVELS_PER_REALM + sub_level
+
+
+def realm_name_for_level(level: int) -> str:
+    """由等级数值还原境界名称，如 2 -> 炼气期二层"""
+    level = max(1, min(level, len(REALM_ORDER) * LEVELS_PER_REALM))
+    major, sub = divmod(level - 1, LEVELS_PER_REALM)
+    numeral = next(k for k, v in LEVEL_NUMERALS.items() if v == sub + 1)
+    return f"{REALM_ORDER[major]}{numeral}层"
+
+
+def realm_base_power(index: int) -> int:
+    """大境界的基础战力，未列出的境界按炼气期计"""
+    return REALM_POWER.get(REALM_ORDER[index], 10)
+
+
+def calculate_combat_power(player: Dict[str, Any]) -> int:
+    """计算战力数值"""
+    # 加上属性加成
+    return realm_base_power(parse_realm(player['realm'])[0]) + sum(player['attributes'].values())
+
+
+def combat_power_label(total_power: int) -> str:
+    """战力评估文字"""
+    if total_power < 50:
+        return f"{total_power} - 弱小"
+    elif total_power < 200:
+        return f"{total_power} - 普通"
+    elif total_power < 500:
+        return f"{total_power} - 较强"
+    else:
+        return f"{total_power} - 强大"
@@ -0,0 +1,139 @@
+"""
+LLM 判定结果缓存
+以"行动文字 + 分档后的玩家状态"为键缓存模型返回的结果，
+内存中按 LRU 淘汰并带过期时间，同时写入 SQLite 以便重启后继续使用
+"""
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from .player_model import HP_TIER_LABELS, ENERGY_TIER_LABELS, hp_tier, energy_tier
+
+
+def make_state_key(kind: str, player: Dict[str, Any],
+                   action: str = "", context: Optional[str] = None) -> str:
+    """
+    生成缓存键
+    只保留对判定结果有实质影响的状态：境界、生命/灵气档位、命格和副作用
+    """
+    state = [
+        kind,
+        " ".join(action.split()),
+        context or "",
+        player.get("realm", ""),
+        HP_TIER_LABELS[hp_tier(player.get("hp", 100))],
+        ENERGY_TIER_LABELS[energy_tier(player.get("spiritual_energy", 100))],
+        player.get("fate", "普通"),
+        sorted(player.get("side_effects", [])),
+    ]
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL 结果缓存（内存为主，SQLite 持久化）"""
+
+    def __init__(self, db_path: Optional[str] = "data/response_cache.db",
+                 max_size: int = 5000, ttl_seconds: float = 6 * 3600,
+                 freshness_bypass_rate: float = 0.2, rng: random.Random = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.freshness_bypass_rate = freshness_bypass_rate
+        self._rng = rng or random.Random()
+        self._entries = OrderedDict()  # key -> (created_at, value_json)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "bypasses": 0, "expired": 0, "evictions": 0}
+
+        self._conn = None
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._load_from_disk()
+
+    def _load_from_disk(self):
+        """启动时载入未过期的最近条目"""
+        cutoff = time.time() - self.ttl_seconds
+        self._conn.execute("DELETE FROM response_cache WHERE created_at < ?", (cutoff,))
+        rows = self._conn.execute(
+            "SELECT key, value, created_at FROM response_cache ORDER BY created_at DESC LIMIT ?",
+            (self.max_size,)
+        ).fetchall()
+        for key, value, created_at in reversed(rows):
+            self._entries[key] = (created_at, value)
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，未命中、已过期或被随机放行时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            created_at, value = entry
+            if time.time() - created_at > self.ttl_seconds:
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                self._delete(key)
+                return None
+
+            # 按一定概率放行到模型，保持描述的多样性（新结果会覆盖旧条目）
+            if self._rng.random() < self.freshness_bypass_rate:
+                self._stats["bypasses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+
+        # 每次返回新副本，避免调用方修改缓存内容
+        return json.loads(value)
+
+    def put(self, key: str, value: Any) -> None:
+        """写入缓存，超过容量时淘汰最久未使用的条目"""
+        created_at = time.time()
+        serialized = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._entries[key] = (created_at, serialized)
+            self._entries.move_to_end(key)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, serialized, created_at)
+                )
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._delete(oldest)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM response_cache")
+
+    def _delete(self, key: str):
+        self._entries.pop(key, None)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"] + stats["bypasses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,169 @@
+"""
+本地规则判定
+按 world_settings.json 中的 action_judgment 数值，直接计算打坐、疗伤、修炼等
+常规行动的成功率与状态变化，无需调用模型；新颖的自由行动仍交给模型判定
+"""
+import random
+import re
+from typing import Dict, Any, Optional
+
+from .world_loader import WorldSettingsLoader
+from .realm import get_realm_level, realm_name_for_level, calculate_combat_power, LEVELS_PER_REALM
+
+
+# 常规行动：关键词、相对难度（相对玩家自身境界的等级差）与结果描述模板
+# 按顺序匹配，先匹配到的类型优先
+ROUTINE_ACTIONS = {
+    "recover": {
+        "keywords": ["疗伤", "养伤", "休养", "休息"],
+        "difficulty_offset": -2,
+        "success": [
+            "{name}寻了一处僻静之地盘膝而坐，运转功法引导灵气游走周身，伤势渐渐愈合。",
+            "{name}服下随身丹药，闭目调息，体内淤血被一点点化开，气色好转了许多。",
+        ],
+        "failure": [
+            "{name}试图疗伤，但心绪难宁，灵气数次走岔，伤势只恢复了些许。",
+        ],
+        "advice": "伤势稳住后可外出寻找机缘",
+    },
+    "meditate": {
+        "keywords": ["打坐", "静心", "冥想", "吐纳", "调息", "入定", "恢复灵气"],
+        "difficulty_offset": -1,
+        "success": [
+            "{name}静坐吐纳，天地灵气如丝如缕汇入丹田，经脉中的灵力渐渐充盈。",
+            "{name}心神沉入识海，呼吸绵长，周身灵气缓缓流转，疲惫一扫而空。",
+        ],
+        "failure": [
+            "{name}闭目调息，却总有杂念浮现，灵气聚而复散，收获寥寥。",
+        ],
+        "advice": "灵气充沛时可尝试修炼功法",
+    },
+    "practice": {
+        "keywords": ["修炼", "练功", "功法", "苦修", "练习", "淬体"],
+        "difficulty_offset": 0,
+        "success": [
+            "{name}反复演练功法，灵力在经脉中奔涌不息，对功法的领悟又深了一层。",
+            "{name}以灵力冲刷经脉，汗如雨下，修为在一次次周天运转中稳步精进。",
+        ],
+        "failure": [
+            "{name}强行运功，灵力一时失控反冲经脉，只得暂且停下调养。",
+        ],
+        "advice": "适度修炼，注意灵气消耗",
+    },
+}
+
+# 出现这些字眼说明行动涉及他人或未知，交给模型判定
+NOVEL_KEYWORDS = ["挑战", "攻击", "击杀", "探索", "突破", "吞服", "闯", "偷", "杀", "抢", "交易", "遗迹", "秘境"]
+
+# 超过该长度的行动视为自由描述
+ROUTINE_MAX_LENGTH = 12
+
+
+class LocalRulesEngine:
+    """常规行动本地判定器"""
+
+    def __init__(self, world_loader: WorldSettingsLoader = None, rng: random.Random = None):
+        self.world_loader = world_loader or WorldSettingsLoader()
+        self.rng = rng or random.Random()
+        self._stats = {"resolved": 0, "delegated": 0}
+
+    def classify(self, action: str) -> Optional[str]:
+        """识别常规行动类型，不是常规行动时返回 None"""
+        # 事件选项只看玩家选择的部分
+        text = action.split("选择了：", 1)[-1].strip()
+        if not text or len(text) > ROUTINE_MAX_LENGTH:
+            return None
+        if any(word in text for word in NOVEL_KEYWORDS):
+            return None
+        for kind, spec in ROUTINE_ACTIONS.items():
+            if any(word in text for word in spec["keywords"]):
+                return kind
+        return None
+
+    def success_rate(self, player: Dict[str, Any], kind: str, difficulty: float = 1.0) -> float:
+        """按判定规则计算成功率（百分比）"""
+        snapshot = self.world_loader.snapshot
+        judgment = snapshot.settings["action_judgment"]
+        modifiers = judgment["modifiers"]
+        player_level = get_realm_level(player["realm"])
+        task_level = player_level + ROUTINE_ACTIONS[kind]["difficulty_offset"]
+        level_diff = player_level - task_level
+
+        rate = judgment["base_success_rate"]
+        if level_diff >= 0:
+            rate += level_diff * modifiers["realm_advantage_per_level"]
+        else:
+            rate += -level_diff * modifiers["realm_disadvantage_per_level"]
+
+        rate += player["attributes"].get("luck", 0) * modifiers["luck_factor_multiplier"]
+        rate += snapshot.fate_luck_modifier(player.get("fate", "普通"))
+
+        # 状态不佳时难以静心
+        if player["hp"] < 30:
+            rate -= 10
+        if kind == "practice" and player["spiritual_energy"] < 20:
+            rate -= 20
+
+        rate /= difficulty
+        return max(self._minimum_success_rate(judgment), min(95.0, rate))
+
+    def resolve(self, player: Dict[str, Any], action: str,
+                difficulty: float = 1.0) -> Optional[Dict[str, Any]]:
+        """判定常规行动，返回与模型相同格式的结果；非常规行动返回 None"""
+        kind = self.classify(action)
+        if kind is None:
+            self._stats["delegated"] += 1
+            return None
+        self._stats["resolved"] += 1
+
+        rate = self.success_rate(player, kind, difficulty)
+        success = self.rng.random() * 100 < rate
+        changes = self._status_changes(player, kind, success)
+        spec = ROUTINE_ACTIONS[kind]
+        template = self.rng.choice(spec["success"] if success else spec["failure"])
+
+        return {
+            "成功": success,
+            "描述": template.format(name=player["name"]),
+            "建议": spec["advice"],
+            "状态变化": changes
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+    def _status_changes(self, player: Dict[str, Any], kind: str, success: bool) -> Dict[str, Any]:
+        changes = {"hp": 0, "spiritual_energy": 0, "new_items": [], "new_skills": [], "realm_change": None}
+        # 境界越高，单次恢复越多
+        scale = 1 + calculate_combat_power(player) / 1000
+
+        if kind == "recover":
+            changes["hp"] = round(self.rng.randint(15, 30) * scale) if success else 5
+            changes["spiritual_energy"] = -5
+        elif kind == "meditate":
+            changes["spiritual_energy"] = round(self.rng.randint(15, 30) * scale) if success else 5
+        elif kind == "practice":
+            changes["spiritual_energy"] = -self.rng.randint(5, 15)
+            if success:
+                changes["realm_change"] = self._minor_breakthrough(player)
+            else:
+                changes["hp"] = -self.rng.randint(3, 10)
+        return changes
+
+    def _minor_breakthrough(self, player: Dict[str, Any]) -> Optional[str]:
+        """修炼成功时有小概率提升一个小境界；大境界突破需要模型判定"""
+        level = get_realm_level(player["realm"])
+        if level % LEVELS_PER_REALM == 0 or player["spiritual_energy"] < 80:
+            return None
+        chance = 0.05 + player["attributes"].get("luck", 0) * 0.005
+        if player.get("fate") == "天骄":
+            chance *= 1.2
+        if self.rng.random() < chance:
+            return realm_name_for_level(level + 1)
+        return None
+
+    @staticmethod
+    def _minimum_success_rate(judgment: Dict[str, Any]) -> float:
+        """从"副作用保底"规则中读取最低成功率"""
+        match = re.search(r"(\d+)%", judgment["special_rules"].get("副作用保底", ""))
+        return float(match.group(1)) if match else 20.0
@@ -0,0 +1,139 @@
+"""
+事件选项预判
+事件展示后，在有界线程池中并行预先判定全部选项；
+玩家做出选择时直接取用对应结果，未选中的结果丢弃。
+预判只计算结果，不修改玩家状态，状态结算仍由调用方在选择后完成
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+
+class _Speculation:
+    def __init__(self, fingerprint: str, actions: List[Tuple[str, Optional[str]]],
+                 futures: List[Optional[Future]]):
+        self.fingerprint = fingerprint
+        self.actions = actions
+        self.futures = futures
+        self.created_at = time.monotonic()
+
+
+class SpeculativeJudge:
+    """预判管理器（按玩家保存最近一次事件的预判结果）"""
+
+    def __init__(self, judge_fn: Callable[[Dict[str, Any], str, Optional[str]], Dict[str, Any]],
+                 max_workers: int = 8, max_calls_per_player: int = 30,
+                 window_seconds: float = 3600, result_timeout: float = 90):
+        self.judge_fn = judge_fn
+        self.max_calls_per_player = max_calls_per_player
+        self.window_seconds = window_seconds
+        self.result_timeout = result_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+        self._lock = threading.RLock()
+        self._pending: Dict[str, _Speculation] = {}
+        self._spend: Dict[str, deque] = {}
+        # 下次清理不活跃玩家的时间（每个窗口清理一次）
+        self._next_sweep = time.monotonic() + window_seconds
+        self._stats = {"submitted": 0, "used": 0, "discarded": 0, "skipped_budget": 0, "stale": 0}
+
+    def speculate(self, player_id: str, player: Dict[str, Any], fingerprint: str,
+                  actions: List[Tuple[str, Optional[str]]]) -> int:
+        """
+        为一个事件的全部选项提交预判
+        actions 为 [(行动文字, 情境描述), ...]，按选项顺序排列
+        返回实际提交的预判数量（受每位玩家的预判额度限制）
+        """
+        snapshot = {k: v for k, v in player.items() if k != "history"}
+        with self._lock:
+            self._discard(self._pending.pop(player_id, None))
+            allowed = self._reserve_budget(player_id, len(actions))
+            if allowed < len(actions):
+                self._stats["skipped_budget"] += len(actions) - allowed
+
+            futures = []
+            for index, (action, context) in enumerate(actions):
+                if index < allowed:
+                    futures.append(self._executor.submit(self.judge_fn, snapshot, action, context))
+                else:
+                    futures.append(None)
+            self._stats["submitted"] += allowed
+            self._pending[player_id] = _Speculation(fingerprint, list(actions), futures)
+        return allowed
+
+    def take(self, player_id: str, index: int, action: str, context: Optional[str],
+             fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        取出玩家所选选项的预判结果，其余结果丢弃
+        玩家状态已变化、选项不匹配或预判失败时返回 None，由调用方正常判定
+        """
+        with self._lock:
+            speculation = self._pending.pop(player_id, None)
+            if speculation is None:
+                return None
+            future = speculation.futures[index] if index < len(speculation.futures) else None
+            speculation.futures = [f for f in speculation.futures if f is not future]
+            self._discard(speculation)
+
+        if future is None:
+            return None
+        if speculation.fingerprint != fingerprint or speculation.actions[index] != (action, context):
+            future.cancel()
+            self._count("stale")
+            return None
+
+        try:
+            result = future.result(timeout=self.result_timeout)
+        except Exception as e:
+            print(f"预判结果获取失败: {e}")
+            return None
+        self._count("used")
+        return result
+
+    def cancel(self, player_id: str) -> None:
+        """丢弃玩家尚未使用的预判"""
+        with self._lock:
+            self._discard(self._pending.pop(player_id, None))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending_players"] = len(self._pending)
+        return stats
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _reserve_budget(self, player_id: str, wanted: int) -> int:
+        """在滑动窗口内为玩家预留预判次数，返回可用数量"""
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        spend = self._spend.setdefault(player_id, deque())
+        while spend and now - spend[0] > self.window_seconds:
+            spend.popleft()
+        allowed = max(0, min(wanted, self.max_calls_per_player - len(spend)))
+        spend.extend([now] * allowed)
+        return allowed
+
+    def _sweep(self, now: float) -> None:
+        """移除额度窗口已整体过期的玩家，以及超过一个窗口仍未取用的预判"""
+        self._next_sweep = now + self.window_seconds
+        for player_id in [p for p, spend in self._spend.items() if not spend or now - spend[-1] > self.window_seconds]:
+            del self._spend[player_id]
+        for player_id in [p for p, spec in self._pending.items() if now - spec.created_at > self.window_seconds]:
+            self._discard(self._pending.pop(player_id))
+
+    def _discard(self, speculation: Optional[_Speculation]):
+        if speculation is None:
+            return
+        for future in speculation.futures:
+            if future is not None:
+                # 尚未开始的预判直接取消；已在执行的结果丢弃（仍会写入结果缓存）
+                future.cancel()
+                self._count("discarded")
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
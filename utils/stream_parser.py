@@ -0,0 +1,121 @@
+"""
+流式 JSON 增量解析
+在模型逐段输出判定结果时，实时提取"描述"字段的文字，
+并在顶层 JSON 对象闭合时给出完整文本，便于立即结算状态变化
+"""
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class NarrationStreamParser:
+    """增量提取顶层 JSON 对象中某个字符串字段的内容"""
+
+    def __init__(self, field: str = "描述"):
+        self.field = field
+        self.depth = 0
+        self.started = False
+        self.closed = False
+        self.text = []  # 顶层对象开始后的原始文本
+
+        self._in_string = False
+        self._escape = False
+        self._unicode = None  # 正在读取的 \uXXXX 十六进制位
+        self._high_surrogate = None
+        self._expect_key = False
+        self._current_key = None
+        self._awaiting_value = False
+        self._capturing = False
+        self._string = []
+
+    def feed(self, chunk: str) -> str:
+        """输入一段模型输出，返回其中新增的字段文字"""
+        out = []
+        for ch in chunk:
+            if self.closed:
+                break
+            if self.started:
+                self.text.append(ch)
+            if self._in_string:
+                self._feed_string_char(ch, out)
+                continue
+            if ch == '{':
+                if not self.started:
+                    self.started = True
+                    self.text.append(ch)
+                self.depth += 1
+                self._expect_key = self.depth == 1
+                self._awaiting_value = False
+            elif not self.started:
+                # 对象开始前的内容（如 ```json 围栏）直接忽略
+                continue
+            elif ch == '"':
+                self._in_string = True
+                self._string = []
+                self._capturing = self._awaiting_value and self.depth == 1
+                self._awaiting_value = False
+            elif ch == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    self.closed = True
+            elif ch == '[':
+                self.depth += 1
+            elif ch == ']':
+                self.depth -= 1
+            elif ch == ':' and self.depth == 1:
+                self._awaiting_value = self._current_key == self.field
+            elif ch == ',' and self.depth == 1:
+                self._expect_key = True
+                self._awaiting_value = False
+            elif not ch.isspace():
+                self._awaiting_value = False
+        return "".join(out)
+
+    @property
+    def object_text(self) -> str:
+        """顶层对象的原始文本（闭合后即为完整 JSON）"""
+        return "".join(self.text)
+
+    def _feed_string_char(self, ch: str, out: list):
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) == 4:
+                try:
+                    code = int(self._unicode, 16)
+                except ValueError:
+                    code = 0xFFFD
+                self._unicode = None
+                self._emit_code_point(code, out)
+            return
+        if self._escape:
+            self._escape = False
+            if ch == 'u':
+                self._unicode = ""
+            else:
+                self._emit(_ESCAPES.get(ch, ch), out)
+            return
+        if ch == '\\':
+            self._escape = True
+        elif ch == '"':
+            self._in_string = False
+            if self._expect_key and self.depth == 1:
+                self._current_key = "".join(self._string)
+                self._expect_key = False
+            self._capturing = False
+        else:
+            self._emit(ch, out)
+
+    def _emit_code_point(self, code: int, out: list):
+        # 处理 UTF-16 代理对
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        self._emit(chr(code), out)
+
+    def _emit(self, text: str, out: list):
+        if self._expect_key and self.depth == 1:
+            self._string.append(text)
+        elif self._capturing:
+            out.append(text)
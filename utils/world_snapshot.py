@@ -0,0 +1,322 @@
+"""
+世界设定快照
+world_settings.json 在进程内只解析一次，编译为不可变的快照：境界与命格按名称建立索引，
+prompt 中用到的各段设定文字预先渲染好。同一设定文件的所有加载器共享一个快照仓库，
+文件修改后编译新快照并整体替换引用，读取方拿到的始终是某一个完整版本；
+新文件解析失败时保留旧快照。
+可选的二进制缓存（marshal）保存编译结果，源文件未变时启动直接读取缓存
+"""
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from .atomic_writer import atomic_write_bytes
+
+DEFAULT_SETTINGS_PATH = "data/world_settings.json"
+# 编译结果结构变化时递增，旧缓存随之失效
+CACHE_FORMAT = 1
+UNKNOWN_FATE_EFFECT = "未知命格"
+
+
+def render_world_description(settings: Dict[str, Any], brief: bool = False) -> str:
+    """世界观描述，brief 时只保留背景一段"""
+    world = settings["world_info"]
+    if brief:
+        return f"""
+【世界背景】
+{world['description']}
+"""
+    principles = "\n".join([f"- {p}" for p in world["core_principles"]])
+
+    return f"""
+【世界背景】
+{world['description']}
+
+核心法则：
+{principles}
+
+哲学基础：
+- {world['philosophy']['main_quote']}
+- {world['philosophy']['secondary_quote']}
+"""
+
+
+def render_cultivation_system(settings: Dict[str, Any], brief: bool = False) -> str:
+    """修炼体系说明，brief 时只列境界名称"""
+    realms = settings["cultivation_realms"]
+
+    if brief:
+        return f"""
+【修炼境界体系】
+{' → '.join(realm['name'] for realm in realms)}（高一个大境界形成绝对压制）
+"""
+
+    realm_list = []
+    for i, realm in enumerate(realms):
+        realm_list.append(
+            f"{i + 1}. {realm['name']}（{realm['levels']}层）- {realm['description']}"
+        )
+
+    return f"""
+【修炼境界体系】
+{chr(10).join(realm_list)}
+
+境界压制：高一个大境界可形成绝对压制，同境界内每差3个小层次战力差距明显。
+"""
+
+
+def render_side_effect_system(settings: Dict[str, Any], include_examples: bool = True) -> str:
+    """副作用逆转系统说明"""
+    system = settings["special_systems"]["side_effect_reversal"]
+
+    if not include_examples:
+        return f"""
+【副作用逆转系统】
+{system['description']}
+"""
+
+    examples = "\n".join([
+        f"- {ex['original']} → {ex['reversed']}"
+        for ex in system['examples']
+    ])
+
+    return f"""
+【副作用逆转系统】
+{system['description']}
+
+逆转示例：
+{examples}
+"""
+
+
+def render_judgment_rules(settings: Dict[str, Any], brief: bool = False) -> str:
+    """行动判定规则，brief 时只保留基础成功率与主要修正"""
+    judgment = settings["action_judgment"]
+    modifiers = judgment['modifiers']
+
+    if brief:
+        return f"""
+【行动判定规则】
+基础成功率{judgment['base_success_rate']}%，境界每高一级 +{modifiers['realm_advantage_per_level']}%、每低一级 {modifiers['realm_disadvantage_per_level']}%，幸运值 × {modifiers['luck_factor_multiplier']}%。
+"""
+
+    return f"""
+【行动判定规则】
+基础成功率：{judgment['base_success_rate']}%
+
+影响因素：
+- 境界优势：每级 +{judgment['modifiers']['realm_advantage_per_level']}%
+- 境界劣势：每级 {judgment['modifiers']['realm_disadvantage_per_level']}%
+- 装备匹配：±{judgment['modifiers']['equipment_match']}%
+- 环境因素：±{judgment['modifiers']['environment_factor']}%
+- 幸运加成：幸运值 × {judgment['modifiers']['luck_factor_multiplier']}%
+
+特殊规则：
+- {judgment['special_rules']['desperate_burst']}
+- {judgment['special_rules']['越级挑战']}
+- {judgment['special_rules']['副作用保底']}
+"""
+
+
+class WorldSnapshot:
+    """
+    编译后的世界设定（只读）
+    sections 中每段设定按详略给出多个版本：
+    world (完整, 简要)、cultivation (完整, 简要)、side_effect (含示例, 不含示例)、rules (完整, 简要)
+    """
+
+    __slots__ = ("version", "settings", "realm_order", "realm_index", "fates", "fate_effects", "sections")
+
+    def __init__(self, version: int, settings: Dict[str, Any], realm_order: Tuple[str, ...],
+                 fates: Dict[str, Dict[str, Any]], fate_effects: Dict[str, str],
+                 sections: Dict[str, Tuple[str, ...]]):
+        self.version = version
+        self.settings = settings
+        self.realm_order = realm_order
+        self.realm_index = {name: i for i, name in enumerate(realm_order)}
+        self.fates = fates
+        self.fate_effects = fate_effects
+        self.sections = sections
+
+    @classmethod
+    def compile(cls, settings: Dict[str, Any], version: int) -> "WorldSnapshot":
+        fates = {fate["name"]: fate for fate in settings["fate_system"]["types"]}
+        return cls(
+            version,
+            settings,
+            tuple(realm["name"] for realm in settings["cultivation_realms"]),
+            fates,
+            {name: f"{fate['description']}，{fate['special_effect']}" for name, fate in fates.items()},
+            {
+                "world": (render_world_description(settings), render_world_description(settings, brief=True)),
+                "cultivation": (render_cultivation_system(settings),
+                                render_cultivation_system(settings, brief=True)),
+                "side_effect": (render_side_effect_system(settings),
+                                render_side_effect_system(settings, include_examples=False)),
+                "rules": (render_judgment_rules(settings), render_judgment_rules(settings, brief=True)),
+            },
+        )
+
+    def realm_spec(self, name: str) -> Optional[Dict[str, Any]]:
+        """按大境界名称取设定（层数、描述、突破条件）"""
+        index = self.realm_index.get(name)
+        return self.settings["cultivation_realms"][index] if index is not None else None
+
+    def fate_effect(self, fate_name: str) -> str:
+        return self.fate_effects.get(fate_name, UNKNOWN_FATE_EFFECT)
+
+    def fate_luck_modifier(self, fate_name: str) -> float:
+        fate = self.fates.get(fate_name)
+        return fate.get("luck_modifier", 0) if fate is not None else 0
+
+    def to_state(self) -> tuple:
+        """只含内置类型的编译结果，用于二进制缓存"""
+        return (self.version, self.settings, self.realm_order, self.fates, self.fate_effects, self.sections)
+
+
+class WorldSnapshotStore:
+    """
+    单个设定文件的快照仓库
+    未启动监视时，读取快照最多每 check_interval 秒检查一次文件是否变化；
+    调用 watch() 后由后台线程定期检查，读取快照不再访问文件系统
+    """
+
+    def __init__(self, path: str = DEFAULT_SETTINGS_PATH, check_interval: float = 1.0,
+                 cache_path: Optional[str] = None):
+        self.path = path
+        self.check_interval = check_interval
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._snapshot: Optional[WorldSnapshot] = None
+        self._signature = None
+        self._failed_signature = None
+        self._next_check = 0.0
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stats = {"compiled": 0, "cache_loads": 0, "reload_errors": 0}
+
+    def configure(self, check_interval: float = None, cache_path: Optional[str] = None) -> None:
+        if check_interval is not None:
+            self.check_interval = check_interval
+        if cache_path is not None:
+            self.cache_path = cache_path or None
+
+    def current(self) -> WorldSnapshot:
+        """当前快照；首次读取时加载，此后按检查间隔发现文件变化"""
+        snapshot = self._snapshot
+        if snapshot is not None and (self._watcher is not None or time.monotonic() < self._next_check):
+            return snapshot
+        self.refresh()
+        return self._snapshot
+
+    def refresh(self) -> bool:
+        """文件有变化时编译并替换快照，返回是否替换；首次加载失败时抛出异常"""
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            signature = None
+            try:
+                signature = self._file_signature()
+                if self._snapshot is not None and signature in (self._signature, self._failed_signature):
+                    return False
+                snapshot = self._load(signature)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if self._snapshot is None:
+                    raise
+                # 编辑器保存到一半或内容有误：保留旧快照，文件再次变化时重试
+                print(f"世界设定重新加载失败，继续使用旧版本: {e}")
+                self._failed_signature = signature
+                self._stats["reload_errors"] += 1
+                return False
+            self._snapshot = snapshot
+            self._signature = signature
+            self._failed_signature = None
+            return True
+
+    def watch(self, interval: float = None) -> None:
+        """启动后台线程监视设定文件（幂等）"""
+        self.current()
+        with self._lock:
+            if self._watcher is not None:
+                return
+            if interval is not None:
+                self.check_interval = interval
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch_loop, name="world-settings-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self) -> None:
+        with self._lock:
+            watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            self._stop.set()
+            watcher.join()
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return dict(self._stats, version=snapshot.version if snapshot is not None else None,
+                    watching=self._watcher is not None)
+
+    def _watch_loop(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.refresh()
+            except OSError as e:
+                print(f"检查世界设定文件失败: {e}")
+
+    def _file_signature(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, signature: Tuple[int, int]) -> WorldSnapshot:
+        snapshot = self._read_cache(signature)
+        if snapshot is not None:
+            self._stats["cache_loads"] += 1
+            return snapshot
+        with open(self.path, 'r', encoding='utf-8') as f:
+            snapshot = WorldSnapshot.compile(json.load(f), signature[0])
+        self._stats["compiled"] += 1
+        self._write_cache(signature, snapshot)
+        return snapshot
+
+    def _cache_key(self, signature: Tuple[int, int]) -> tuple:
+        # marshal 格式随解释器版本变化，缓存只在同一版本间复用
+        return CACHE_FORMAT, sys.version_info[:2], os.path.abspath(self.path), signature
+
+    def _read_cache(self, signature: Tuple[int, int]) -> Optional[WorldSnapshot]:
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, 'rb') as f:
+                key, state = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if key != self._cache_key(signature):
+            return None
+        return WorldSnapshot(*state)
+
+    def _write_cache(self, signature: Tuple[int, int], snapshot: WorldSnapshot) -> None:
+        if not self.cache_path:
+            return
+        try:
+            atomic_write_bytes(self.cache_path, marshal.dumps((self._cache_key(signature), snapshot.to_state())),
+                               fsync=False)
+        except (OSError, ValueError) as e:
+            print(f"写入世界设定缓存失败: {e}")
+
+
+_stores: Dict[str, WorldSnapshotStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_snapshot_store(path: str = DEFAULT_SETTINGS_PATH) -> WorldSnapshotStore:
+    """进程内共享的快照仓库，同一文件只有一份"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = WorldSnapshotStore(path)
+        return store